@@ -1,9 +1,26 @@
 from django.contrib import admin
-from .models import Borrower, Loan, Saving, Branch, LoanOfficer, Organization
+from django.db.models import F, Max, OuterRef, Q, Subquery, ExpressionWrapper, DecimalField
+from .models import Borrower, Loan, Repayment, Saving, Branch, LoanOfficer, Organization, loan_total_due
+from .pagination import ApproximateCountPaginator
+from .search import fts_available, fts_query, matching_borrower_ids
+
+
+class BorrowerSearchMixin:
+    """Admin search through the borrower full-text index instead of LIKE scans over search_fields"""
+    borrower_lookup = 'pk'
+
+    def search_filter(self, search_term):
+        return Q(**{f"{self.borrower_lookup}__in": matching_borrower_ids(search_term)})
+
+    def get_search_results(self, request, queryset, search_term):
+        if not fts_available() or fts_query(search_term) is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(self.search_filter(search_term)), False
+
 
 # ---------------- Borrower ----------------
 @admin.register(Borrower)
-class BorrowerAdmin(admin.ModelAdmin):
+class BorrowerAdmin(BorrowerSearchMixin, admin.ModelAdmin):
     list_display = (
         'full_name',
         'unique_id',
@@ -18,6 +35,19 @@ class BorrowerAdmin(admin.ModelAdmin):
     )
     search_fields = ('full_name', 'unique_id', 'mobile', 'business')
     list_filter = ('organization', 'branch', 'status')
+    list_select_related = ('organization', 'branch')
+
+    def get_queryset(self, request):
+        # Totals come from one grouped query instead of two loan queries per row
+        return super().get_queryset(request).with_totals()
+
+    @admin.display(description='Total paid', ordering='paid_total')
+    def total_paid(self, obj):
+        return obj.total_paid
+
+    @admin.display(description='Loan balance', ordering='balance_total')
+    def loan_balance(self, obj):
+        return obj.loan_balance
 
 
 
@@ -26,7 +56,7 @@ class BorrowerAdmin(admin.ModelAdmin):
 
 # ---------------- Loan ----------------
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(BorrowerSearchMixin, admin.ModelAdmin):
     list_display = (
         'borrower_name',   # Custom property
         'id',              # Django model ID as loan identifier
@@ -42,16 +72,47 @@ class LoanAdmin(admin.ModelAdmin):
     )
     search_fields = ('borrower__full_name', 'id')
     list_filter = ('status', 'organization', 'branch')
+    list_select_related = ('borrower', 'branch', 'organization')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    borrower_lookup = 'borrower'
+
+    def search_filter(self, search_term):
+        search = super().search_filter(search_term)
+        if search_term.strip().isdigit():
+            search |= Q(pk=int(search_term))
+        return search
+
+    def get_queryset(self, request):
+        last_repayment = (
+            Repayment.objects.filter(loan=OuterRef('pk'))
+            .values('loan')
+            .annotate(last=Max('date'))
+            .values('last')
+        )
+        due = loan_total_due()
+        return super().get_queryset(request).annotate(
+            due_total=due,
+            balance_due=ExpressionWrapper(due - F('paid'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            last_repayment_date=Subquery(last_repayment),
+        )
 
     # Custom properties for admin display
+    @admin.display(description='Borrower', ordering='borrower__full_name')
     def borrower_name(self, obj):
         return obj.borrower.full_name if obj.borrower else '-'
-    borrower_name.short_description = 'Borrower'
 
+    @admin.display(description='Total due', ordering='due_total')
+    def total_due(self, obj):
+        return obj.due_total
+
+    @admin.display(description='Balance', ordering='balance_due')
+    def balance(self, obj):
+        return obj.balance_due
+
+    @admin.display(description='Last Payment', ordering='last_repayment_date')
     def last_repayment(self, obj):
-        last = obj.repayment_set.order_by('-date').first()
-        return last.date if last else '-'
-    last_repayment.short_description = 'Last Payment'
+        return obj.last_repayment_date or '-'
     
     
     
@@ -0,0 +1,188 @@
+"""
+Nightly loan aging.
+
+Open loans are loaded as column arrays and classified with NumPy in one
+pass, then only the loans whose status actually changed are written back.
+
+Days past due count from the due date of the oldest installment that the
+amount paid does not cover. Loans without a schedule, and loans still
+owing fees or penalties once every installment is covered, are past due
+from maturity. Money is compared in integer cents. A loan with nothing
+left to pay is Closed, 1-30 days past due is Overdue and anything older
+is PAR30.
+"""
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .dashboard import invalidate_dashboard
+from .models import Loan, LoanInstallment, Repayment, loan_total_due
+
+
+OPEN_STATUSES = ('Active', 'Overdue', 'PAR30')
+PAR_DAYS = 30
+AGING_CHUNK_SIZE = 5000
+# Rows per UPDATE ... WHERE id IN (...); stays under SQLite's variable limit
+UPDATE_BATCH_SIZE = 900
+
+# (label, lowest days past due) - each bucket runs up to the next one's floor
+AGING_BUCKETS = (
+    ('Current', None),
+    ('1-30', 1),
+    ('31-60', 31),
+    ('61-90', 61),
+    ('90+', 91),
+)
+
+
+def cents(values):
+    """Decimal amounts as an int64 array of cents (None counts as zero)"""
+    return np.array([int((value or 0) * 100) for value in values], dtype=np.int64)
+
+
+def open_loans(organization_id=None):
+    qs = Loan.objects.filter(status__in=OPEN_STATUSES)
+    if organization_id is not None:
+        qs = qs.filter(organization_id=organization_id)
+    return qs
+
+
+def load_open_loans(organization_id=None):
+    """
+    Column arrays for every open loan:
+    id, organization_id, status, maturity, total_due and paid (in cents).
+    """
+    rows = list(
+        open_loans(organization_id).annotate(due=loan_total_due())
+        .values_list('id', 'organization_id', 'status', 'maturity', 'due', 'paid')
+        .iterator(chunk_size=AGING_CHUNK_SIZE)
+    )
+    if not rows:
+        return None
+
+    ids, orgs, statuses, maturity, due, paid = zip(*rows)
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'organization_id': np.array(orgs, dtype=np.int64),
+        'status': np.array(statuses, dtype=object),
+        'maturity': np.array(maturity, dtype='datetime64[D]'),
+        'total_due': cents(due),
+        'paid': cents(paid),
+    }
+
+
+def paid_by(day):
+    """Loan.paid less repayments dated after `day`: what had been paid by then"""
+    later = (
+        Repayment.objects.filter(loan=OuterRef('pk'), date__gt=day)
+        .values('loan')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return ExpressionWrapper(
+        F('paid') - Coalesce(Subquery(later), Value(Decimal('0.00'))),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def oldest_unpaid_due_dates(loans, today, paid=F('paid')):
+    """
+    {loan id: due date of its oldest installment due by `today` that the
+    amount paid doesn't cover} for the `loans` queryset. `paid` is the
+    amount paid as an expression on Loan, e.g. paid_by(day). The running
+    total of each schedule is a window sum in the database, in integer
+    cents, so only one row per late loan comes back.
+    """
+    qn = connection.ops.quote_name
+    loan_rows, params = loans.annotate(paid_so_far=paid).values('id', 'paid_so_far').query.sql_with_params()
+    sql = f"""
+        SELECT due.loan_id, MIN(due.due_date)
+        FROM (
+            SELECT i.loan_id, i.due_date, CAST(ROUND(loan.paid_so_far * 100) AS INTEGER) AS paid,
+                   SUM(CAST(ROUND(i.amount * 100) AS INTEGER)) OVER (
+                       PARTITION BY i.loan_id ORDER BY i.{qn('number')}
+                   ) AS running
+            FROM {qn(LoanInstallment._meta.db_table)} i
+            JOIN ({loan_rows}) loan ON loan.id = i.loan_id
+            WHERE i.due_date <= %s
+        ) due
+        WHERE due.running > due.paid
+        GROUP BY due.loan_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, connection.ops.adapt_datefield_value(today)])
+        return dict(cursor.fetchall())
+
+
+def days_past_due(ids, paid, total_due, maturity, oldest_unpaid, today):
+    """
+    Days since the oldest unpaid due date of each loan; 0 when nothing due
+    is unpaid. `paid` and `total_due` are in cents and `oldest_unpaid` is
+    what oldest_unpaid_due_dates returns for the same loans.
+    """
+    today = np.datetime64(today, 'D')
+    since = np.array([oldest_unpaid.get(pk) for pk in ids.tolist()], dtype='datetime64[D]')
+
+    # Whatever is still owed once maturity has passed is due from maturity
+    matured = (paid < total_due) & ~np.isnat(maturity) & (maturity <= today)
+    since = np.where(matured, np.fmin(since, maturity), since)
+
+    dpd = (today - since).astype(np.int64)
+    return np.where(np.isnat(since), 0, np.maximum(dpd, 0))
+
+
+def classify(dpd, outstanding):
+    statuses = np.full(dpd.shape, 'Active', dtype=object)
+    statuses[dpd > 0] = 'Overdue'
+    statuses[dpd > PAR_DAYS] = 'PAR30'
+    statuses[~outstanding] = 'Closed'
+    return statuses
+
+
+def bucket_counts(dpd, outstanding):
+    floors = np.array([floor for _, floor in AGING_BUCKETS[1:]])
+    buckets = np.digitize(dpd[outstanding], floors)
+    counts = np.bincount(buckets, minlength=len(AGING_BUCKETS))
+    return {label: int(count) for (label, _), count in zip(AGING_BUCKETS, counts)}
+
+
+def age_loans(today=None, organization_id=None, dry_run=False):
+    """
+    Reclassify open loans as of `today`.
+
+    Returns (changed, buckets): the number of loans moved to each status
+    and the count of outstanding loans in each aging bucket.
+    """
+    today = today or date.today()
+    loans = load_open_loans(organization_id)
+    if loans is None:
+        return {}, bucket_counts(np.array([], dtype=np.int64), np.array([], dtype=bool))
+
+    oldest_unpaid = oldest_unpaid_due_dates(open_loans(organization_id), today)
+    dpd = days_past_due(
+        loans['id'], loans['paid'], loans['total_due'], loans['maturity'], oldest_unpaid, today
+    )
+    outstanding = loans['paid'] < loans['total_due']
+    statuses = classify(dpd, outstanding)
+
+    moved = statuses != loans['status']
+    changed = {
+        status: loans['id'][moved & (statuses == status)].tolist()
+        for status in np.unique(statuses[moved])
+    }
+    if changed and not dry_run:
+        with transaction.atomic():
+            for status, ids in changed.items():
+                for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+                    # Leave alone loans closed by a payment since they were loaded
+                    Loan.objects.filter(
+                        pk__in=ids[start:start + UPDATE_BATCH_SIZE], status__in=OPEN_STATUSES
+                    ).update(status=status)
+            for org_id in np.unique(loans['organization_id'][moved]).tolist():
+                transaction.on_commit(lambda org_id=org_id: invalidate_dashboard(org_id))
+
+    return {status: len(ids) for status, ids in changed.items()}, bucket_counts(dpd, outstanding)
@@ -0,0 +1,119 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum, Count, Q, F, ExpressionWrapper, DecimalField
+
+from .models import Borrower, Loan, Saving, CollectionItem, MonthlyCollection, PortfolioSnapshot
+from .rollups import monthly_totals
+
+
+DASHBOARD_CACHE_TIMEOUT = 300
+CHART_MONTHS = 6
+TREND_DAYS = 30
+
+
+def dashboard_cache_key(organization_id):
+    return f"dashboard:{organization_id}"
+
+
+def invalidate_dashboard(organization_id):
+    """Drop the cached dashboard figures for an organization"""
+    cache.delete(dashboard_cache_key(organization_id))
+
+
+def _month_starts(today, months):
+    """First day of the current month and the `months - 1` before it, oldest first"""
+    starts = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return starts[::-1]
+
+
+def compute_dashboard(organization, today=None):
+    """
+    Dashboard figures for an organization, one aggregate query per table.
+    """
+    today = today or date.today()
+
+    borrowers = Borrower.objects.filter(organization=organization).aggregate(
+        total=Count('id')
+    )
+
+    loans = Loan.objects.filter(organization=organization).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='Active')),
+        overdue=Count('id', filter=Q(status='Overdue')),
+        par30=Count('id', filter=Q(status='PAR30')),
+        closed=Count('id', filter=Q(status='Closed')),
+        portfolio=Sum(
+            ExpressionWrapper(
+                F('principal') + (F('principal') * F('interest_rate') / 100),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            )
+        ),
+    )
+
+    # Repayment total and the per-month chart from the monthly rollup
+    starts = _month_starts(today, CHART_MONTHS)
+    repayments = MonthlyCollection.objects.filter(organization=organization).aggregate(total=Sum('amount'))
+    months = monthly_totals(organization, starts)
+
+    savings = Saving.objects.filter(organization=organization).aggregate(
+        total=Sum('ledger_balance')
+    )
+
+    collections = CollectionItem.objects.filter(loan__organization=organization).aggregate(
+        total=Sum('amount')
+    )
+
+    trend = portfolio_trend(organization, today=today)
+
+    return {
+        'borrowers': borrowers['total'],
+        'loans': loans['total'],
+        'active_loans': loans['active'],
+        'overdue_loans': loans['overdue'],
+        'par30': loans['par30'],
+        'closed_loans': loans['closed'],
+        'total_portfolio': loans['portfolio'] or 0,
+        'total_repayments': repayments['total'] or 0,
+        'total_collections': collections['total'] or 0,
+        'total_savings': savings['total'] or 0,
+        'chart_labels': [start.strftime("%b %Y") for start in starts],
+        'chart_values': [float(total) for total in months.values()],
+        'trend_labels': [day['date'].strftime("%d %b") for day in trend],
+        'trend_outstanding': [float(day['outstanding']) for day in trend],
+        'trend_arrears': [float(day['arrears']) for day in trend],
+        'trend_par30': [float(day['par30']) for day in trend],
+    }
+
+
+def portfolio_trend(organization, days=TREND_DAYS, today=None):
+    """
+    Daily organization totals from the last `days` portfolio snapshots,
+    oldest first. Reads a few rows per day from PortfolioSnapshot rather
+    than the loan book.
+    """
+    today = today or date.today()
+    return list(
+        PortfolioSnapshot.objects.filter(organization=organization, date__gt=today - timedelta(days=days))
+        .values('date')
+        .annotate(
+            outstanding=Sum('outstanding_balance'),
+            arrears=Sum('arrears'),
+            par30=Sum('par_31_60') + Sum('par_61_90') + Sum('par_over_90'),
+        )
+        .order_by('date')
+    )
+
+
+def dashboard_stats(organization):
+    """Cached dashboard figures; invalidated by the signals in core.signals"""
+    key = dashboard_cache_key(organization.id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard(organization)
+        cache.set(key, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,77 @@
+"""
+SQLite connection tuning.
+
+`configure_sqlite` runs on every new connection (see CoreConfig.ready) and
+applies settings.SQLITE_PRAGMAS. `immediate_atomic` is transaction.atomic
+for write paths: it opens the outermost transaction with BEGIN IMMEDIATE,
+so a writer waits for the lock up front (honouring busy_timeout) instead of
+failing with "database is locked" when a read transaction tries to upgrade
+to a write.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    journal_mode = pragmas.pop('journal_mode', None)
+    with connection.cursor() as cursor:
+        # Set the lock wait first so everything after it honours busy_timeout
+        if 'busy_timeout' in pragmas:
+            cursor.execute(f"PRAGMA busy_timeout = {pragmas.pop('busy_timeout')}")
+        # The journal mode is stored in the file and switching it needs an
+        # exclusive lock, so only the first connection after a change pays for
+        # it. Replicas are swapped in whole by refresh_sqlite_copy and stay in
+        # rollback-journal mode so there are no -wal files to go stale.
+        if journal_mode and connection.alias == DEFAULT_DB_ALIAS:
+            cursor.execute("PRAGMA journal_mode")
+            if cursor.fetchone()[0].lower() != journal_mode.lower():
+                cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # transaction_mode is re-read from settings when connecting, so connect first
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+def refresh_sqlite_copy(source, target):
+    """
+    Copy the SQLite database at `source` to `target` with the online backup
+    API, which is consistent while other connections keep writing. The copy
+    is built next to `target` and renamed over it, so readers see either
+    the old or the new file, never a partial one.
+    """
+    target = str(target)
+    tmp = f"{target}.tmp"
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, target)
@@ -0,0 +1,325 @@
+"""
+Duplicate-borrower detection.
+
+unique_id is free text, so one client can be entered twice as "B-0001" and
+"B0001", or as "Ada Obi" and "Adah Obi". Comparing every pair of borrowers
+is quadratic. Instead, each borrower gets up to three blocking keys:
+
+- phone: the last ten digits of the mobile number
+- name: the Soundex codes of the first and last names, in either order
+- business: the business's most distinctive word plus a name code
+
+Borrowers are only compared with others that share a key. Within a key,
+rows are sorted by name and each is compared with the next BLOCK_WINDOW
+rows (sorted neighbourhood). The work therefore grows with
+n * BLOCK_WINDOW, however large a block gets.
+
+Pairs are scored on whole arrays. Names and businesses are compared by the
+MinHash estimate of their character-trigram Jaccard similarity. Phone,
+email and normalised unique_id are compared exactly. Pairs scoring
+DUPLICATE_THRESHOLD or more go to the DuplicateCandidate review queue.
+
+The keys are stored in BorrowerKey. find_duplicates refreshes them for a
+whole organization, and add_borrower looks a new client up in the same
+index before saving.
+"""
+import zlib
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from .db import immediate_atomic
+from .models import Borrower, BorrowerKey, DuplicateCandidate
+from .reconciliation import name_words, phone_key
+
+
+BLOCK_WINDOW = 20
+DUPLICATE_THRESHOLD = 0.7
+# Score weights; "contact" is a shared phone, email or unique_id
+NAME_WEIGHT, CONTACT_WEIGHT, BUSINESS_WEIGHT = 0.5, 0.35, 0.15
+SIGNATURE_SIZE = 32
+# Rows per step when hashing and pairs per step when scoring, to bound memory
+SIGNATURE_CHUNK = 20000
+PAIR_CHUNK = 500000
+# Borrowers sharing a key with a new client that the live check scores
+LIVE_CANDIDATES = 5000
+BULK_BATCH_SIZE = 2000
+LOOKUP_BATCH_SIZE = 900
+
+FIELDS = ('id', 'full_name', 'unique_id', 'mobile', 'email', 'business')
+GENERIC_BUSINESS_WORDS = frozenset({
+    'and', 'the', 'ltd', 'limited', 'nig', 'nigeria', 'enterprise', 'enterprises', 'ventures', 'global',
+    'services', 'store', 'stores', 'shop', 'trading', 'company', 'international',
+})
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20261018)
+_HASH_A = _rng.integers(1, _PRIME, size=SIGNATURE_SIZE, dtype=np.int64)
+_HASH_B = _rng.integers(0, _PRIME, size=SIGNATURE_SIZE, dtype=np.int64)
+_SOUNDEX = str.maketrans('bfpvcgjkqsxzdtlmnr', '111122222222334556')
+
+
+def soundex(word):
+    """American Soundex code of a lower-case ASCII word ("obi" -> "O100")"""
+    if not word:
+        return ''
+    digits = word.translate(_SOUNDEX)
+    code, last = [word[0].upper()], digits[0]
+    for char in digits[1:]:
+        if char.isdigit():
+            if char != last:
+                code.append(char)
+            last = char
+        elif char not in 'hw':
+            # a vowel separates two letters with the same code; h and w don't
+            last = ''
+    return (''.join(code) + '000')[:4]
+
+
+def business_words(business):
+    return [word for word in name_words(business or '') if len(word) >= 3 and word not in GENERIC_BUSINESS_WORDS]
+
+
+def name_code(full_name):
+    """Soundex codes of the first and last names, sorted so their order doesn't matter"""
+    words = name_words(full_name or '')
+    if not words:
+        return ''
+    return ' '.join(sorted({soundex(words[0]), soundex(words[-1])}))
+
+
+def business_token(business):
+    """The business's longest non-generic word"""
+    words = business_words(business)
+    return max(words, key=len) if words else ''
+
+
+def borrower_keys(full_name, mobile, business):
+    """The blocking keys of one borrower"""
+    phone, code, token = phone_key(mobile), name_code(full_name), business_token(business)
+    keys = [f"phone:{phone}"] if phone else []
+    if code:
+        keys.append(f"name:{code}")
+        if token:
+            keys.append(f"business:{token}:{code.split()[0]}")
+    return keys
+
+
+def _map_unique(series, func):
+    """series.map(func), calling func once per distinct value"""
+    values = series.unique()
+    return series.map(dict(zip(values, map(func, values))))
+
+
+def _codes(series):
+    """Integer code per value, -1 for blanks, so comparisons are on int arrays"""
+    return pd.factorize(series.mask(series == ''))[0]
+
+
+def signatures(texts):
+    """MinHash signature (SIGNATURE_SIZE ints) of every text's character trigrams"""
+    uniques, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+    result = np.empty((len(uniques), SIGNATURE_SIZE), dtype=np.int32)
+    for start in range(0, len(uniques), SIGNATURE_CHUNK):
+        hashes, counts = [], []
+        for text in uniques[start:start + SIGNATURE_CHUNK]:
+            padded = f"  {text} "
+            grams = {zlib.crc32(padded[i:i + 3].encode()) for i in range(len(padded) - 2)}
+            hashes.extend(grams)
+            counts.append(len(grams))
+        hashed = (np.array(hashes, dtype=np.int64)[:, None] % _PRIME * _HASH_A + _HASH_B) % _PRIME
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        result[start:start + len(counts)] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return result[inverse]
+
+
+class BorrowerTable:
+    """Borrower rows prepared for blocking and scoring, addressed by position"""
+
+    def __init__(self, rows):
+        frame = pd.DataFrame.from_records(list(rows), columns=FIELDS)
+        text = frame[list(FIELDS[1:])].fillna('').astype(str)
+        self.ids = frame['id'].to_numpy()
+
+        names = _map_unique(text['full_name'], lambda value: ' '.join(sorted(name_words(value))))
+        businesses = _map_unique(text['business'], lambda value: ' '.join(sorted(business_words(value))))
+        self.name_signatures = signatures(names)
+        self.business_signatures = signatures(businesses)
+        self.has_business = (businesses != '').to_numpy()
+        self.name_rank = pd.factorize(names, sort=True)[0]
+
+        phones = _map_unique(text['mobile'], lambda value: phone_key(value) or '')
+        self.phone = _codes(phones)
+        self.email = _codes(text['email'].str.strip().str.casefold())
+        self.unique_id = _codes(text['unique_id'].str.upper().str.replace(r'[^0-9A-Z]', '', regex=True))
+
+        # The keys borrower_keys() gives, one column per kind, NaN where a row has none
+        codes = _map_unique(text['full_name'], name_code)
+        tokens = _map_unique(text['business'], business_token)
+        self.keys = [
+            ('phone:' + phones).where(phones != ''),
+            ('name:' + codes).where(codes != ''),
+            ('business:' + tokens + ':' + codes.str.split(' ').str[0]).where((tokens != '') & (codes != '')),
+        ]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def key_rows(self):
+        """(borrower id, key) for every key of every row"""
+        for column in self.keys:
+            present = column.notna().to_numpy()
+            yield from zip(self.ids[present].tolist(), column[present])
+
+    def candidate_pairs(self, window=BLOCK_WINDOW):
+        """(left, right) positions of the pairs to compare, left < right, each pair once"""
+        n = len(self)
+        owners = np.concatenate([np.flatnonzero(column.notna()) for column in self.keys])
+        keys = pd.factorize(pd.concat([column.dropna() for column in self.keys]))[0]
+        order = np.lexsort((self.name_rank[owners], keys))
+        owners, keys = owners[order], keys[order]
+
+        pairs = []
+        for offset in range(1, min(window, len(owners) - 1) + 1):
+            same = keys[:-offset] == keys[offset:]
+            left, right = owners[:-offset][same], owners[offset:][same]
+            pairs.append(np.minimum(left, right).astype(np.int64) * n + np.maximum(left, right))
+        # sort and drop repeats; np.unique is far slower on millions of ints
+        pairs = np.sort(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+        pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+        return pairs // n, pairs % n
+
+    def score(self, left, right):
+        """Score (0-1) of every pair, and the parts it was made from"""
+        name = np.empty(len(left))
+        business = np.empty(len(left))
+        for start in range(0, len(left), PAIR_CHUNK):
+            l, r = left[start:start + PAIR_CHUNK], right[start:start + PAIR_CHUNK]
+            name[start:start + PAIR_CHUNK] = (self.name_signatures[l] == self.name_signatures[r]).mean(axis=1)
+            business[start:start + PAIR_CHUNK] = (
+                self.business_signatures[l] == self.business_signatures[r]
+            ).mean(axis=1)
+        compared = self.has_business[left] & self.has_business[right]
+        business[~compared] = 0.0
+
+        parts = {'name': name, 'business': business}
+        for field in ('phone', 'email', 'unique_id'):
+            codes = getattr(self, field)
+            parts[field] = (codes[left] == codes[right]) & (codes[left] >= 0)
+        contact = parts['phone'] | parts['email'] | parts['unique_id']
+        score = NAME_WEIGHT * name + CONTACT_WEIGHT * contact + BUSINESS_WEIGHT * business
+        # A blank business says nothing either way, so it doesn't count against the pair
+        score[~compared] /= NAME_WEIGHT + CONTACT_WEIGHT
+        return score, parts
+
+    @staticmethod
+    def describe(parts, i):
+        reasons = [f"name {parts['name'][i]:.2f}"]
+        reasons += [f"same {field.replace('_', ' ')}" for field in ('phone', 'email', 'unique_id') if parts[field][i]]
+        if parts['business'][i] >= 0.5:
+            reasons.append(f"business {parts['business'][i]:.2f}")
+        return ", ".join(reasons)
+
+
+def _sync_keys(organization, table):
+    """Bring the organization's BorrowerKey rows in line with `table`; returns (added, removed)"""
+    wanted = set(table.key_rows())
+    existing = {
+        (borrower_id, key): pk
+        for pk, borrower_id, key in BorrowerKey.objects.filter(organization=organization).values_list(
+            'id', 'borrower_id', 'key'
+        ).iterator(chunk_size=SIGNATURE_CHUNK)
+    }
+    stale = [pk for pair, pk in existing.items() if pair not in wanted]
+    for start in range(0, len(stale), LOOKUP_BATCH_SIZE):
+        BorrowerKey.objects.filter(pk__in=stale[start:start + LOOKUP_BATCH_SIZE]).delete()
+    missing = wanted - existing.keys()
+    BorrowerKey.objects.bulk_create(
+        [BorrowerKey(organization=organization, borrower_id=pk, key=key) for pk, key in missing],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    return len(missing), len(stale)
+
+
+def find_duplicates(organization, window=BLOCK_WINDOW, threshold=DUPLICATE_THRESHOLD):
+    """
+    Refresh the organization's blocking keys and queue every likely duplicate
+    pair not already in the review queue. Returns a Counter of figures.
+    """
+    rows = Borrower.objects.filter(organization=organization).order_by('id').values_list(*FIELDS)
+    table = BorrowerTable(rows.iterator(chunk_size=SIGNATURE_CHUNK))
+    stats = Counter(borrowers=len(table))
+    if not len(table):
+        return stats
+
+    with immediate_atomic():
+        stats['keys_added'], stats['keys_removed'] = _sync_keys(organization, table)
+
+    left, right = table.candidate_pairs(window)
+    score, parts = table.score(left, right)
+    flagged = np.flatnonzero(score >= threshold)
+    stats['pairs_compared'] = len(left)
+    stats['flagged'] = len(flagged)
+
+    # Pairs already in the queue keep their row and review status
+    queued = set(DuplicateCandidate.objects.filter(organization=organization).values_list('borrower_id', 'duplicate_id'))
+    candidates = [
+        DuplicateCandidate(
+            organization=organization,
+            borrower_id=borrower_id,
+            duplicate_id=duplicate_id,
+            score=round(float(score[i]), 3),
+            reasons=table.describe(parts, i),
+        )
+        for i, borrower_id, duplicate_id in zip(
+            flagged, table.ids[left[flagged]].tolist(), table.ids[right[flagged]].tolist()
+        )
+        if (borrower_id, duplicate_id) not in queued
+    ]
+    with immediate_atomic():
+        DuplicateCandidate.objects.bulk_create(candidates, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    stats['queued'] = len(candidates)
+    return stats
+
+
+def possible_duplicates(organization, full_name, mobile='', business='', email='', unique_id='',
+                        threshold=DUPLICATE_THRESHOLD):
+    """
+    Existing borrowers that a new client's details probably belong to, as
+    (borrower, score, reasons), best first. Only borrowers sharing a
+    blocking key in BorrowerKey are scored.
+    """
+    keys = borrower_keys(full_name, mobile, business)
+    if not keys:
+        return []
+    candidates = list(Borrower.objects.filter(
+        pk__in=BorrowerKey.objects.filter(organization=organization, key__in=keys).values('borrower_id')
+    ).only(*FIELDS)[:LIVE_CANDIDATES])
+    if not candidates:
+        return []
+
+    table = BorrowerTable(
+        [(0, full_name, unique_id, mobile, email, business)]
+        + [tuple(getattr(borrower, field) for field in FIELDS) for borrower in candidates]
+    )
+    right = np.arange(1, len(table))
+    score, parts = table.score(np.zeros_like(right), right)
+    hits = sorted(np.flatnonzero(score >= threshold), key=lambda i: -score[i])
+    return [(candidates[i], round(float(score[i]), 3), table.describe(parts, i)) for i in hits]
+
+
+def register_borrower(borrower, duplicates=()):
+    """Index a newly saved borrower's keys and queue the duplicates found for it"""
+    with immediate_atomic():
+        BorrowerKey.objects.bulk_create([
+            BorrowerKey(organization_id=borrower.organization_id, borrower=borrower, key=key)
+            for key in borrower_keys(borrower.full_name, borrower.mobile, borrower.business)
+        ], ignore_conflicts=True)
+        DuplicateCandidate.objects.bulk_create([
+            DuplicateCandidate(
+                organization_id=borrower.organization_id, borrower=existing, duplicate=borrower,
+                score=score, reasons=reasons,
+            )
+            for existing, score, reasons in duplicates
+        ], ignore_conflicts=True)
@@ -0,0 +1,129 @@
+import csv
+import io
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Rows fetched per database round-trip when iterating export querysets
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows buffered into each chunk of a streamed CSV/NDJSON response
+STREAM_BATCH_SIZE = 500
+
+
+def stream_rows(queryset, *fields):
+    """
+    Iterate a queryset as plain tuples without caching the result set.
+    """
+    return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def write_workbook(rows, columns, fileobj, title="Report"):
+    """
+    Write `rows` to an xlsx file using openpyxl's write-only mode, which
+    flushes each row to disk instead of keeping the sheet in memory.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+
+    header = []
+    for name in columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    for row in rows:
+        ws.append(row)
+
+    wb.save(fileobj)
+    return fileobj
+
+
+def export_to_excel(rows, columns, filename):
+    """
+    Excel download for any iterable of row tuples.
+
+    The workbook is built in a temporary file (an xlsx is a zip archive, so
+    it can only be finalised once every row is written) and then streamed
+    back to the client in chunks by FileResponse.
+    """
+    tmp = tempfile.TemporaryFile()
+    write_workbook(rows, columns, tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def _batched(lines):
+    """
+    Join encoded lines into chunks so the response isn't one write per row.
+    The first line is sent on its own so the client gets a byte straight away.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None:
+        yield first
+
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= STREAM_BATCH_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(rows, columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values):
+        writer.writerow(values)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    # The header goes out before the queryset is evaluated
+    yield line(columns)
+    for row in rows:
+        yield line(row)
+
+
+def ndjson_lines(rows, columns):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def export_to_csv(rows, columns, filename):
+    response = StreamingHttpResponse(_batched(csv_lines(rows, columns)), content_type="text/csv")
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_to_ndjson(rows, columns, filename):
+    response = StreamingHttpResponse(_batched(ndjson_lines(rows, columns)), content_type="application/x-ndjson")
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+EXPORTERS = {
+    'xlsx': (export_to_excel, 'xlsx'),
+    'csv': (export_to_csv, 'csv'),
+    'ndjson': (export_to_ndjson, 'ndjson'),
+}
+
+
+def export_report(rows, columns, name, fmt='xlsx'):
+    """Dispatch a report export to the Excel, CSV or NDJSON writer"""
+    exporter, extension = EXPORTERS[fmt]
+    return exporter(rows, columns, f"{name}.{extension}")
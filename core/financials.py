@@ -0,0 +1,76 @@
+"""
+Branch-level income and expenses.
+
+`branch_financials` returns collections, expenses and equity for every
+branch of an organization from two grouped queries (plus the branch list),
+so the cost no longer grows with the number of branches.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+from .models import Branch, Expense, Repayment
+
+
+UNASSIGNED = "Unassigned"
+
+
+def _grouped(qs, branch_field, start, end, by_month):
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    keys = [branch_field]
+    if by_month:
+        qs = qs.annotate(month=TruncMonth('date'))
+        keys.append('month')
+    totals = {}
+    for row in qs.values(*keys).annotate(total=Sum('amount')).order_by():
+        totals[(row[branch_field], row.get('month'))] = row['total']
+    return totals
+
+
+def branch_financials(organization_id, start=None, end=None, by_month=False):
+    """
+    One row per branch (and per month when `by_month`) with collections,
+    expenses and equity, ordered by branch name then month.
+
+    Collections on loans without a branch are reported on an "Unassigned"
+    row so the rows always add up to the organization's totals. With
+    `by_month`, only months with activity get a row.
+    """
+    collections = _grouped(
+        Repayment.objects.filter(loan__organization_id=organization_id), 'loan__branch_id', start, end, by_month
+    )
+    expenses = _grouped(
+        Expense.objects.filter(organization_id=organization_id), 'branch_id', start, end, by_month
+    )
+    branches = {branch.id: branch for branch in Branch.objects.filter(organization_id=organization_id).only('id', 'name')}
+
+    keys = set(collections) | set(expenses)
+    if not by_month:
+        keys |= {(branch_id, None) for branch_id in branches}
+
+    rows = []
+    for branch_id, month in keys:
+        branch = branches.get(branch_id)
+        collected = collections.get((branch_id, month)) or Decimal('0.00')
+        spent = expenses.get((branch_id, month)) or Decimal('0.00')
+        rows.append({
+            'branch': branch,
+            'name': branch.name if branch else UNASSIGNED,
+            'month': month,
+            'collections': collected,
+            'expenses': spent,
+            'equity': collected - spent,
+        })
+    rows.sort(key=lambda row: (row['branch'] is None, row['name'], row['month'] or 0))
+    return rows
+
+
+def financial_totals(rows):
+    """Organization totals for a set of branch_financials rows"""
+    collections = sum((row['collections'] for row in rows), Decimal('0.00'))
+    expenses = sum((row['expenses'] for row in rows), Decimal('0.00'))
+    return {'collections': collections, 'expenses': expenses, 'equity': collections - expenses}
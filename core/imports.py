@@ -0,0 +1,377 @@
+"""
+Bulk onboarding imports.
+
+Files are read with pandas IMPORT_CHUNK_SIZE rows at a time and every
+check is done on whole columns; lookups against the database are one
+query per file or one IN lookup per LOOKUP_BATCH_SIZE keys. Failing rows
+are listed, with their line number and the reason, in the result's error
+report.
+
+Borrower imports write each chunk's good rows as they go. Loan
+disbursements are all-or-nothing: the whole file is validated first and
+then written in one transaction.
+"""
+import csv
+import io
+import uuid
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.conf import settings
+
+from .dashboard import invalidate_dashboard
+from .db import immediate_atomic
+from .models import Borrower, Branch, Loan, LoanInstallment, LoanOfficer
+from .schedules import build_schedule, declining_interest
+
+
+IMPORT_CHUNK_SIZE = 10000
+BULK_BATCH_SIZE = 2000
+# Values per IN (...) lookup; stays under SQLite's variable limit
+LOOKUP_BATCH_SIZE = 900
+
+BORROWER_COLUMNS = ('full_name', 'unique_id', 'branch', 'business', 'mobile', 'email', 'status')
+BORROWER_STATUSES = {value.casefold(): value for value, _ in Borrower.STATUS_CHOICES}
+EMAIL = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+
+@dataclass
+class ImportResult:
+    valid: int = 0
+    created: int = 0
+    # (line number in the file, key of the row, message)
+    errors: list = field(default_factory=list)
+    # Sums of the imported amounts, for imports that have them
+    totals: dict = field(default_factory=dict)
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+    def error_report(self):
+        """The rejected rows as CSV text"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["line", "unique_id", "error"])
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+def error_report_path(name):
+    return Path(settings.REPORT_FILES_DIR) / 'imports' / name
+
+
+def save_error_report(result):
+    """Write the result's error report under REPORT_FILES_DIR and return its file name"""
+    name = f"errors-{uuid.uuid4().hex}.csv"
+    path = error_report_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(result.error_report())
+    return name
+
+
+def read_chunks(upload, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    DataFrames of at most `chunk_size` rows from a CSV or XLSX upload (or
+    path), every cell a stripped string. Column names are lower-cased with
+    spaces as underscores, and each frame is indexed by its line in the file.
+    """
+    name = str(getattr(upload, 'name', upload)).lower()
+    if name.endswith(('.xlsx', '.xlsm')):
+        # openpyxl can't stream into pandas, so the sheet is split after reading
+        frame = pd.read_excel(upload, dtype=str, keep_default_na=False)
+        chunks = (frame.iloc[start:start + chunk_size] for start in range(0, len(frame), chunk_size))
+    else:
+        chunks = pd.read_csv(
+            upload, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8-sig', skipinitialspace=True
+        )
+
+    for chunk in chunks:
+        chunk = chunk.copy()
+        chunk.columns = [str(column).strip().lower().replace(' ', '_') for column in chunk.columns]
+        chunk = chunk.apply(lambda column: column.str.strip())
+        chunk.index = chunk.index + 2  # line 1 is the header
+        yield chunk
+
+
+def prepare_columns(chunk, required, optional):
+    """Check the required columns are present and add blank optional ones"""
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for column in optional:
+        if column not in chunk.columns:
+            chunk[column] = ''
+
+
+def existing_values(queryset, field_name, values):
+    """The subset of `values` already present in `field_name`, in batched IN lookups"""
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        found.update(queryset.filter(
+            **{f"{field_name}__in": values[start:start + LOOKUP_BATCH_SIZE]}
+        ).values_list(field_name, flat=True))
+    return found
+
+
+def first_error(chunk, checks):
+    """
+    The message of the first failing check for every row ('' when it
+    passes). `checks` is a list of (boolean mask of bad rows, message).
+    """
+    masks = [np.asarray(mask, dtype=bool) for mask, _ in checks]
+    messages = [message for _, message in checks]
+    return pd.Series(np.select(masks, messages, default=''), index=chunk.index)
+
+
+def _borrower_errors(chunk, seen):
+    unique_id = chunk['unique_id']
+    status = chunk['status'].str.casefold()
+    email = chunk['email']
+
+    # Repeats inside the file: every occurrence after the first, this chunk or earlier ones
+    repeated = unique_id.duplicated() | unique_id.isin(seen)
+    candidates = set(unique_id[(unique_id != '') & ~repeated])
+    taken = unique_id.isin(existing_values(Borrower.objects.all(), 'unique_id', candidates))
+
+    return first_error(chunk, [
+        (chunk['full_name'] == '', "full_name is required"),
+        (unique_id == '', "unique_id is required"),
+        (chunk['branch'] == '', "branch is required"),
+        (chunk['full_name'].str.len() > 200, "full_name is longer than 200 characters"),
+        (unique_id.str.len() > 50, "unique_id is longer than 50 characters"),
+        (chunk['mobile'].str.len() > 20, "mobile is longer than 20 characters"),
+        (chunk['branch_id'].isna(), "unknown branch"),
+        ((status != '') & ~status.isin(BORROWER_STATUSES), "unknown status"),
+        ((email != '') & ~email.str.match(EMAIL), "invalid email"),
+        (repeated, "unique_id appears earlier in the file"),
+        (taken, "unique_id already exists"),
+    ])
+
+
+def import_borrowers(organization, upload, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create borrowers from a CSV/XLSX file with the columns full_name,
+    unique_id and branch (the branch name), plus optional business, mobile,
+    email and status. Returns an ImportResult.
+
+    Good rows are created even when others fail; `dry_run` only validates.
+    """
+    branches = {
+        name.casefold(): pk
+        for pk, name in Branch.objects.filter(organization=organization).values_list('id', 'name')
+    }
+    result = ImportResult()
+    seen = set()
+
+    for chunk in read_chunks(upload, chunk_size):
+        prepare_columns(chunk, BORROWER_COLUMNS[:3], BORROWER_COLUMNS[3:])
+        chunk['branch_id'] = chunk['branch'].str.casefold().map(branches)
+
+        errors = _borrower_errors(chunk, seen)
+        seen.update(chunk['unique_id'])
+        bad = errors != ''
+        result.errors.extend(zip(chunk.index[bad].tolist(), chunk['unique_id'][bad], errors[bad]))
+
+        good = chunk[~bad]
+        result.valid += len(good)
+        if dry_run or good.empty:
+            continue
+        statuses = good['status'].str.casefold().map(BORROWER_STATUSES).fillna('Active')
+        borrowers = [
+            Borrower(
+                organization_id=organization.id,
+                branch_id=int(branch_id),
+                full_name=full_name,
+                business=business or None,
+                unique_id=unique_id,
+                mobile=mobile or None,
+                email=email or None,
+                status=status,
+            )
+            for full_name, unique_id, branch_id, business, mobile, email, status in zip(
+                good['full_name'], good['unique_id'], good['branch_id'],
+                good['business'], good['mobile'], good['email'], statuses,
+            )
+        ]
+        with immediate_atomic():
+            Borrower.objects.bulk_create(borrowers, batch_size=BULK_BATCH_SIZE)
+        result.created += len(borrowers)
+
+    if result.created:
+        invalidate_dashboard(organization.id)
+    return result
+
+
+# -------------------------
+# LOAN DISBURSEMENTS
+# -------------------------
+
+LOAN_COLUMNS = (
+    'unique_id', 'principal', 'interest_rate', 'tenure',
+    'fees', 'disbursed_date', 'repayment_frequency', 'interest_method', 'officer',
+)
+LOAN_FREQUENCIES = {value.casefold(): value for value, _ in Loan.FREQUENCY_CHOICES}
+LOAN_INTEREST_METHODS = {
+    **{value.casefold(): value for value, _ in Loan.INTEREST_METHOD_CHOICES},
+    **{label.casefold(): value for value, label in Loan.INTEREST_METHOD_CHOICES},
+}
+# Loan amounts are DecimalField(max_digits=12, decimal_places=2)
+MAX_AMOUNT = 10 ** 10
+MAX_TENURE_DAYS = 3650
+
+
+def _borrower_lookup(organization, unique_ids):
+    """unique_id -> (borrower id, branch id) for the organization's borrowers"""
+    unique_ids = list(unique_ids)
+    found = {}
+    borrowers = Borrower.objects.filter(organization=organization)
+    for start in range(0, len(unique_ids), LOOKUP_BATCH_SIZE):
+        for pk, unique_id, branch_id in borrowers.filter(
+            unique_id__in=unique_ids[start:start + LOOKUP_BATCH_SIZE]
+        ).values_list('id', 'unique_id', 'branch_id'):
+            found[unique_id] = (pk, branch_id)
+    return found
+
+
+def _loan_columns(chunk, officers, today):
+    """Parsed and derived columns for a chunk of disbursement rows"""
+    blank = chunk == ''
+    columns = pd.DataFrame(index=chunk.index)
+    columns['principal'] = pd.to_numeric(chunk['principal'], errors='coerce').round(2)
+    columns['interest_rate'] = pd.to_numeric(chunk['interest_rate'], errors='coerce').round(2)
+    tenure = pd.to_numeric(chunk['tenure'], errors='coerce')
+    columns['tenure'] = tenure.where((tenure >= 1) & (tenure <= MAX_TENURE_DAYS) & (tenure % 1 == 0))
+    columns['fees'] = pd.to_numeric(chunk['fees'].mask(blank['fees'], '0'), errors='coerce').round(2)
+    columns['disbursed_date'] = pd.to_datetime(
+        chunk['disbursed_date'].mask(blank['disbursed_date'], today.isoformat()), errors='coerce', format='%Y-%m-%d'
+    )
+    columns['repayment_frequency'] = chunk['repayment_frequency'].str.casefold().map(LOAN_FREQUENCIES)
+    columns['repayment_frequency'] = columns['repayment_frequency'].mask(blank['repayment_frequency'], 'Monthly')
+    columns['interest_method'] = chunk['interest_method'].str.casefold().map(LOAN_INTEREST_METHODS)
+    columns['interest_method'] = columns['interest_method'].mask(blank['interest_method'], 'Flat')
+    columns['officer_id'] = chunk['officer'].map(officers)
+
+    # What Loan.save() and Loan.interest / total_due work out row by row, in
+    # whole cents with the same half-even rounding. This is the flat interest;
+    # import_loans replaces it for declining-balance loans.
+    columns['maturity'] = columns['disbursed_date'] + pd.to_timedelta(columns['tenure'], unit='D')
+    principal = (columns['principal'].fillna(0) * 100).round().astype(np.int64)
+    rate = (columns['interest_rate'].fillna(0) * 100).round().astype(np.int64)
+    interest, remainder = np.divmod(principal * rate, 10000)
+    interest += (remainder * 2 > 10000) | ((remainder * 2 == 10000) & (interest % 2 == 1))
+    columns['interest_cents'] = interest
+    columns['total_due_cents'] = principal + interest + (columns['fees'].fillna(0) * 100).round().astype(np.int64)
+    return columns
+
+
+def import_loans(organization, upload, officer, dry_run=False, today=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Disburse loans from a CSV/XLSX file with the columns unique_id (the
+    borrower), principal, interest_rate and tenure (days), plus optional
+    fees, disbursed_date (YYYY-MM-DD, default today), repayment_frequency,
+    interest_method and officer (username, default `officer`).
+
+    Nothing is written unless every row is valid. Loans go to their
+    borrower's branch and get their repayment schedules in the same
+    transaction. Returns an ImportResult whose totals hold the principal,
+    interest and total due disbursed.
+    """
+    today = today or date.today()
+    officers = dict(
+        LoanOfficer.objects.filter(organization=organization).values_list('user__username', 'id')
+    )
+    officers[''] = officer.id
+    result = ImportResult()
+    frames = []
+
+    for chunk in read_chunks(upload, chunk_size):
+        prepare_columns(chunk, LOAN_COLUMNS[:4], LOAN_COLUMNS[4:])
+        borrowers = _borrower_lookup(organization, set(chunk['unique_id']) - {''})
+        columns = _loan_columns(chunk, officers, today)
+        found = chunk['unique_id'].map(borrowers)
+
+        errors = first_error(chunk, [
+            (chunk['unique_id'] == '', "unique_id is required"),
+            (found.isna(), "unknown borrower"),
+            (~(columns['principal'] > 0), "principal must be a number greater than zero"),
+            (~columns['interest_rate'].between(0, 999.99), "interest_rate must be between 0 and 999.99"),
+            (columns['tenure'].isna(), f"tenure must be a whole number of days up to {MAX_TENURE_DAYS}"),
+            (~(columns['fees'] >= 0), "fees must be zero or more"),
+            (columns['disbursed_date'].isna(), "disbursed_date must be YYYY-MM-DD"),
+            (columns['repayment_frequency'].isna(), "unknown repayment_frequency"),
+            (columns['interest_method'].isna(), "unknown interest_method"),
+            (columns['officer_id'].isna(), "unknown officer"),
+            (~(columns['total_due_cents'] < MAX_AMOUNT * 100), "amount too large"),
+        ])
+        bad = errors != ''
+        result.errors.extend(zip(chunk.index[bad].tolist(), chunk['unique_id'][bad], errors[bad]))
+
+        result.valid += int((~bad).sum())
+        if result.errors:
+            continue  # nothing will be written; keep validating for the report
+
+        columns['borrower_id'] = found.str[0]
+        columns['branch_id'] = found.str[1]
+        for column in ('principal', 'interest_rate', 'fees'):
+            columns[column] = columns[column].map(lambda value: Decimal(f"{value:.2f}"))
+        frames.append(columns)
+
+    if result.errors or not result.valid:
+        return result
+
+    rows = pd.concat(frames)
+    loans = [
+        Loan(
+            organization_id=organization.id,
+            branch_id=int(branch_id),
+            borrower_id=int(borrower_id),
+            officer_id=int(officer_id),
+            principal=principal,
+            interest_rate=rate,
+            fees=fees,
+            tenure=int(tenure),
+            repayment_frequency=frequency,
+            interest_method=method,
+            status='Active',
+            disbursed_date=disbursed.date(),
+            # bulk_create skips Loan.save(), which normally sets this
+            maturity=maturity.date(),
+        )
+        for branch_id, borrower_id, officer_id, principal, rate, fees, tenure, frequency, method, disbursed, maturity
+        in zip(
+            rows['branch_id'], rows['borrower_id'], rows['officer_id'], rows['principal'], rows['interest_rate'],
+            rows['fees'], rows['tenure'], rows['repayment_frequency'], rows['interest_method'],
+            rows['disbursed_date'], rows['maturity'],
+        )
+    ]
+
+    # Declining-balance interest follows from each loan's schedule, not the rate alone
+    interest_cents = rows['interest_cents'].to_numpy(copy=True)
+    for position, loan in enumerate(loans):
+        if loan.interest_method == 'Declining':
+            loan.scheduled_interest = declining_interest(loan)
+            interest_cents[position] = int(loan.scheduled_interest * 100)
+    total_due_cents = rows['total_due_cents'].to_numpy() - rows['interest_cents'].to_numpy() + interest_cents
+    result.totals = {
+        'principal': sum(rows['principal'], Decimal('0.00')),
+        'interest': Decimal(int(interest_cents.sum())).scaleb(-2),
+        'total_due': Decimal(int(total_due_cents.sum())).scaleb(-2),
+    }
+    if dry_run:
+        return result
+
+    with immediate_atomic():
+        Loan.objects.bulk_create(loans, batch_size=BULK_BATCH_SIZE)
+        LoanInstallment.objects.bulk_create(
+            [installment for loan in loans for installment in build_schedule(loan)], batch_size=BULK_BATCH_SIZE
+        )
+        transaction.on_commit(lambda: invalidate_dashboard(organization.id))
+    result.created = len(loans)
+    return result
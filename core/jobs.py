@@ -0,0 +1,186 @@
+"""
+Database-backed queue for report generation.
+
+Views call `enqueue_report` and return immediately; the
+`run_report_worker` management command claims queued jobs and builds the
+files in a process pool. Finished files are reused for identical requests
+(same organization, report, format and parameters) for
+REPORT_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import json
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.timezone import now
+
+from .exports import write_workbook
+from .models import ReportJob
+from .pdf import write_pdf
+from .reports import (
+    collection_rows, loan_portfolio_rows, par30_rows, branch_equity_rows, balance_sheet_rows,
+)
+from .routers import reporting_reads
+
+
+# Jobs left in Running for longer than this are assumed to belong to a dead worker
+STALE_AFTER = timedelta(hours=1)
+
+FORMATS = ('xlsx', 'pdf')
+
+
+def _collections(job):
+    return collection_rows(job.organization_id, job.params['start_date'], job.params['end_date'])
+
+
+def _loan_portfolio(job):
+    return loan_portfolio_rows(job.organization_id)
+
+
+def _par30_loans(job):
+    return par30_rows(job.organization_id)
+
+
+def _branch_equity(job):
+    params = job.params
+    return branch_equity_rows(
+        job.organization_id, params.get('start_date'), params.get('end_date'), by_month=params.get('by') == 'month'
+    )
+
+
+def _balance_sheet(job):
+    return balance_sheet_rows(job.organization_id)
+
+
+# report name -> (title shown to users, row source, columns totalled in PDFs)
+REPORTS = {
+    'daily_collections': ("Daily Collections", _collections, (2,)),
+    'monthly_collections': ("Monthly Collections", _collections, (2,)),
+    'custom_collections': ("Custom Collections", _collections, (2,)),
+    'loan_portfolio': ("Loan Portfolio", _loan_portfolio, (2,)),
+    'par30_loans': ("PAR30 Loans", _par30_loans, (2, 3)),
+    'branch_equity': ("Branch Equity", _branch_equity, (1, 2, 3)),
+    'balance_sheet': ("Balance Sheet", _balance_sheet, ()),
+}
+
+
+def report_cache_key(organization_id, report, fmt, params):
+    payload = json.dumps([organization_id, report, fmt, params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def enqueue_report(organization, report, params=None, requested_by=None, fmt='xlsx'):
+    """
+    Queue a report, or return an existing job for the same request.
+
+    A job that is still queued or running is shared, and a finished one is
+    reused while it is younger than REPORT_CACHE_TIMEOUT and its file is
+    still on disk.
+    """
+    if report not in REPORTS:
+        raise ValueError(f"Unknown report {report!r}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+
+    params = params or {}
+    key = report_cache_key(organization.id, report, fmt, params)
+    fresh_since = now() - timedelta(seconds=settings.REPORT_CACHE_TIMEOUT)
+
+    for job in ReportJob.objects.filter(cache_key=key).exclude(status='Failed').order_by('-created_at')[:1]:
+        if job.status != 'Done':
+            return job
+        if job.finished_at >= fresh_since and job_file_path(job).exists():
+            return job
+
+    return ReportJob.objects.create(
+        organization=organization,
+        report=report,
+        format=fmt,
+        params=params,
+        cache_key=key,
+        requested_by=requested_by,
+    )
+
+
+def claim_next_job():
+    """
+    Move the oldest queued job to Running and return its id, or None.
+
+    The conditional UPDATE makes the claim safe when several workers poll
+    the same table: only one of them sees a row count of 1.
+    """
+    while True:
+        job_id = (
+            ReportJob.objects.filter(status='Queued')
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = ReportJob.objects.filter(pk=job_id, status='Queued').update(
+            status='Running', started_at=now()
+        )
+        if claimed:
+            return job_id
+
+
+def requeue_stale_jobs():
+    return ReportJob.objects.filter(status='Running', started_at__lt=now() - STALE_AFTER).update(
+        status='Queued', started_at=None
+    )
+
+
+def job_file_path(job):
+    return Path(settings.REPORT_FILES_DIR) / job.file
+
+
+def job_download_name(job):
+    return f"{job.report}.{job.format}"
+
+
+def _subtitle(job):
+    params = job.params
+    start, end = params.get('start_date'), params.get('end_date')
+    if start and start == end:
+        return f"Date: {start}"
+    if start and end:
+        return f"Period: {start} to {end}"
+    if start:
+        return f"From {start}"
+    if end:
+        return f"Up to {end}"
+    return f"As at {job.created_at:%Y-%m-%d}"
+
+
+def run_job(job_id):
+    """Build the file for a claimed job. Runs inside a worker process."""
+    job = ReportJob.objects.select_related('organization').get(pk=job_id)
+    title, source, sum_columns = REPORTS[job.report]
+    filename = f"{job.pk}-{job_download_name(job)}"
+    path = Path(settings.REPORT_FILES_DIR) / filename
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The rows are read lazily while the file is written, so both happen on the replica
+        with reporting_reads():
+            columns, rows = source(job)
+            with open(path, 'wb') as fh:
+                if job.format == 'pdf':
+                    write_pdf(
+                        f"{job.organization.name} - {title}", columns, rows, fh,
+                        subtitle=_subtitle(job), sum_columns=sum_columns,
+                    )
+                else:
+                    write_workbook(rows, columns, fh)
+    except Exception:
+        path.unlink(missing_ok=True)
+        ReportJob.objects.filter(pk=job.pk).update(
+            status='Failed', error=traceback.format_exc(), finished_at=now()
+        )
+        return job_id
+
+    ReportJob.objects.filter(pk=job.pk).update(status='Done', file=filename, finished_at=now())
+    return job_id
@@ -0,0 +1,57 @@
+"""Shared helpers for the bench_* management commands."""
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from core.models import Organization, Branch, LoanOfficer, Borrower, Loan
+
+
+@contextmanager
+def scratch_database(keep=False):
+    """
+    Run the benchmark against a throwaway test database so it never
+    touches real data.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keep)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+
+
+def make_officer(name="bench"):
+    """Organization, branch and loan officer to hang benchmark data off"""
+    organization = Organization.objects.create(name=f"{name} org")
+    branch = Branch.objects.create(organization=organization, name=f"{name} branch")
+    user = User.objects.create_user(username=f"{name}-officer", password="bench")
+    return LoanOfficer.objects.create(user=user, organization=organization, branch=branch)
+
+
+def make_loan(officer, unique_id, principal=Decimal('1000000.00')):
+    borrower = Borrower.objects.create(
+        organization=officer.organization,
+        branch=officer.branch,
+        full_name=f"Borrower {unique_id}",
+        unique_id=unique_id,
+    )
+    return Loan.objects.create(
+        organization=officer.organization,
+        branch=officer.branch,
+        borrower=borrower,
+        officer=officer,
+        principal=principal,
+        interest_rate=Decimal('10.00'),
+    )
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
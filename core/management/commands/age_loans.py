@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.aging import age_loans
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Recompute days past due for open loans and update Active / Overdue / PAR30 / Closed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="Age as of this date (YYYY-MM-DD), default today")
+        parser.add_argument('--organization', type=int, help="Only age this organization's loans")
+        parser.add_argument('--dry-run', action='store_true', help="Report changes without saving them")
+
+    def handle(self, *args, **options):
+        with Timer() as aging:
+            changed, buckets = age_loans(
+                today=options['date'], organization_id=options['organization'], dry_run=options['dry_run']
+            )
+
+        for label, count in buckets.items():
+            self.stdout.write(f"{label:>8}: {count}")
+        moved = ", ".join(f"{count} -> {status}" for status, count in changed.items()) or "no changes"
+        verb = "would move" if options['dry_run'] else "moved"
+        self.stdout.write(f"{verb} {moved} in {aging.elapsed:.2f} s")
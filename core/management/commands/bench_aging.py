@@ -0,0 +1,49 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.aging import age_loans
+from core.models import Loan
+from ._bench import scratch_database, make_officer, Timer
+
+
+class Command(BaseCommand):
+    help = "Time the nightly aging pass over a synthetic loan book"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        today = date.today()
+        rng = random.Random(1)
+
+        with scratch_database():
+            officer = make_officer()
+            batch = []
+            for i in range(options['loans']):
+                disbursed = today - timedelta(days=rng.randint(0, 180))
+                batch.append(Loan(
+                    organization=officer.organization,
+                    branch=officer.branch,
+                    officer=officer,
+                    principal=Decimal('1000.00'),
+                    interest_rate=Decimal('10.00'),
+                    paid=Decimal(rng.choice(['0.00', '500.00', '1100.00'])),
+                    disbursed_date=disbursed,
+                    maturity=disbursed + timedelta(days=30),
+                ))
+                if len(batch) == 5000:
+                    Loan.objects.bulk_create(batch)
+                    batch = []
+            Loan.objects.bulk_create(batch)
+
+            with Timer() as first:
+                changed, buckets = age_loans(today=today)
+            with Timer() as second:
+                age_loans(today=today)
+
+            self.stdout.write(f"{options['loans']} loans: {buckets}")
+            self.stdout.write(f"first pass {first.elapsed:.2f} s ({sum(changed.values())} updated)")
+            self.stdout.write(f"second pass {second.elapsed:.2f} s (nothing to update)")
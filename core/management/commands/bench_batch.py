@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.models import PostingBatch
+from core.services import post_batch_items
+from ._bench import scratch_database, make_officer, make_loan, Timer
+
+
+class Command(BaseCommand):
+    help = "Time a bulk posting-batch submission"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help="Items in the batch")
+        parser.add_argument('--loans', type=int, default=500, help="Distinct loans the items are spread across")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            officer = make_officer()
+            loan_ids = [make_loan(officer, unique_id=f"BATCH-{i}").id for i in range(options['loans'])]
+            batch = PostingBatch.objects.create(officer=officer)
+
+            entries = [
+                {'loan': loan_ids[i % len(loan_ids)], 'amount': '250.00', 'remarks': 'bench'}
+                for i in range(options['items'])
+            ]
+
+            with Timer() as posting:
+                post_batch_items(batch, entries, posted_by=officer.user)
+
+            self.stdout.write(
+                f"posted {options['items']} items across {len(loan_ids)} loans "
+                f"in {posting.elapsed * 1000:.1f} ms"
+            )
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+
+from core.financials import branch_financials
+from core.models import Branch, Borrower, Expense, Loan, Repayment
+from ._bench import scratch_database, make_officer, Timer
+
+
+def per_branch_loop(organization_id):
+    """The previous implementation: two aggregates per branch"""
+    rows = []
+    for branch in Branch.objects.filter(organization_id=organization_id):
+        collections = Repayment.objects.filter(loan__branch=branch).aggregate(total=Sum("amount"))["total"] or 0
+        expenses = Expense.objects.filter(branch=branch).aggregate(total=Sum("amount"))["total"] or 0
+        rows.append((branch.name, collections, expenses, collections - expenses))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Compare the per-branch equity loop with the grouped branch_financials queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branches', type=int, default=500)
+        parser.add_argument('--repayments', type=int, default=20, help="Repayments (and expenses) per branch")
+
+    def timed(self, label, func, organization_id):
+        with CaptureQueriesContext(connection) as queries, Timer() as timer:
+            rows = func(organization_id)
+        self.stdout.write(f"{label:>18}: {timer.elapsed * 1000:8.1f} ms, {len(queries):4d} queries, {len(rows)} rows")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            organization = make_officer().organization
+            branches = Branch.objects.bulk_create(
+                [Branch(organization=organization, name=f"Branch {i:04d}") for i in range(options['branches'])]
+            )
+            borrowers = Borrower.objects.bulk_create([
+                Borrower(organization=organization, branch=branch, full_name=branch.name, unique_id=f"BR-{branch.pk}")
+                for branch in branches
+            ])
+            loans = Loan.objects.bulk_create([
+                Loan(organization=organization, branch=branch, borrower=borrower, principal=Decimal('1000.00'))
+                for branch, borrower in zip(branches, borrowers)
+            ])
+            per_branch = options['repayments']
+            Repayment.objects.bulk_create(
+                [Repayment(loan=loan, amount=Decimal('10.00')) for loan in loans for _ in range(per_branch)],
+                batch_size=2000,
+            )
+            Expense.objects.bulk_create(
+                [Expense(organization=organization, branch=branch, category='Other', amount=Decimal('3.00'))
+                 for branch in branches for _ in range(per_branch)],
+                batch_size=2000,
+            )
+
+            self.timed("per-branch loop", per_branch_loop, organization.id)
+            self.timed("branch_financials", branch_financials, organization.id)
+            self.timed("by month", lambda org_id: branch_financials(org_id, by_month=True), organization.id)
@@ -0,0 +1,73 @@
+import multiprocessing
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.workers import init_bench_worker, run_posting_worker
+from ._bench import scratch_database, make_officer, make_loan
+
+
+# name -> (pragmas applied to each connection, use BEGIN IMMEDIATE)
+MODES = {
+    'rollback journal, deferred': ({'journal_mode': 'DELETE'}, False),
+    'WAL + pragmas, immediate': (settings.SQLITE_PRAGMAS, True),
+}
+
+
+class Command(BaseCommand):
+    help = "Post batches from several processes at once against a file-backed SQLite database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--rounds', type=int, default=100, help="Batches posted by each worker")
+        parser.add_argument('--items', type=int, default=10, help="Items per batch")
+
+    def handle(self, *args, **options):
+        workers, rounds, items = options['workers'], options['rounds'], options['items']
+        tmp = Path(tempfile.mkdtemp(prefix='bench-contention-'))
+        template = tmp / 'template.sqlite3'
+
+        try:
+            connection.settings_dict['TEST']['NAME'] = str(template)
+            with scratch_database():
+                officer = make_officer()
+                loan_ids = [make_loan(officer, unique_id=f"LOCK-{i}").id for i in range(workers * items)]
+                # Closing the last connection checkpoints the WAL into the file
+                connection.close()
+                for number, (pragmas, _) in enumerate(MODES.values()):
+                    db_path = tmp / f"mode-{number}.sqlite3"
+                    shutil.copy(template, db_path)
+                    # Switch the journal mode before the workers race to do it
+                    with sqlite3.connect(db_path) as db:
+                        db.execute(f"PRAGMA journal_mode = {pragmas['journal_mode']}")
+
+            for number, (mode, (pragmas, immediate)) in enumerate(MODES.items()):
+                db_path = str(tmp / f"mode-{number}.sqlite3")
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=context,
+                    initializer=init_bench_worker, initargs=(db_path, pragmas),
+                ) as pool:
+                    futures = [
+                        pool.submit(run_posting_worker, loan_ids[w * items:(w + 1) * items], rounds, immediate)
+                        for w in range(workers)
+                    ]
+                    results = [future.result() for future in futures]
+
+                posted = sum(r[0] for r in results)
+                locked = sum(r[1] for r in results)
+                # Slowest worker, so process start-up is not counted
+                elapsed = max(r[2] for r in results)
+                self.stdout.write(
+                    f"{mode:>28}: {posted} items in {elapsed:.2f} s "
+                    f"({posted / elapsed:,.0f}/s), {locked} of {workers * rounds} batches "
+                    f"failed with 'database is locked'"
+                )
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
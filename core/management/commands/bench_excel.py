@@ -0,0 +1,59 @@
+import resource
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.models import Repayment
+from ._bench import scratch_database, make_officer, make_loan, Timer
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident set size"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = "Time custom_collections_excel over a large repayment history and record peak RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Repayments to export")
+        parser.add_argument('--loans', type=int, default=1000, help="Loans the repayments are spread across")
+
+    def handle(self, *args, **options):
+        rows, loan_count = options['rows'], options['loans']
+
+        with scratch_database():
+            officer = make_officer()
+            loan_ids = [make_loan(officer, unique_id=f"XL-{i}").id for i in range(loan_count)]
+
+            start = date.today() - timedelta(days=365 * 3)
+            batch = []
+            for i in range(rows):
+                batch.append(Repayment(loan_id=loan_ids[i % loan_count], amount=Decimal('150.00')))
+                if len(batch) == 10000:
+                    Repayment.objects.bulk_create(batch)
+                    batch = []
+            Repayment.objects.bulk_create(batch)
+            self.stdout.write(f"seeded {rows} repayments, peak RSS {peak_rss_mb():.1f} MB")
+
+            client = Client()
+            client.force_login(officer.user)
+            rss_before = peak_rss_mb()
+
+            with Timer() as export:
+                response = client.get('/reports/custom-collections/excel/', {
+                    'start_date': start.isoformat(),
+                    'end_date': date.today().isoformat(),
+                })
+                size = sum(len(chunk) for chunk in response.streaming_content)
+
+            self.stdout.write(
+                f"exported {rows} rows in {export.elapsed:.1f}s "
+                f"({rows / export.elapsed:,.0f} rows/s), {size / 1024 / 1024:.1f} MB xlsx"
+            )
+            self.stdout.write(f"peak RSS {peak_rss_mb():.1f} MB (before export {rss_before:.1f} MB)")
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.models import Repayment
+from core.services import post_repayment
+from ._bench import scratch_database, make_officer, make_loan, Timer
+
+
+class Command(BaseCommand):
+    help = "Show that posting a repayment costs the same regardless of the loan's repayment history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, nargs='+', default=[0, 1000, 10000, 100000],
+                            help="Existing repayment counts to benchmark against")
+        parser.add_argument('--posts', type=int, default=200, help="Repayments posted per history size")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            officer = make_officer()
+            self.stdout.write(f"{'history':>10} {'post (ms)':>12} {'re-sum (ms)':>12}")
+
+            for size in options['history']:
+                loan = make_loan(officer, unique_id=f"BENCH-{size}")
+                Repayment.objects.bulk_create(
+                    [Repayment(loan=loan, amount=Decimal('1.00')) for _ in range(size)],
+                    batch_size=5000,
+                )
+
+                with Timer() as posting:
+                    for _ in range(options['posts']):
+                        post_repayment(loan, Decimal('1.00'))
+
+                # The approach the collection sheet used before the posting service
+                with Timer() as resum:
+                    for _ in range(min(options['posts'], 20)):
+                        loan.paid = sum(r.amount for r in loan.repayments.all())
+                        loan.save()
+
+                self.stdout.write(
+                    f"{size:>10} "
+                    f"{posting.elapsed / options['posts'] * 1000:>12.3f} "
+                    f"{resum.elapsed / min(options['posts'], 20) * 1000:>12.3f}"
+                )
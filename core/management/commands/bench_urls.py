@@ -0,0 +1,149 @@
+import json
+import logging
+import re
+import subprocess
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern
+
+from core import urls
+from core.perf import QueryRecorder
+from core.models import Borrower, Expense, Loan, LoanOfficer, PostingBatch, Repayment, ReportJob
+from ._bench import Timer
+
+
+# URL names with path arguments -> the object of the officer's organization to fill them with
+URL_OBJECTS = {
+    'posting_batch_detail': lambda org: PostingBatch.objects.filter(officer__organization=org),
+    'add_posting_item': lambda org: PostingBatch.objects.filter(officer__organization=org),
+    'bulk_post_items': lambda org: PostingBatch.objects.filter(officer__organization=org),
+    'update_expense': lambda org: Expense.objects.filter(organization=org),
+    'report_job_detail': lambda org: ReportJob.objects.filter(organization=org),
+    'report_job_download': lambda org: ReportJob.objects.filter(organization=org, status='Done'),
+}
+PATH_ARGUMENT = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def core_urls(organization):
+    """(name, path) for every GET-able pattern in core.urls"""
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        route = str(pattern.pattern)
+        if PATH_ARGUMENT.search(route):
+            if pattern.name not in URL_OBJECTS:
+                continue
+            obj = URL_OBJECTS[pattern.name](organization).order_by('-pk').first()
+            if obj is None:
+                continue
+            route = PATH_ARGUMENT.sub(str(obj.pk), route)
+        yield pattern.name, f"/{route}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time every URL in core.urls with the test client against the configured database "
+        "(fill it with generate_portfolio first) and write query counts and p50/p95 latency to JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Log in as this loan officer (default: the first one)")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed requests per URL, after one warm-up")
+        parser.add_argument('--only', help="Only URLs containing this text")
+        parser.add_argument('--output', default='bench_urls.json', help="Where to write the results")
+        parser.add_argument('--compare', help="Earlier results file to print differences against")
+
+    def handle(self, *args, **options):
+        officers = LoanOfficer.objects.select_related('user', 'organization').order_by('pk')
+        if options['username']:
+            officers = officers.filter(user__username=options['username'])
+        officer = officers.first()
+        if officer is None:
+            raise CommandError("No loan officer to log in as; run generate_portfolio first")
+
+        client = Client()
+        client.force_login(officer.user)
+        results = {}
+        # The N+1 counts go into the results instead of a log line per request
+        perf_logger = logging.getLogger('core.perf')
+        level = perf_logger.level
+        perf_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for name, path in core_urls(officer.organization):
+                    if path in results or (options['only'] and options['only'] not in path):
+                        continue
+                    results[path] = self.measure(client, name, path, options['repeat'])
+                    row = results[path]
+                    self.stdout.write(
+                        f"{path:<48} {row['status']:>4} {row['queries']:>6} q "
+                        f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} ms"
+                        + (f"  N+1 x{row['repeated_query']}" if row['repeated_query'] else "")
+                    )
+        finally:
+            perf_logger.setLevel(level)
+
+        baseline = {
+            'commit': _git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'repeat': options['repeat'],
+            'rows': {
+                model.__name__: model.objects.count() for model in (User, Borrower, Loan, Repayment)
+            },
+            'urls': results,
+        }
+        with open(options['output'], 'w') as fh:
+            json.dump(baseline, fh, indent=2)
+        self.stdout.write(f"wrote {len(results)} URL(s) to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                self.compare(json.load(fh), baseline)
+
+    def measure(self, client, name, path, repeat):
+        client.get(path)  # warm caches and the connection
+        timings = []
+        for _ in range(repeat):
+            # A wrapper rather than CaptureQueriesContext, whose log stops at 9,000 queries
+            queries = QueryRecorder()
+            with connection.execute_wrapper(queries), Timer() as timer:
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            timings.append(timer.elapsed * 1000)
+        duplicates = queries.duplicates()
+        return {
+            'name': name,
+            'status': response.status_code,
+            'queries': len(queries.queries),
+            'repeated_query': duplicates[0][1] if duplicates else 0,
+            'p50_ms': round(float(np.percentile(timings, 50)), 2),
+            'p95_ms': round(float(np.percentile(timings, 95)), 2),
+        }
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nagainst {before.get('commit') or before['created']}:")
+        for path, row in after['urls'].items():
+            old = before['urls'].get(path)
+            if old is None:
+                continue
+            change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+            self.stdout.write(
+                f"{path:<48} queries {old['queries']:>5} -> {row['queries']:<5} "
+                f"p95 {old['p95_ms']:>9.1f} -> {row['p95_ms']:>9.1f} ms ({change:+.0f}%)"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dedupe import BLOCK_WINDOW, DUPLICATE_THRESHOLD, find_duplicates
+from core.models import Organization
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Refresh the borrower blocking keys and queue likely duplicate borrowers for review"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help="Organization id (default: every organization)")
+        parser.add_argument('--window', type=int, default=BLOCK_WINDOW,
+                            help="Neighbours compared on each side in every sorted block")
+        parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD)
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.order_by('id')
+        if options['organization'] is not None:
+            organizations = organizations.filter(pk=options['organization'])
+            if not organizations.exists():
+                raise CommandError(f"No organization {options['organization']}")
+
+        for organization in organizations:
+            with Timer() as finding:
+                stats = find_duplicates(organization, window=options['window'], threshold=options['threshold'])
+            self.stdout.write(
+                f"{organization}: {stats['borrowers']} borrowers in {finding.elapsed:.2f} s, "
+                f"keys +{stats['keys_added']} -{stats['keys_removed']}, {stats['pairs_compared']} pairs compared, "
+                f"{stats['flagged']} flagged, {stats['queued']} newly queued"
+            )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.synthetic import generate_portfolio
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with a synthetic portfolio for load testing. "
+        "Adds to whatever is there already; never run it against live data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=1)
+        parser.add_argument('--branches', type=int, default=10, help="Branches per organization")
+        parser.add_argument('--officers', type=int, default=5, help="Loan officers per branch")
+        parser.add_argument('--borrowers', type=int, default=10000, help="Borrowers (one loan each) per organization")
+        parser.add_argument('--repayments', type=int, default=8, help="Average repayments on a fully elapsed loan")
+        parser.add_argument('--days', type=int, default=365, help="History to spread disbursements over")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--schedules', action='store_true', help="Also write repayment schedules (slower)")
+
+    def handle(self, *args, **options):
+        with Timer() as generating:
+            totals = generate_portfolio(
+                organizations=options['organizations'],
+                branches=options['branches'],
+                officers=options['officers'],
+                borrowers=options['borrowers'],
+                repayments=options['repayments'],
+                days=options['days'],
+                seed=options['seed'],
+                schedules=options['schedules'],
+            )
+        for name, count in totals.items():
+            self.stdout.write(f"{name:>16}: {count:,}")
+        self.stdout.write(f"generated in {generating.elapsed:.1f} s")
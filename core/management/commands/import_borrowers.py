@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import import_borrowers
+from core.models import Organization
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Create borrowers from a CSV or XLSX file (full_name, unique_id, branch, ...)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--organization', type=int, required=True)
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the file")
+        parser.add_argument('--errors', help="Write the rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(pk=options['organization'])
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization {options['organization']}")
+
+        with Timer() as importing:
+            try:
+                result = import_borrowers(organization, options['path'], dry_run=options['dry_run'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        rows = result.valid + result.rejected
+        self.stdout.write(
+            f"{rows} rows in {importing.elapsed:.2f} s ({rows / importing.elapsed:,.0f} rows/s): "
+            f"{result.created} created, {result.valid} valid, {result.rejected} rejected"
+        )
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w') as fh:
+                fh.write(result.error_report())
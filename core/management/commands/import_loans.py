@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import import_loans
+from core.models import LoanOfficer
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Disburse loans from a CSV or XLSX file (unique_id, principal, interest_rate, tenure, ...); all or nothing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--officer', required=True, help="Username of the disbursing loan officer")
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the file")
+        parser.add_argument('--errors', help="Write the rejected rows to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            officer = LoanOfficer.objects.select_related('organization').get(user__username=options['officer'])
+        except LoanOfficer.DoesNotExist:
+            raise CommandError(f"No loan officer {options['officer']}")
+
+        with Timer() as importing:
+            try:
+                result = import_loans(officer.organization, options['path'], officer, dry_run=options['dry_run'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        rows = result.valid + result.rejected
+        self.stdout.write(
+            f"{rows} rows in {importing.elapsed:.2f} s: {result.created} disbursed, "
+            f"{result.valid} valid, {result.rejected} rejected"
+        )
+        for name, total in result.totals.items():
+            self.stdout.write(f"{name:>10}: {total:,}")
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w') as fh:
+                fh.write(result.error_report())
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import rebuild_collections
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly collections rollup from the repayments table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help="Only rebuild this organization's rows")
+
+    def handle(self, *args, **options):
+        with Timer() as rebuild:
+            rows = rebuild_collections(organization_id=options['organization'])
+        self.stdout.write(f"wrote {rows} rollup row(s) in {rebuild.elapsed:.2f} s")
@@ -0,0 +1,33 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import LoanOfficer
+from core.reconciliation import reconcile_statement
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Match a bank or mobile-money statement CSV to open loans and post the credits as repayments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--officer', required=True, help="Username of the loan officer posting the batch")
+
+    def handle(self, *args, **options):
+        try:
+            officer = LoanOfficer.objects.select_related('organization', 'user').get(user__username=options['officer'])
+        except LoanOfficer.DoesNotExist:
+            raise CommandError(f"No loan officer {options['officer']}")
+
+        with Timer() as reconciling:
+            try:
+                statement = reconcile_statement(officer.organization, options['path'], officer)
+            except ValueError as e:
+                raise CommandError(str(e))
+            except ValidationError as e:
+                raise CommandError(" ".join(e.messages))
+
+        self.stdout.write(
+            f"{statement.lines} lines in {reconciling.elapsed:.2f} s: {statement.matched} posted "
+            f"({statement.posted_amount:,}), {statement.exception_count} unmatched"
+        )
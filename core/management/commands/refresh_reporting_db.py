@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db import refresh_sqlite_copy
+from core.routers import REPORTING_DB_ALIAS
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database over the reporting replica"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=int, nargs='?', const=settings.REPORTING_REFRESH_SECONDS,
+            help="Keep running and refresh every N seconds (default REPORTING_REFRESH_SECONDS)",
+        )
+
+    def handle(self, *args, **options):
+        if REPORTING_DB_ALIAS not in settings.DATABASES:
+            raise CommandError(f"No '{REPORTING_DB_ALIAS}' database is configured")
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPORTING_DB_ALIAS]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("Only SQLite replicas can be refreshed; replicate other servers with their own tools")
+
+        source, target = primary.settings_dict['NAME'], replica.settings_dict['NAME']
+        while True:
+            # Drop the replica connection so the next read opens the new file
+            replica.close()
+            with Timer() as refresh:
+                refresh_sqlite_copy(source, target)
+            self.stdout.write(f"refreshed {target} in {refresh.elapsed:.2f} s")
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,54 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import claim_next_job, requeue_stale_jobs
+from core.workers import init_worker, run_report_job
+
+
+class Command(BaseCommand):
+    help = "Process queued report jobs in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.REPORT_WORKERS)
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds between queue checks when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        workers, poll = options['workers'], options['poll']
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"requeued {requeued} stale job(s)")
+
+        # Don't share the parent's SQLite handle with the children
+        connections.close_all()
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+            running = set()
+            while True:
+                while len(running) < workers:
+                    job_id = claim_next_job()
+                    if job_id is None:
+                        break
+                    self.stdout.write(f"job {job_id} started")
+                    running.add(pool.submit(run_report_job, job_id))
+
+                if not running:
+                    if options['once']:
+                        return
+                    time.sleep(poll)
+                    continue
+
+                done, running = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        self.stdout.write(f"job {future.result()} finished")
+                    except Exception as e:
+                        # The job stays Running and is requeued once it goes stale
+                        self.stderr.write(f"worker process failed: {e!r}")
@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.snapshots import take_snapshot
+from ._bench import Timer
+
+
+class Command(BaseCommand):
+    help = "Write the end-of-day portfolio snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help="Snapshot date (YYYY-MM-DD), default today; a past date is backfilled")
+        parser.add_argument('--organization', type=int, help="Only snapshot this organization")
+
+    def handle(self, *args, **options):
+        with Timer() as snapshot:
+            rows = take_snapshot(day=options['date'], organization_id=options['organization'])
+        self.stdout.write(f"wrote {rows} snapshot row(s) in {snapshot.elapsed:.2f} s")
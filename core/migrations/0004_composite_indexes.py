@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_vendor_expense'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['organization', 'branch', 'date'], name='core_expense_org_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['organization', 'date'], name='core_expense_org_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['organization', 'status'], name='core_loan_org_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['organization', 'disbursed_date'], name='core_loan_org_disbursed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postingbatch',
+            index=models.Index(fields=['officer', 'date'], name='core_postingbatch_off_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repayment',
+            index=models.Index(fields=['date', 'loan'], name='core_repayment_date_loan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repayment',
+            index=models.Index(fields=['loan', 'date'], name='core_repayment_loan_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saving',
+            index=models.Index(fields=['organization', 'ledger_balance'], name='core_saving_org_balance_idx'),
+        ),
+    ]
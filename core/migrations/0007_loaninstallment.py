@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_reportjob_format_cache_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='interest_method',
+            field=models.CharField(choices=[('Flat', 'Flat'), ('Declining', 'Declining balance')], default='Flat', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='repayment_frequency',
+            field=models.CharField(choices=[('Weekly', 'Weekly'), ('Monthly', 'Monthly')], default='Monthly', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LoanInstallment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('due_date', models.DateField()),
+                ('principal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='core.loan')),
+                ('officer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.loanofficer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date', 'branch'], name='core_installment_due_br_idx'), models.Index(fields=['due_date', 'officer'], name='core_installment_due_off_idx')],
+                'constraints': [models.UniqueConstraint(fields=('loan', 'number'), name='core_installment_loan_number_uniq')],
+            },
+        ),
+    ]
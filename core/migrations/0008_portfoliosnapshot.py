@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_loaninstallment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('open_loans', models.PositiveIntegerField(default=0)),
+                ('outstanding_principal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('arrears', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('par_1_30', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('par_31_60', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('par_61_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('par_over_90', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('disbursed_count', models.PositiveIntegerField(default=0)),
+                ('disbursed_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('collections', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('savings', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('officer', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.loanofficer')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('organization', 'date', 'branch', 'officer'), name='core_snapshot_org_date_uniq')],
+            },
+        ),
+    ]
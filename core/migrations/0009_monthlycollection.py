@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollup(apps, schema_editor):
+    # The dashboard reads collections only from the rollup, so fill it from existing repayments
+    from core.rollups import rebuild_collections
+    rebuild_collections(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_portfoliosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCollection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_month', models.CharField(max_length=7)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('repayments', models.PositiveIntegerField(default=0)),
+                ('branch', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.branch')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('organization', 'year_month', 'branch'), name='core_monthlycollection_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
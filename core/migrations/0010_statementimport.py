@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_monthlycollection'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('checksum', models.CharField(max_length=64)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('matched', models.PositiveIntegerField(default=0)),
+                ('posted_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('exception_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.postingbatch')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization')),
+                ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatementException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField()),
+                ('value_date', models.CharField(blank=True, max_length=30)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('narration', models.TextField(blank=True)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('reason', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('Open', 'Open'), ('Posted', 'Posted'), ('Dismissed', 'Dismissed')], default='Open', max_length=10)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('loan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.loan')),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='core.statementimport')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statementimport',
+            constraint=models.UniqueConstraint(fields=('organization', 'checksum'), name='core_statement_checksum_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='statementexception',
+            index=models.Index(fields=['status', 'statement'], name='core_stmtexc_status_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:05
+
+from django.db import migrations
+
+
+# Full-text index over borrowers for core.search. It is a standalone FTS5
+# table keyed by the borrower's id (its rowid) and kept in step by triggers,
+# so bulk_create and raw updates are covered as well as save().
+#
+# mobile holds the number as entered plus its last ten digits, so 0803...,
+# 234803... and +234 803... all find the same borrower. organization_id is
+# stored but not indexed, and is checked on the rows a search matches.
+
+MOBILE = (
+    "coalesce({row}.mobile, '') || ' ' || substr(replace(replace(replace(replace(replace("
+    "coalesce({row}.mobile, ''), ' ', ''), '+', ''), '-', ''), '(', ''), ')', ''), -10)"
+)
+
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE core_borrower_fts USING fts5(
+        full_name, unique_id, mobile, business, organization_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"""
+    INSERT INTO core_borrower_fts (rowid, full_name, unique_id, mobile, business, organization_id)
+    SELECT b.id, b.full_name, b.unique_id, {MOBILE.format(row='b')}, coalesce(b.business, ''), b.organization_id
+    FROM core_borrower b
+    """,
+    f"""
+    CREATE TRIGGER core_borrower_fts_insert AFTER INSERT ON core_borrower BEGIN
+        INSERT INTO core_borrower_fts (rowid, full_name, unique_id, mobile, business, organization_id)
+        VALUES (new.id, new.full_name, new.unique_id, {MOBILE.format(row='new')}, coalesce(new.business, ''),
+                new.organization_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER core_borrower_fts_update
+    AFTER UPDATE OF full_name, unique_id, mobile, business, organization_id ON core_borrower BEGIN
+        UPDATE core_borrower_fts SET
+            full_name = new.full_name, unique_id = new.unique_id, mobile = {MOBILE.format(row='new')},
+            business = coalesce(new.business, ''), organization_id = new.organization_id
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_borrower_fts_delete AFTER DELETE ON core_borrower BEGIN
+        DELETE FROM core_borrower_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS core_borrower_fts_delete",
+    "DROP TRIGGER IF EXISTS core_borrower_fts_update",
+    "DROP TRIGGER IF EXISTS core_borrower_fts_insert",
+    "DROP TABLE IF EXISTS core_borrower_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Other databases keep the LIKE search in core.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_statementimport'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+# "Declining" schedules were always Rule of 78: the flat interest total
+# front-loaded by sum-of-digits weights. Existing loans keep their schedules
+# and only take the accurate name.
+
+def rename(old, new):
+    def operation(apps, schema_editor):
+        Loan = apps.get_model('core', 'Loan')
+        Loan.objects.filter(interest_method=old).update(interest_method=new)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_duplicatecandidate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loan',
+            name='interest_method',
+            field=models.CharField(choices=[('Flat', 'Flat'), ('RuleOf78', 'Rule of 78')], default='Flat', max_length=10),
+        ),
+        migrations.RunPython(rename('Declining', 'RuleOf78'), rename('RuleOf78', 'Declining')),
+    ]
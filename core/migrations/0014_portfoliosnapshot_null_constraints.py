@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+def drop_duplicate_rows(apps, schema_editor):
+    # Re-runs could leave several rows for a key with an empty branch or
+    # officer; the newest one is kept
+    PortfolioSnapshot = apps.get_model('core', 'PortfolioSnapshot')
+    seen = set()
+    duplicates = []
+    for pk, *key in PortfolioSnapshot.objects.order_by('-id').values_list(
+        'id', 'organization_id', 'date', 'branch_id', 'officer_id'
+    ).iterator():
+        if tuple(key) in seen:
+            duplicates.append(pk)
+        seen.add(tuple(key))
+    for start in range(0, len(duplicates), 900):
+        PortfolioSnapshot.objects.filter(pk__in=duplicates[start:start + 900]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_loan_interest_method_rule_of_78'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_rows, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='portfoliosnapshot',
+            name='savings',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('organization', 'date', 'officer'), name='core_snapshot_no_branch_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('officer__isnull', True)), fields=('organization', 'date', 'branch'), name='core_snapshot_no_officer_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True), ('officer__isnull', True)), fields=('organization', 'date'), name='core_snapshot_org_row_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # Concurrent postings could each create a no-branch row for a month;
+    # fold them into the oldest before the constraint goes on
+    MonthlyCollection = apps.get_model('core', 'MonthlyCollection')
+    kept = {}
+    for row in MonthlyCollection.objects.filter(branch__isnull=True).order_by('id'):
+        key = (row.organization_id, row.year_month)
+        if key not in kept:
+            kept[key] = row
+            continue
+        kept[key].amount += row.amount
+        kept[key].repayments += row.repayments
+        kept[key].save(update_fields=['amount', 'repayments'])
+        row.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_portfoliosnapshot_null_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='monthlycollection',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('organization', 'year_month'), name='core_monthlycollection_no_branch_uniq'),
+        ),
+    ]
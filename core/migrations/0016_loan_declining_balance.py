@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_monthlycollection_no_branch_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='scheduled_interest',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='interest_method',
+            field=models.CharField(choices=[('Flat', 'Flat'), ('RuleOf78', 'Rule of 78'), ('Declining', 'Declining balance')], default='Flat', max_length=10),
+        ),
+    ]
@@ -4,9 +4,46 @@ from django.core.validators import MinValueValidator
 from decimal import Decimal
 from datetime import timedelta
 from django.utils.timezone import now
-from django.db.models import Sum
+from django.db.models import Q, Sum, F, Value, Case, When, DecimalField, IntegerField, ExpressionWrapper
+from django.db.models.functions import Cast, Round, Coalesce
+from django.db.models.lookups import Exact, GreaterThan
+
+
+
+
+def money_cents(expression):
+    """A two-place money expression as whole cents"""
+    return Cast(Round(expression * Value(100)), IntegerField())
+
+
+def loan_total_due_cents(prefix=''):
+    """
+    DB-side equivalent of Loan.total_due in whole cents, optionally through
+    a relation prefix. Interest is the stored declining-balance interest or is
+    rounded half to even like Decimal.quantize in Loan.interest; SQL ROUND
+    would round halves away from zero.
+    """
+    # cents x hundredths of a percent = interest in ten-thousandths of a cent
+    scaled = money_cents(F(f'{prefix}principal')) * money_cents(F(f'{prefix}interest_rate'))
+    whole, part = scaled / Value(10000), scaled % Value(10000)
+    interest = Case(
+        When(**{f'{prefix}scheduled_interest__isnull': False}, then=money_cents(F(f'{prefix}scheduled_interest'))),
+        default=whole + Case(
+            When(GreaterThan(part, 5000), then=Value(1)),
+            When(Exact(part, 5000), then=whole % Value(2)),
+            default=Value(0),
+        ),
+    )
+    fees = money_cents(F(f'{prefix}fees')) + money_cents(F(f'{prefix}penalty'))
+    return ExpressionWrapper(money_cents(F(f'{prefix}principal')) + interest + fees, output_field=IntegerField())
 
 
+def loan_total_due(prefix=''):
+    """DB-side equivalent of Loan.total_due, optionally through a relation prefix"""
+    return ExpressionWrapper(
+        loan_total_due_cents(prefix) * Value(Decimal('0.01')),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
 
 
 class Organization(models.Model):
@@ -34,6 +71,22 @@ class LoanOfficer(models.Model):
 
 
 
+class BorrowerQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        """
+        Annotate each borrower with `paid_total` and `balance_total`, the
+        database-side equivalents of `total_paid` and `loan_balance`.
+        """
+        money = DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            paid_total=Coalesce(Sum('loan__paid'), Value(Decimal('0.00')), output_field=money),
+            balance_total=Coalesce(
+                Sum(loan_total_due('loan__') - F('loan__paid')), Value(Decimal('0.00')), output_field=money
+            ),
+        )
+
+
 class Borrower(models.Model):
     STATUS_CHOICES = [
         ('Active', 'Active'),
@@ -57,10 +110,14 @@ class Borrower(models.Model):
     def __str__(self):
         return self.full_name
 
-    # Computed fields
+    objects = BorrowerQuerySet.as_manager()
+
+    # Computed fields (read from Borrower.objects.with_totals() when annotated)
     @property
     def total_paid(self):
         """Sum of all repayments made by this borrower"""
+        if 'paid_total' in self.__dict__:
+            return self.paid_total
         loans = self.loan_set.all()
         total = sum([loan.paid for loan in loans], Decimal('0.00'))
         return total.quantize(Decimal('0.01'))
@@ -68,6 +125,8 @@ class Borrower(models.Model):
     @property
     def loan_balance(self):
         """Outstanding balance across all loans"""
+        if 'balance_total' in self.__dict__:
+            return self.balance_total
         loans = self.loan_set.all()
         balance = sum([loan.balance for loan in loans], Decimal('0.00'))
         return balance.quantize(Decimal('0.01'))
@@ -82,6 +141,15 @@ class Loan(models.Model):
         ('PAR30', 'PAR30'),
         ('Closed', 'Closed'),
     ]
+    FREQUENCY_CHOICES = [
+        ('Weekly', 'Weekly'),
+        ('Monthly', 'Monthly'),
+    ]
+    INTEREST_METHOD_CHOICES = [
+        ('Flat', 'Flat'),
+        ('RuleOf78', 'Rule of 78'),
+        ('Declining', 'Declining balance'),
+    ]
 
     # Relationships
     organization = models.ForeignKey('Organization', on_delete=models.CASCADE)
@@ -117,6 +185,8 @@ class Loan(models.Model):
         default=30,  # in days
         validators=[MinValueValidator(1)]
     )
+    repayment_frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='Monthly')
+    interest_method = models.CharField(max_length=10, choices=INTEREST_METHOD_CHOICES, default='Flat')
 
     # Status & dates
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Active')
@@ -131,11 +201,22 @@ class Loan(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))]
     )
     last_payment_date = models.DateField(blank=True, null=True)
+    # Declining-balance interest follows from the schedule, not the rate alone;
+    # null for the other methods
+    scheduled_interest = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'status'], name='core_loan_org_status_idx'),
+            models.Index(fields=['organization', 'disbursed_date'], name='core_loan_org_disbursed_idx'),
+        ]
 
     # Auto-calculated properties
     @property
     def interest(self):
-        """Simple interest based on principal"""
+        """Simple interest based on principal, or the declining-balance schedule's interest"""
+        if self.scheduled_interest is not None:
+            return self.scheduled_interest
         return (self.principal * self.interest_rate / Decimal('100')).quantize(Decimal('0.01'))
 
     @property
@@ -152,6 +233,11 @@ class Loan(models.Model):
         """Auto-calculate maturity date and ensure proper totals"""
         if self.disbursed_date and self.tenure:
             self.maturity = self.disbursed_date + timedelta(days=self.tenure)
+        if self.interest_method == 'Declining':
+            from .schedules import declining_interest
+            self.scheduled_interest = declining_interest(self)
+        else:
+            self.scheduled_interest = None
 
         # Optional: automatically mark loan as closed if fully paid
         if self.paid >= self.total_due:
@@ -159,7 +245,32 @@ class Loan(models.Model):
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.borrower.name} - {self.principal} ({self.status})"
+        return f"{self.borrower.full_name} - {self.principal} ({self.status})"
+
+
+class LoanInstallment(models.Model):
+    """One scheduled repayment, created with the loan by schedules.create_schedule"""
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="installments")
+    # Copied from the loan so "due on a day" is a range scan without a join
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, null=True)
+    officer = models.ForeignKey('LoanOfficer', on_delete=models.CASCADE, null=True)
+    number = models.PositiveIntegerField()
+    due_date = models.DateField()
+    principal = models.DecimalField(max_digits=12, decimal_places=2)
+    interest = models.DecimalField(max_digits=12, decimal_places=2)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'number'], name='core_installment_loan_number_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['due_date', 'branch'], name='core_installment_due_br_idx'),
+            models.Index(fields=['due_date', 'officer'], name='core_installment_due_off_idx'),
+        ]
+
+    def __str__(self):
+        return f"Installment {self.number} of loan {self.loan_id} due {self.due_date}"
     
     
     
@@ -170,10 +281,44 @@ class Repayment(models.Model):
     date = models.DateField(auto_now_add=True)
     posted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            # Date-range reports join to the loan for the organization filter
+            models.Index(fields=['date', 'loan'], name='core_repayment_date_loan_idx'),
+            models.Index(fields=['loan', 'date'], name='core_repayment_loan_date_idx'),
+        ]
+
     def __str__(self):
         return f"Repayment of {self.amount} for loan {self.loan.id}"
 
 
+class MonthlyCollection(models.Model):
+    """
+    Repayments per organization, branch and calendar month, kept up to date
+    by core.rollups.add_collections in the transaction that writes them.
+    """
+    organization = models.ForeignKey('Organization', on_delete=models.CASCADE)
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, null=True)
+    year_month = models.CharField(max_length=7)  # "YYYY-MM"
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    repayments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'year_month', 'branch'], name='core_monthlycollection_uniq'
+            ),
+            # SQLite treats NULLs as distinct, so the no-branch rows need their own
+            models.UniqueConstraint(
+                fields=['organization', 'year_month'], condition=Q(branch__isnull=True),
+                name='core_monthlycollection_no_branch_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.year_month} collections for {self.organization_id}/{self.branch_id}"
+
+
 class CollectionSheet(models.Model):
     loan_officer = models.ForeignKey(LoanOfficer, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
@@ -200,6 +345,11 @@ class PostingBatch(models.Model):
     officer = models.ForeignKey(LoanOfficer, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['officer', 'date'], name='core_postingbatch_off_date_idx'),
+        ]
+
     @property
     def total_amount(self):
         # Sum all related PostingItem amounts
@@ -236,6 +386,12 @@ class Saving(models.Model):
     last_transaction = models.DateField(blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Active')
 
+    class Meta:
+        indexes = [
+            # Covers the ledger_balance totals without touching the table
+            models.Index(fields=['organization', 'ledger_balance'], name='core_saving_org_balance_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.account_number}"
     
@@ -278,5 +434,218 @@ class Expense(models.Model):
     date = models.DateField(default=now)
     recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['organization', 'branch', 'date'], name='core_expense_org_branch_idx'),
+            models.Index(fields=['organization', 'date'], name='core_expense_org_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.category} - ₦{self.amount}"
+
+
+
+
+class ReportJob(models.Model):
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    report = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='xlsx')
+    params = models.JSONField(default=dict, blank=True)
+    # Hash of (organization, report, format, params) used to reuse finished files
+    cache_key = models.CharField(max_length=40, blank=True, db_index=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    file = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='core_reportjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.report} #{self.id} ({self.status})"
+
+
+class PortfolioSnapshot(models.Model):
+    """
+    End-of-day portfolio figures per branch and officer, written by
+    core.snapshots.take_snapshot. Balances are as at the close of `date`;
+    disbursements and collections are that day's activity. Savings have no
+    officer, so they are recorded on the branch row with officer empty, and
+    are empty on rows backfilled for a past date.
+    """
+    organization = models.ForeignKey('Organization', on_delete=models.CASCADE)
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, null=True)
+    officer = models.ForeignKey('LoanOfficer', on_delete=models.CASCADE, null=True)
+    date = models.DateField()
+
+    open_loans = models.PositiveIntegerField(default=0)
+    outstanding_principal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    arrears = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Outstanding balance of loans by days past due
+    par_1_30 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    par_31_60 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    par_61_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    par_over_90 = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    disbursed_count = models.PositiveIntegerField(default=0)
+    disbursed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    collections = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    savings = models.DecimalField(max_digits=14, decimal_places=2, default=0, null=True)
+
+    class Meta:
+        # SQLite treats NULLs as distinct in a unique index, so the rows
+        # without a branch or officer need constraints of their own
+        constraints = [
+            models.UniqueConstraint(
+                fields=['organization', 'date', 'branch', 'officer'], name='core_snapshot_org_date_uniq'
+            ),
+            models.UniqueConstraint(
+                fields=['organization', 'date', 'officer'], condition=Q(branch__isnull=True),
+                name='core_snapshot_no_branch_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['organization', 'date', 'branch'], condition=Q(officer__isnull=True),
+                name='core_snapshot_no_officer_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['organization', 'date'], condition=Q(branch__isnull=True, officer__isnull=True),
+                name='core_snapshot_org_row_uniq',
+            ),
+        ]
+
+    @property
+    def par30(self):
+        return self.par_31_60 + self.par_61_90 + self.par_over_90
+
+    def __str__(self):
+        return f"Snapshot {self.date} for {self.organization_id}/{self.branch_id}/{self.officer_id}"
+
+
+class StatementImport(models.Model):
+    """
+    A bank or mobile-money statement reconciled by core.reconciliation.
+    Matched credits are posted through `batch`; the rest wait in
+    StatementException for someone to match or dismiss.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    batch = models.ForeignKey('PostingBatch', on_delete=models.SET_NULL, null=True, blank=True)
+    file_name = models.CharField(max_length=255)
+    # SHA-256 of the file, so the same statement can't be posted twice
+    checksum = models.CharField(max_length=64)
+
+    lines = models.PositiveIntegerField(default=0)
+    matched = models.PositiveIntegerField(default=0)
+    posted_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    exception_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'checksum'], name='core_statement_checksum_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.created_at:%Y-%m-%d})"
+
+
+class StatementException(models.Model):
+    STATUS_CHOICES = [
+        ('Open', 'Open'),
+        ('Posted', 'Posted'),
+        ('Dismissed', 'Dismissed'),
+    ]
+
+    statement = models.ForeignKey(StatementImport, on_delete=models.CASCADE, related_name="exceptions")
+    line = models.PositiveIntegerField()
+    value_date = models.CharField(max_length=30, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    narration = models.TextField(blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    reason = models.CharField(max_length=200)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Open')
+    loan = models.ForeignKey(Loan, on_delete=models.SET_NULL, null=True, blank=True)
+    resolved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'statement'], name='core_stmtexc_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Line {self.line} of {self.statement_id}: {self.reason}"
+
+
+class BorrowerKey(models.Model):
+    """
+    Blocking keys for duplicate detection (see core.dedupe): borrowers that
+    share a key are compared with each other, nobody else is.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=120)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['borrower', 'key'], name='core_borrowerkey_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'key'], name='core_borrowerkey_org_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.borrower_id}: {self.key}"
+
+
+class DuplicateCandidate(models.Model):
+    """A pair of borrowers that look like the same client, waiting for review"""
+    STATUS_CHOICES = [
+        ('Open', 'Open'),
+        ('Confirmed', 'Confirmed'),
+        ('Dismissed', 'Dismissed'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    # borrower is always the older (lower id) of the two
+    borrower = models.ForeignKey(Borrower, on_delete=models.CASCADE, related_name='+')
+    duplicate = models.ForeignKey(Borrower, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    reasons = models.CharField(max_length=200)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Open')
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['borrower', 'duplicate'], name='core_duplicate_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'status'], name='core_duplicate_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.borrower_id} ~ {self.duplicate_id} ({self.score:.2f})"
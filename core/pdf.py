@@ -0,0 +1,89 @@
+from datetime import date
+from decimal import Decimal
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+# Rows per Table flowable. Small tables keep ReportLab's page splitting
+# cheap; one huge Table is re-measured on every page break.
+PDF_TABLE_ROWS = 500
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+TOTAL_STYLE = TableStyle([
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+])
+
+
+def format_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (Decimal, float)):
+        return f"{value:,.2f}"
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _table(columns, body, total=None):
+    data = [list(columns)] + body
+    if total:
+        data.append(total)
+    table = Table(data, repeatRows=1, hAlign='LEFT')
+    table.setStyle(TABLE_STYLE)
+    if total:
+        table.setStyle(TOTAL_STYLE)
+    return table
+
+
+def write_pdf(title, columns, rows, fileobj, subtitle=None, sum_columns=()):
+    """
+    Render `rows` as a tabular PDF report.
+
+    Rows are consumed from the iterator and formatted into fixed-size Table
+    flowables as they arrive, so only the formatted strings are kept rather
+    than model instances. Columns listed in `sum_columns` are totalled in a
+    final row.
+    """
+    styles = getSampleStyleSheet()
+    pagesize = landscape(A4) if len(columns) > 4 else A4
+    doc = SimpleDocTemplate(fileobj, pagesize=pagesize, title=title)
+
+    story = [Paragraph(title, styles['Title'])]
+    if subtitle:
+        story += [Paragraph(subtitle, styles['Normal']), Spacer(1, 12)]
+
+    totals = {index: Decimal('0') for index in sum_columns}
+    chunk = []
+    tables = 0
+    for row in rows:
+        for index in totals:
+            totals[index] += row[index] or 0
+        chunk.append([format_cell(value) for value in row])
+        if len(chunk) == PDF_TABLE_ROWS:
+            story.append(_table(columns, chunk))
+            tables += 1
+            chunk = []
+
+    total_row = None
+    if totals:
+        total_row = ["Total"] + [""] * (len(columns) - 1)
+        for index, value in totals.items():
+            total_row[index] = format_cell(value)
+
+    if chunk or total_row or not tables:
+        story.append(_table(columns, chunk, total_row))
+
+    doc.build(story)
+    return fileobj
@@ -0,0 +1,181 @@
+"""
+Per-request performance instrumentation.
+
+PerformanceMiddleware times every request, wraps each database connection
+to time and fingerprint its queries, and reports the figures in a
+`Server-Timing` header (visible in the browser's network panel). A query
+shape that repeats DUPLICATE_QUERY_THRESHOLD or more times in one request
+is almost always a lookup inside a loop, so it is logged as an N+1.
+
+Streamed responses (the CSV and NDJSON exports, file downloads) are
+recorded when their body has been read and closed, so the figures include
+the queries run while streaming; their Server-Timing header can only
+cover the time to the first byte.
+
+Samples are kept in memory per URL pattern, for the staff stats page. Each
+worker process keeps its own figures, and they reset on restart.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+import numpy as np
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_QUERY_THRESHOLD = 5
+# Most recent requests kept per endpoint for the percentiles
+SAMPLE_SIZE = 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \(\?(?:, \?)*\)")
+
+
+def fingerprint(sql):
+    """`sql` with literals and IN-list lengths taken out, so repeats of one query match"""
+    sql = _STRING.sub('?', sql.replace('%s', '?'))
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps (sql, seconds) for every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def db_time(self):
+        return sum(seconds for _, seconds in self.queries)
+
+    def duplicates(self, threshold=DUPLICATE_QUERY_THRESHOLD):
+        """Query fingerprints run at least `threshold` times, most repeated first"""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.flagged = 0
+        self.worst_duplicate = None
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, wall, db, queries, duplicates):
+        self.requests += 1
+        self.samples.append((wall, db, queries))
+        if duplicates:
+            self.flagged += 1
+            if self.worst_duplicate is None or duplicates[0][1] >= self.worst_duplicate[1]:
+                self.worst_duplicate = duplicates[0]
+
+    def summary(self):
+        wall, db, queries = np.array(self.samples, dtype=np.float64).T
+        wall_p50, wall_p95, wall_p99 = np.percentile(wall, [50, 95, 99]) * 1000
+        db_p50, db_p95 = np.percentile(db, [50, 95]) * 1000
+        return {
+            'requests': self.requests,
+            'wall_p50': wall_p50,
+            'wall_p95': wall_p95,
+            'wall_p99': wall_p99,
+            'db_p50': db_p50,
+            'db_p95': db_p95,
+            'queries_mean': queries.mean(),
+            'queries_max': int(queries.max()),
+            'flagged': self.flagged,
+            'worst_duplicate': self.worst_duplicate,
+        }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(endpoint, wall, db, queries, duplicates=()):
+    with _stats_lock:
+        _stats.setdefault(endpoint, EndpointStats()).add(wall, db, queries, list(duplicates))
+
+
+def endpoint_stats():
+    """One summary dict per endpoint, slowest p95 first"""
+    with _stats_lock:
+        rows = [dict(endpoint=endpoint, **stats.summary()) for endpoint, stats in _stats.items()]
+    return sorted(rows, key=lambda row: row['wall_p95'], reverse=True)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f"{request.method} /{match.route}"
+
+
+class PerformanceMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with self.recording(recorder):
+            response = self.get_response(request)
+
+        # Headers go out before a stream is read, so these figures stop at its first byte
+        wall = time.perf_counter() - start
+        response['Server-Timing'] = (
+            f'total;dur={wall * 1000:.1f}, db;dur={recorder.db_time * 1000:.1f};'
+            f'desc="{len(recorder.queries)} queries"'
+        )
+
+        if response.streaming and not response.is_async:
+            # CSV/NDJSON exports run their queries while the body is read
+            response.streaming_content = self.stream(request, response.streaming_content, recorder, start)
+        elif not response.streaming:
+            self.finish(request, recorder, start)
+        # Async streams are read on the event loop, out of reach of the wrappers, and go unrecorded
+        return response
+
+    @staticmethod
+    def recording(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def stream(self, request, content, recorder, start):
+        """The response body, with its queries recorded and the request finished when it closes"""
+        try:
+            with self.recording(recorder):
+                yield from content
+        finally:
+            self.finish(request, recorder, start)
+
+    def finish(self, request, recorder, start):
+        wall = time.perf_counter() - start
+        duplicates = recorder.duplicates()
+        if duplicates:
+            sql, count = duplicates[0]
+            logger.warning("Possible N+1 in %s %s: %d x %s", request.method, request.path, count, sql)
+
+        endpoint = _endpoint(request)
+        if endpoint is not None:
+            record(endpoint, wall, recorder.db_time, len(recorder.queries), duplicates)
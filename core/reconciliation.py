@@ -0,0 +1,253 @@
+"""
+Bank and mobile-money statement reconciliation.
+
+A statement CSV is read STATEMENT_CHUNK_SIZE lines at a time and each
+credit is matched to an open loan through in-memory hash indexes built
+once per run. The rules are tried in order:
+
+1. "loan 123" / "loan #123" in the narration or reference (loan ID)
+2. any token equal to a borrower's unique_id
+3. any 10+ digit number whose last ten digits match a borrower's mobile
+4. a fuzzy match of the narration's words against borrower names,
+   compared only within a block of similar names
+
+A borrower with several open loans is matched to the oldest. Matched
+credits are posted together through post_batch_items in one posting
+batch. Debits, unreadable amounts and unmatched credits go to the
+StatementException queue.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from decimal import Decimal
+from difflib import get_close_matches
+
+import numpy as np
+import pandas as pd
+from django.utils.timezone import now
+
+from .db import immediate_atomic
+from .imports import read_chunks
+from .models import Loan, PostingBatch, StatementException, StatementImport
+from .services import post_batch_item, post_batch_items
+
+
+STATEMENT_CHUNK_SIZE = 20000
+BULK_BATCH_SIZE = 2000
+
+# field -> column names it goes by in bank and mobile-money exports
+COLUMN_ALIASES = {
+    'amount': ('amount', 'credit', 'credit_amount', 'deposit', 'cr'),
+    'narration': ('narration', 'description', 'details', 'remarks', 'memo', 'particulars'),
+    'reference': ('reference', 'ref', 'transaction_id', 'transaction_ref', 'receipt'),
+    'value_date': ('value_date', 'date', 'transaction_date', 'posting_date'),
+}
+
+LOAN_REFERENCE = r'\bloan\s*(?:no\.?|id)?\s*[:#]?\s*(\d+)'
+TOKEN = r'[0-9a-z][0-9a-z/_-]*'
+PHONE = r'\d{10,13}'
+FUZZY_CUTOFF = 0.88
+# Larger name blocks are skipped rather than compared one by one
+FUZZY_BLOCK_LIMIT = 2000
+
+
+def phone_key(mobile):
+    """Last ten digits, so 0803..., 234803... and +234 803... agree"""
+    digits = re.sub(r'\D', '', mobile or '')
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def name_words(text):
+    return re.sub(r'[^a-z ]', ' ', text.casefold()).split()
+
+
+def name_block(words):
+    """Blocking key: start of the first word and of the last"""
+    return (words[0][:3], words[-1][:1])
+
+
+class LoanIndex:
+    """Open loans of an organization keyed every way a statement line can refer to them"""
+
+    def __init__(self, organization):
+        self.loan_ids = set()
+        self.by_unique_id = {}
+        self.by_mobile = {}
+        # normalised name -> {borrower id: loan id}
+        self.by_name = defaultdict(dict)
+        self.name_blocks = defaultdict(set)
+
+        rows = (
+            Loan.objects.filter(organization=organization).exclude(status='Closed')
+            .order_by('disbursed_date', 'id')
+            .values_list('id', 'borrower_id', 'borrower__unique_id', 'borrower__mobile', 'borrower__full_name')
+        )
+        for loan_id, borrower_id, unique_id, mobile, full_name in rows.iterator(chunk_size=STATEMENT_CHUNK_SIZE):
+            self.loan_ids.add(loan_id)
+            # setdefault keeps each borrower's oldest open loan
+            if unique_id:
+                self.by_unique_id.setdefault(unique_id.casefold(), loan_id)
+            key = phone_key(mobile)
+            if key:
+                self.by_mobile.setdefault(key, loan_id)
+            words = name_words(full_name or '')
+            if len(words) >= 2:
+                name = ' '.join(words)
+                self.by_name[name].setdefault(borrower_id, loan_id)
+                self.name_blocks[name_block(words)].add(name)
+
+    def fuzzy(self, narration):
+        """The loan of the one borrower whose name closely matches 2-3 consecutive narration words"""
+        words = name_words(narration)
+        for size in (3, 2):
+            for start in range(len(words) - size + 1):
+                window = words[start:start + size]
+                block = self.name_blocks.get(name_block(window))
+                if not block or len(block) > FUZZY_BLOCK_LIMIT:
+                    continue
+                close = get_close_matches(' '.join(window), block, n=2, cutoff=FUZZY_CUTOFF)
+                if len(close) == 1 and len(self.by_name[close[0]]) == 1:
+                    return next(iter(self.by_name[close[0]].values()))
+        return None
+
+    def match(self, chunk):
+        """(loan id or NaN, rule name) Series for a chunk with narration and reference columns"""
+        text = (chunk['narration'] + ' ' + chunk['reference']).str.casefold()
+        loans = pd.Series(np.nan, index=chunk.index)
+        rules = pd.Series('', index=chunk.index)
+
+        def fill(found, rule):
+            found = found.dropna()
+            found = found[~found.index.duplicated()]
+            found = found[loans[found.index].isna()]
+            loans[found.index] = found
+            rules[found.index] = rule
+
+        referenced = pd.to_numeric(text.str.extract(LOAN_REFERENCE, expand=False), errors='coerce')
+        fill(referenced.where(referenced.isin(self.loan_ids)), 'loan')
+        fill(text.str.findall(TOKEN).explode().map(self.by_unique_id), 'unique_id')
+        fill(text.str.findall(PHONE).explode().dropna().str[-10:].map(self.by_mobile), 'mobile')
+
+        for index in loans.index[loans.isna()]:
+            loan_id = self.fuzzy(chunk.at[index, 'narration'])
+            if loan_id is not None:
+                loans[index] = loan_id
+                rules[index] = 'name'
+        return loans, rules
+
+
+def statement_columns(chunk):
+    """Rename the file's columns to amount, narration, reference and value_date"""
+    renames = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        column = next((alias for alias in aliases if alias in chunk.columns), None)
+        if column is None and field in ('amount', 'narration'):
+            raise ValueError(f"No {field} column (expected one of: {', '.join(aliases)})")
+        if column is None:
+            chunk[field] = ''
+        else:
+            renames[column] = field
+    return chunk.rename(columns=renames)
+
+
+def file_checksum(upload):
+    digest = hashlib.sha256()
+    if hasattr(upload, 'chunks'):
+        for block in upload.chunks():
+            digest.update(block)
+        upload.seek(0)
+    else:
+        with open(upload, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def reconcile_statement(organization, upload, officer, file_name=None):
+    """
+    Match and post a statement file. Returns the StatementImport; raises
+    ValueError for unreadable files or a statement imported before.
+    """
+    checksum = file_checksum(upload)
+    file_name = file_name or str(getattr(upload, 'name', upload))
+
+    with immediate_atomic():
+        if StatementImport.objects.filter(organization=organization, checksum=checksum).exists():
+            raise ValueError("This statement has already been imported")
+        statement = StatementImport.objects.create(
+            organization=organization, uploaded_by=officer.user, file_name=file_name[-255:], checksum=checksum
+        )
+        index = LoanIndex(organization)
+        entries, exceptions = [], []
+
+        for chunk in read_chunks(upload, STATEMENT_CHUNK_SIZE):
+            chunk = statement_columns(chunk)
+            amount = pd.to_numeric(chunk['amount'].str.replace(r'[^\d.\-]', '', regex=True), errors='coerce').round(2)
+            loans, rules = index.match(chunk)
+            credit = amount > 0
+            posted = credit & loans.notna()
+            statement.lines += len(chunk)
+
+            for loan_id, value, reference, rule in zip(
+                loans[posted], amount[posted], chunk['reference'][posted], rules[posted]
+            ):
+                entries.append({
+                    'loan': int(loan_id),
+                    'amount': Decimal(f"{value:.2f}"),
+                    'remarks': f"Statement {statement.id} {reference} (by {rule})".replace('  ', ' '),
+                })
+
+            reasons = np.where(amount.isna(), "Unreadable amount", np.where(credit, "No matching loan", "Not a credit"))
+            rejected = ~posted
+            for line, reason, value, row in zip(
+                chunk.index[rejected], reasons[rejected.to_numpy()], amount[rejected], chunk[rejected].itertuples()
+            ):
+                exceptions.append(StatementException(
+                    statement=statement,
+                    line=line,
+                    value_date=row.value_date[:30],
+                    reference=row.reference[:100],
+                    narration=row.narration,
+                    amount=None if pd.isna(value) or abs(value) >= 10 ** 10 else Decimal(f"{value:.2f}"),
+                    reason=reason,
+                ))
+
+        if entries:
+            statement.batch = PostingBatch.objects.create(officer=officer)
+            # In loan order the inserts into the loan_id indexes touch neighbouring pages
+            entries.sort(key=lambda entry: entry['loan'])
+            post_batch_items(statement.batch, entries, posted_by=officer.user)
+        StatementException.objects.bulk_create(exceptions, batch_size=BULK_BATCH_SIZE)
+
+        statement.matched = len(entries)
+        statement.posted_amount = sum((entry['amount'] for entry in entries), Decimal('0.00'))
+        statement.exception_count = len(exceptions)
+        statement.save()
+    return statement
+
+
+def resolve_exception(exception, user, loan=None):
+    """
+    Post an exception line to `loan` (in its statement's batch), or dismiss
+    it when `loan` is None.
+    """
+    with immediate_atomic():
+        exception = StatementException.objects.select_related('statement').get(pk=exception.pk, status='Open')
+        if loan is not None:
+            statement = exception.statement
+            if statement.batch is None:
+                statement.batch = PostingBatch.objects.create(officer=user.loanofficer)
+            post_batch_item(
+                statement.batch, loan, exception.amount,
+                remarks=f"Statement {statement.id} {exception.reference} (line {exception.line})", posted_by=user,
+            )
+            statement.matched += 1
+            statement.posted_amount += exception.amount
+            statement.exception_count -= 1
+            statement.save(update_fields=['batch', 'matched', 'posted_amount', 'exception_count'])
+        exception.status = 'Posted' if loan is not None else 'Dismissed'
+        exception.loan = loan
+        exception.resolved_by = user
+        exception.resolved_at = now()
+        exception.save(update_fields=['status', 'loan', 'resolved_by', 'resolved_at'])
+    return exception
@@ -0,0 +1,79 @@
+"""
+Row sources shared by the export views and the background report jobs.
+
+Each function returns (columns, rows) where rows is a lazy iterator of
+tuples, so callers can stream them without loading the report into memory.
+"""
+from django.db.models import Sum, F
+
+from .exports import stream_rows
+from .financials import branch_financials
+from .models import Expense, Loan, Repayment, Saving, loan_total_due
+
+
+COLLECTION_COLUMNS = ["Borrower", "Loan ID", "Amount", "Date"]
+COLLECTION_FIELDS = ('loan__borrower__full_name', 'loan_id', 'amount', 'date')
+
+
+def collection_rows(organization_id, start_date, end_date):
+    qs = Repayment.objects.filter(
+        loan__organization_id=organization_id,
+        date__gte=start_date,
+        date__lte=end_date
+    )
+    return COLLECTION_COLUMNS, stream_rows(qs, *COLLECTION_FIELDS)
+
+
+def loan_portfolio_rows(organization_id):
+    qs = Loan.objects.filter(organization_id=organization_id)
+    columns = ["Borrower", "Loan ID", "Principal", "Interest Rate", "Status", "Branch", "Officer"]
+    rows = stream_rows(
+        qs, 'borrower__full_name', 'id', 'principal', 'interest_rate', 'status',
+        'branch__name', 'officer__user__username'
+    )
+    return columns, rows
+
+
+def par30_rows(organization_id):
+    qs = Loan.objects.filter(organization_id=organization_id, status='PAR30').annotate(
+        balance_due=loan_total_due() - F('paid')
+    )
+    columns = ["Borrower", "Loan ID", "Principal", "Balance", "Branch", "Officer"]
+    rows = stream_rows(
+        qs, 'borrower__full_name', 'id', 'principal', 'balance_due',
+        'branch__name', 'officer__user__username'
+    )
+    return columns, rows
+
+
+def branch_equity_rows(organization_id, start_date=None, end_date=None, by_month=False):
+    if by_month:
+        columns = ["Branch", "Month", "Collections", "Expenses", "Equity"]
+        rows = [
+            (row['name'], f"{row['month']:%Y-%m}", row['collections'], row['expenses'], row['equity'])
+            for row in branch_financials(organization_id, start_date, end_date, by_month=True)
+        ]
+    else:
+        columns = ["Branch", "Collections", "Expenses", "Equity"]
+        rows = [
+            (row['name'], row['collections'], row['expenses'], row['equity'])
+            for row in branch_financials(organization_id, start_date, end_date)
+        ]
+    return columns, rows
+
+
+def balance_sheet_rows(organization_id):
+    total_loans = Loan.objects.filter(organization_id=organization_id).aggregate(total=Sum('principal'))['total'] or 0
+    total_savings = Saving.objects.filter(organization_id=organization_id).aggregate(total=Sum('ledger_balance'))['total'] or 0
+    total_expenses = Expense.objects.filter(organization_id=organization_id).aggregate(total=Sum('amount'))['total'] or 0
+
+    assets = total_loans + total_savings
+    columns = ["Item", "Amount"]
+    rows = [
+        ("Total Loans", total_loans),
+        ("Total Savings", total_savings),
+        ("Total Assets", assets),
+        ("Liabilities (Expenses)", total_expenses),
+        ("Equity", assets - total_expenses),
+    ]
+    return columns, rows
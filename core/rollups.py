@@ -0,0 +1,105 @@
+"""
+Monthly collections rollup.
+
+MonthlyCollection holds one row per (organization, branch, month), so the
+dashboard chart and monthly totals read a handful of rollup rows instead
+of scanning repayments. Repayments saved or deleted one at a time (the
+posting service, the admin) update it through the Repayment signals in
+core.signals. bulk_create paths call `add_collections` inside their own
+transaction. `rebuild_collections` recomputes the table from Repayment
+for backfills (migration 0009 runs it once) and for queryset updates,
+which send no signals.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import MonthlyCollection, Repayment
+
+
+def year_month(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def add_collections(entries, sign=1):
+    """
+    Add repayments to the rollup, or take them off with sign=-1. `entries`
+    is an iterable of (organization_id, branch_id, date, amount); call it
+    in the same transaction that writes the repayments.
+    """
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for organization_id, branch_id, day, amount in entries:
+        bucket = totals[(organization_id, branch_id, year_month(day))]
+        bucket[0] += sign * Decimal(amount)
+        bucket[1] += sign
+
+    for (organization_id, branch_id, month), (amount, count) in totals.items():
+        rollup = MonthlyCollection.objects.filter(
+            organization_id=organization_id, branch_id=branch_id, year_month=month
+        )
+        increment = {'amount': F('amount') + amount, 'repayments': F('repayments') + count}
+        # Nothing to take off a month without a row (e.g. deleted in the same cascade)
+        if rollup.update(**increment) or sign < 0:
+            continue
+        try:
+            with transaction.atomic():
+                MonthlyCollection.objects.create(
+                    organization_id=organization_id, branch_id=branch_id, year_month=month,
+                    amount=amount, repayments=count,
+                )
+        except IntegrityError:
+            # Another posting created the month's row first
+            rollup.update(**increment)
+
+
+def rebuild_collections(organization_id=None, apps=None):
+    """
+    Recompute the rollup from Repayment. Returns the number of rows written.
+    Migrations pass their `apps` registry so the historical models are used.
+    """
+    repayment_model, rollup_model = Repayment, MonthlyCollection
+    if apps is not None:
+        repayment_model, rollup_model = apps.get_model('core', 'Repayment'), apps.get_model('core', 'MonthlyCollection')
+    repayments = repayment_model.objects.all()
+    rollups = rollup_model.objects.all()
+    if organization_id is not None:
+        repayments = repayments.filter(loan__organization_id=organization_id)
+        rollups = rollups.filter(organization_id=organization_id)
+
+    grouped = (
+        repayments.annotate(month=TruncMonth('date'))
+        .values('loan__organization_id', 'loan__branch_id', 'month')
+        .annotate(amount=Sum('amount'), repayments=Count('id'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rows = [
+            rollup_model(
+                organization_id=row['loan__organization_id'],
+                branch_id=row['loan__branch_id'],
+                year_month=year_month(row['month']),
+                amount=row['amount'],
+                repayments=row['repayments'],
+            )
+            for row in grouped
+        ]
+        rollups.delete()
+        rollup_model.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def monthly_totals(organization, months):
+    """Collections per "YYYY-MM" for the given months, summed over branches"""
+    keys = [year_month(month) for month in months]
+    totals = dict(
+        MonthlyCollection.objects.filter(organization=organization, year_month__in=keys)
+        .values('year_month')
+        .annotate(total=Sum('amount'))
+        .values_list('year_month', 'total')
+        .order_by()
+    )
+    return {key: totals.get(key) or Decimal('0') for key in keys}
@@ -0,0 +1,151 @@
+"""
+Read replica routing for reporting views.
+
+ReportingReplicaMiddleware marks requests to the reports/, accounting/ and
+*_excel views, and ReportingRouter sends their reads of core models to the
+`reporting` database. Everything else, and every write, uses `default`.
+
+A user who has just written something is pinned to the primary for
+REPORTING_STICKY_SECONDS (via a cookie), so their own postings show up in
+reports straight away even though the replica lags behind.
+
+Report jobs run outside any request; `reporting_reads` gives the worker
+the same routing for the reports it builds.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPORTING_DB_ALIAS = 'reporting'
+STICKY_COOKIE = 'primary_until_refresh'
+REPORTING_PREFIXES = ('reports/', 'accounting/')
+# Operational tables the reporting pages poll; these must never be stale
+PRIMARY_ONLY_MODELS = {'reportjob'}
+
+_request_state = ContextVar('reporting_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def replica_available():
+    """
+    True when a separate reporting database is configured and present.
+    An alias pointing at the primary (such as a test mirror) doesn't count.
+    """
+    if REPORTING_DB_ALIAS not in settings.DATABASES:
+        return False
+    replica = connections[REPORTING_DB_ALIAS]
+    primary = connections[DEFAULT_DB_ALIAS]
+    if replica.settings_dict['NAME'] == primary.settings_dict['NAME']:
+        return False
+    if replica.vendor == 'sqlite' and not replica.is_in_memory_db():
+        return Path(replica.settings_dict['NAME']).exists()
+    return True
+
+
+def is_reporting_view(request, view_func):
+    match = request.resolver_match
+    if match.route.startswith('reports/jobs/'):
+        return False
+    return match.route.startswith(REPORTING_PREFIXES) or view_func.__name__.endswith('_excel')
+
+
+def _stream_with_state(state, content):
+    """
+    Streamed exports run their queries as the response is iterated, after
+    the middleware has returned, so restore the request's routing around
+    each chunk.
+    """
+    chunks = iter(content)
+    while True:
+        token = _request_state.set(state)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _request_state.reset(token)
+        yield chunk
+
+
+@contextmanager
+def reporting_reads():
+    """Route core reads to the replica, as for a reporting view, outside a request"""
+    state = RequestState()
+    state.use_replica = replica_available()
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+class ReportingRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if (
+            state is not None
+            and state.use_replica
+            and model._meta.app_label == 'core'
+            and model._meta.model_name not in PRIMARY_ONLY_MODELS
+        ):
+            return REPORTING_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if (
+            state is not None
+            and model._meta.app_label == 'core'
+            and model._meta.model_name not in PRIMARY_ONLY_MODELS
+        ):
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and gets its schema from it
+        return db != REPORTING_DB_ALIAS
+
+
+class ReportingReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.use_replica and response.streaming:
+            response.streaming_content = _stream_with_state(state, response.streaming_content)
+        if state.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPORTING_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request_state.get()
+        state.use_replica = (
+            request.method in ('GET', 'HEAD')
+            and STICKY_COOKIE not in request.COOKIES
+            and is_reporting_view(request, view_func)
+            and replica_available()
+        )
@@ -0,0 +1,149 @@
+"""
+Repayment schedules.
+
+`Loan.interest_rate` is a rate for the whole loan (`Loan.interest` is the
+charge), and the installments always add up to principal + interest.
+Flat spreads the flat interest evenly; Rule of 78 front-loads it by
+sum-of-digits weights (n, n-1, ..., 1), so early installments carry more
+of it. Declining balance amortizes the loan in equal installments, each
+charging an n-th of the rate on the principal still outstanding, so it
+costs less than the flat interest; that total is stored on the loan as
+`scheduled_interest`. Fees and penalties are not scheduled.
+
+Weekly installments fall every seven days and monthly ones on the same
+day of each calendar month (or the month's last day).
+"""
+import calendar
+from datetime import timedelta
+from decimal import Decimal, ROUND_DOWN
+
+from .models import Loan, LoanInstallment
+
+
+CENT = Decimal('0.01')
+WEEK_DAYS = 7
+
+
+def _as_date(loan, field):
+    # disbursed_date defaults to now(), so an unsaved-then-created loan may hold a datetime
+    return Loan._meta.get_field(field).to_python(getattr(loan, field))
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _maturity(loan, start):
+    return _as_date(loan, 'maturity') or start + timedelta(days=loan.tenure)
+
+
+def installment_count(loan):
+    """Whole periods in the tenure, rounded to the nearest"""
+    if loan.repayment_frequency == 'Weekly':
+        return max(1, (loan.tenure + WEEK_DAYS // 2) // WEEK_DAYS)
+
+    start = _as_date(loan, 'disbursed_date')
+    maturity = _maturity(loan, start)
+    months = 0
+    while _add_months(start, months + 1) <= maturity:
+        months += 1
+    # Round up when over half of the next calendar month has passed
+    last, following = _add_months(start, months), _add_months(start, months + 1)
+    if 2 * (maturity - last).days >= (following - last).days:
+        months += 1
+    return max(1, months)
+
+
+def due_dates(loan, count):
+    """Every period after disbursement, with the last installment on maturity"""
+    start = _as_date(loan, 'disbursed_date')
+    maturity = _maturity(loan, start)
+    dates = []
+    for number in range(1, count):
+        if loan.repayment_frequency == 'Weekly':
+            due = start + timedelta(days=WEEK_DAYS * number)
+        else:
+            due = _add_months(start, number)
+        dates.append(min(due, maturity))
+    return dates + [maturity]
+
+
+def _split(total, weights):
+    """Share `total` out by weight in whole cents, rounding left on the last share"""
+    whole = sum(weights)
+    shares = [(total * weight / whole).quantize(CENT, rounding=ROUND_DOWN) for weight in weights]
+    shares[-1] += total - sum(shares)
+    return shares
+
+
+def _amortize(principal, rate, count):
+    """
+    (principal, interest) shares of `count` equal installments, with
+    interest at `rate` per period on the outstanding principal. The last
+    installment clears what rounding left over.
+    """
+    if not rate:
+        return _split(principal, [1] * count), [Decimal('0.00')] * count
+    payment = (principal * rate / (1 - (1 + rate) ** -count)).quantize(CENT)
+    balance, principals, interests = principal, [], []
+    for number in range(1, count + 1):
+        interest = (balance * rate).quantize(CENT)
+        part = balance if number == count else min(payment - interest, balance)
+        principals.append(part)
+        interests.append(interest)
+        balance -= part
+    return principals, interests
+
+
+def _declining_schedule(loan, count):
+    return _amortize(loan.principal, loan.interest_rate / Decimal('100') / count, count)
+
+
+def declining_interest(loan):
+    """Total interest of `loan`'s declining-balance schedule"""
+    return sum(_declining_schedule(loan, installment_count(loan))[1], Decimal('0.00'))
+
+
+def build_schedule(loan):
+    """Unsaved installments for `loan`"""
+    count = installment_count(loan)
+    if loan.interest_method == 'Declining':
+        principal, interest = _declining_schedule(loan, count)
+    elif loan.interest_method == 'RuleOf78':
+        principal = _split(loan.principal, [1] * count)
+        interest = _split(loan.interest, [count - k for k in range(count)])
+    else:
+        principal = _split(loan.principal, [1] * count)
+        interest = _split(loan.interest, [1] * count)
+
+    return [
+        LoanInstallment(
+            loan=loan,
+            branch_id=loan.branch_id,
+            officer_id=loan.officer_id,
+            number=number,
+            due_date=due,
+            principal=p,
+            interest=i,
+            amount=p + i,
+        )
+        for number, (due, p, i) in enumerate(zip(due_dates(loan, count), principal, interest), start=1)
+    ]
+
+
+def create_schedule(loan):
+    return LoanInstallment.objects.bulk_create(build_schedule(loan))
+
+
+def installments_due(organization, day, branch=None, officer=None):
+    """Installments of open loans due on `day`, optionally for one branch or officer"""
+    qs = LoanInstallment.objects.filter(due_date=day, loan__organization=organization).exclude(
+        loan__status='Closed'
+    )
+    if branch is not None:
+        qs = qs.filter(branch=branch)
+    if officer is not None:
+        qs = qs.filter(officer=officer)
+    return qs
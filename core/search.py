@@ -0,0 +1,97 @@
+"""
+Borrower search.
+
+On SQLite, searches go to the core_borrower_fts FTS5 index (see migration
+0011). It holds each borrower's name, unique_id, mobile and business, and
+triggers keep it in sync. Every word of the search is matched as a prefix,
+and results are ranked with bm25. A search that looks like a phone number
+is reduced to its last ten digits first. A loan ID is looked up by primary
+key, and that loan's borrower is listed first. Other databases fall back to
+icontains lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Borrower, Loan
+
+
+FTS_TABLE = 'core_borrower_fts'
+SEARCH_LIMIT = 20
+# bm25 column weights: full_name, unique_id, mobile, business, organization_id
+RANK = f"bm25({FTS_TABLE}, 10.0, 8.0, 8.0, 2.0, 0.0)"
+# Matches ranked per search. A one-word search can match most of the book,
+# and scoring every hit would take longer than the rest of the request.
+RANK_CANDIDATES = 5000
+PHONE_SEPARATORS = re.compile(r'[\s+()-]')
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """
+    FTS5 MATCH expression for a search box entry, or None when it has
+    nothing to search for.
+    """
+    digits = PHONE_SEPARATORS.sub('', text)
+    if len(digits) >= 7 and digits.isdigit():
+        if digits.startswith('234') and len(digits) > 10:
+            digits = digits[3:]
+        terms = [f'"{digits.lstrip("0") or digits}"*']
+    else:
+        # Each word is a quoted phrase, so "B-0001" is searched as written
+        terms = [f'"{word}"*' for word in text.replace('"', ' ').split() if re.search(r'\w', word)]
+    if not terms:
+        return None
+    return ' AND '.join(terms)
+
+
+def matching_borrower_ids(text):
+    """Subquery of every matching borrower id, for filter(pk__in=...)"""
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_query(text)])
+
+
+def search_borrower_ids(organization, text, limit=SEARCH_LIMIT):
+    """Ids of an organization's best `limit` borrowers for `text`, best first"""
+    text = text.strip()
+    if not text:
+        return []
+    ids = []
+    if text.isdigit():
+        ids.extend(
+            Loan.objects.filter(organization=organization, pk=int(text), borrower__isnull=False)
+            .values_list('borrower_id', flat=True)
+        )
+
+    query = fts_query(text)
+    if query is None:
+        matches = []
+    elif not fts_available():
+        matches = Borrower.objects.filter(
+            Q(full_name__icontains=text) | Q(unique_id__icontains=text)
+            | Q(mobile__icontains=text) | Q(business__icontains=text),
+            organization=organization,
+        ).order_by('full_name').values_list('id', flat=True)[:limit]
+    else:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM ("
+                f"  SELECT rowid AS id, {RANK} AS score FROM {FTS_TABLE}"
+                f"  WHERE {FTS_TABLE} MATCH %s AND organization_id = %s LIMIT %s"
+                f") ORDER BY score LIMIT %s",
+                [query, organization.id, RANK_CANDIDATES, limit],
+            )
+            matches = [row[0] for row in cursor.fetchall()]
+    ids.extend(pk for pk in matches if pk not in ids)
+    return ids[:limit]
+
+
+def search_borrowers(queryset, organization, text, limit=SEARCH_LIMIT):
+    """The borrowers of `queryset` among the best matches for `text`, in rank order"""
+    ids = search_borrower_ids(organization, text, limit)
+    borrowers = queryset.in_bulk(ids)
+    return [borrowers[pk] for pk in ids if pk in borrowers]
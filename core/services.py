@@ -0,0 +1,181 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Case, When, Value
+from django.db.models.lookups import GreaterThanOrEqual
+
+from .dashboard import invalidate_dashboard
+from .db import immediate_atomic
+from .models import Loan, Repayment, PostingItem, loan_total_due_cents, money_cents
+from .rollups import add_collections
+
+
+# -------------------------
+# REPAYMENT POSTING
+# -------------------------
+
+def apply_payment(loan_id, amount, paid_on):
+    """
+    Add `amount` to a loan's running balance with a single UPDATE.
+
+    `paid` is incremented in the database, so the cost does not depend on how
+    many repayments the loan already has, and concurrent postings cannot
+    overwrite each other. The loan is closed in the same statement once the
+    new total covers `total_due`.
+    """
+    return Loan.objects.filter(pk=loan_id).update(
+        paid=F('paid') + amount,
+        last_payment_date=paid_on,
+        status=Case(
+            # Compared in cents so the float arithmetic of SQLite can't leave a fraction owing
+            When(GreaterThanOrEqual(money_cents(F('paid') + amount), loan_total_due_cents()), then=Value('Closed')),
+            default=F('status'),
+        ),
+    )
+
+
+def payment_amount(amount):
+    """`amount` as a Decimal, raising ValidationError unless it is a finite amount above zero"""
+    try:
+        amount = Decimal(str(amount).strip())
+    except InvalidOperation:
+        raise ValidationError("Amount must be a number")
+    # NaN and Infinity parse as Decimals but can't be compared or posted
+    if not amount.is_finite() or amount <= 0:
+        raise ValidationError("Amount must be greater than zero")
+    return amount
+
+
+@immediate_atomic()
+def post_repayment(loan, amount, posted_by=None):
+    """Record a repayment and update the loan balance in one transaction"""
+    amount = payment_amount(amount)
+    # The Repayment post_save signal adds it to the monthly rollup
+    repayment = Repayment.objects.create(loan=loan, amount=amount, posted_by=posted_by)
+    apply_payment(loan.pk, amount, repayment.date)
+    return repayment
+
+
+@immediate_atomic()
+def post_batch_item(batch, loan, amount, remarks="", posted_by=None):
+    """Add an item to a posting batch and post it as a repayment"""
+    amount = payment_amount(amount)
+    item = PostingItem.objects.create(batch=batch, loan=loan, amount=amount, remarks=remarks)
+    post_repayment(loan, amount, posted_by=posted_by)
+    return item
+
+
+# -------------------------
+# BULK BATCH POSTING
+# -------------------------
+
+def _parse_batch_entries(entries, organization):
+    """
+    Validate raw batch rows against the organization's loans with one query.
+
+    `entries` is an iterable of dicts with `loan`, `amount` and optional
+    `remarks`. Returns (rows, errors) where rows are (loan, amount, remarks)
+    and errors maps the 1-based row number to a message.
+    """
+    parsed, errors = [], {}
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            errors[number] = "Each item must have a loan and an amount"
+            continue
+        loan_id, amount = entry.get('loan'), entry.get('amount')
+        if not loan_id and not amount:
+            continue  # blank grid row
+        try:
+            loan_id = int(loan_id)
+            amount = Decimal(str(amount).strip())
+        except (TypeError, ValueError, InvalidOperation):
+            errors[number] = "Loan and amount are required"
+            continue
+        # NaN and Infinity parse as Decimals but can't be compared or posted
+        if not amount.is_finite() or amount <= 0:
+            errors[number] = "Amount must be greater than zero"
+            continue
+        parsed.append((number, loan_id, amount, str(entry.get('remarks') or '').strip()))
+
+    # Locked until the batch transaction commits (a no-op on SQLite)
+    loans = Loan.objects.select_for_update().filter(organization=organization).in_bulk(
+        {loan_id for _, loan_id, _, _ in parsed}
+    )
+    rows = []
+    for number, loan_id, amount, remarks in parsed:
+        loan = loans.get(loan_id)
+        if loan is None:
+            errors[number] = f"Loan {loan_id} not found"
+        elif loan.status == 'Closed':
+            errors[number] = f"Loan {loan_id} is already closed"
+        else:
+            rows.append((loan, amount, remarks))
+    return rows, errors
+
+
+def _save_loan_balances(loans):
+    """
+    Write paid, last_payment_date and status for many loans with one
+    prepared UPDATE run through executemany. bulk_update builds a CASE
+    WHEN per row and field, which dominated batches of thousands of loans.
+    """
+    fields = [Loan._meta.get_field(name) for name in ('paid', 'last_payment_date', 'status')]
+    qn = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(Loan._meta.db_table),
+        ", ".join(f"{qn(field.column)} = %s" for field in fields),
+        qn(Loan._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(loan, field.attname), connection) for field in fields] + [loan.pk]
+            for loan in loans
+        ])
+
+
+def post_batch_items(batch, entries, posted_by=None):
+    """
+    Post many items to a batch in one transaction.
+
+    All rows are validated first; if any fail, or there are none, nothing is
+    written and a ValidationError carrying the per-row messages is raised. Otherwise the
+    posting items and repayments are bulk inserted and every affected loan
+    is updated with a single prepared UPDATE.
+    """
+    organization = batch.officer.organization
+
+    with immediate_atomic():
+        rows, errors = _parse_batch_entries(entries, organization)
+        if errors:
+            raise ValidationError([f"Row {number}: {message}" for number, message in sorted(errors.items())])
+        if not rows:
+            raise ValidationError("There are no items to post")
+
+        items = PostingItem.objects.bulk_create(
+            [PostingItem(batch=batch, loan=loan, amount=amount, remarks=remarks) for loan, amount, remarks in rows]
+        )
+        repayments = Repayment.objects.bulk_create(
+            [Repayment(loan=loan, amount=amount, posted_by=posted_by) for loan, amount, _ in rows]
+        )
+
+        totals = defaultdict(Decimal)
+        loans = {}
+        for loan, amount, _ in rows:
+            totals[loan.pk] += amount
+            loans[loan.pk] = loan
+
+        paid_on = repayments[0].date
+        for loan in loans.values():
+            loan.paid += totals[loan.pk]
+            loan.last_payment_date = paid_on
+            if loan.paid >= loan.total_due:
+                loan.status = 'Closed'
+        _save_loan_balances(loans.values())
+        add_collections((loan.organization_id, loan.branch_id, paid_on, amount) for loan, amount, _ in rows)
+
+        # bulk_create and the raw UPDATE bypass the model signals
+        transaction.on_commit(lambda: invalidate_dashboard(organization.id))
+
+    return items
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard
+from .models import Borrower, Loan, Repayment, Saving, CollectionItem
+from .rollups import add_collections
+
+
+def invalidate_on_commit(organization_id):
+    # Invalidating before commit would let a concurrent request cache the old figures again
+    transaction.on_commit(lambda: invalidate_dashboard(organization_id))
+
+
+@receiver([post_save, post_delete], sender=Borrower)
+@receiver([post_save, post_delete], sender=Loan)
+@receiver([post_save, post_delete], sender=Saving)
+def organization_row_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.organization_id)
+
+
+@receiver([post_save, post_delete], sender=Repayment)
+@receiver([post_save, post_delete], sender=CollectionItem)
+def loan_row_changed(sender, instance, **kwargs):
+    invalidate_on_commit(instance.loan.organization_id)
+
+
+def _collection(repayment):
+    loan = repayment.loan
+    return (loan.organization_id, loan.branch_id, repayment.date, repayment.amount)
+
+
+@receiver(pre_save, sender=Repayment)
+def remember_saved_repayment(sender, instance, raw=False, **kwargs):
+    # An edit moves the old amount out of the rollup, so keep what it was
+    instance._previous_collection = None
+    if instance.pk and not raw:
+        previous = Repayment.objects.select_related('loan').filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_collection = _collection(previous)
+
+
+@receiver(post_save, sender=Repayment)
+def repayment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_collection', None)
+    if previous is not None:
+        add_collections([previous], sign=-1)
+    add_collections([_collection(instance)])
+
+
+@receiver(post_delete, sender=Repayment)
+def repayment_deleted(sender, instance, **kwargs):
+    add_collections([_collection(instance)], sign=-1)
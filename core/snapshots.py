@@ -0,0 +1,181 @@
+"""
+End-of-day portfolio snapshots.
+
+`take_snapshot` condenses the loan book into one PortfolioSnapshot row per
+(organization, branch, officer) for a date. Trend charts then read a few
+hundred snapshot rows instead of re-aggregating every loan and repayment.
+Re-running a date replaces that date's rows.
+
+A past date can be backfilled. Loans are then taken as they stood at the
+close of that day: disbursed by then, and with the repayments dated after
+it taken back off what they have paid. Savings accounts keep no balance
+history, so a backfilled row has no savings figure.
+"""
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+
+from .aging import AGING_CHUNK_SIZE, OPEN_STATUSES, cents, days_past_due, oldest_unpaid_due_dates, paid_by
+from .dashboard import invalidate_dashboard
+from .models import Loan, LoanInstallment, PortfolioSnapshot, Repayment, Saving, loan_total_due
+
+
+# PortfolioSnapshot field -> (lowest, highest) days past due
+PAR_FIELDS = {
+    'par_1_30': (1, 30),
+    'par_31_60': (31, 60),
+    'par_61_90': (61, 90),
+    'par_over_90': (91, None),
+}
+LOAN_FIELDS = ('outstanding_principal', 'outstanding_balance', 'arrears', *PAR_FIELDS)
+
+
+def _money(value):
+    """Sum of cents as a Decimal amount"""
+    return Decimal(f"{value / 100:.2f}")
+
+
+def _loan_figures(day, organization_id):
+    """
+    Outstanding figures per (organization, branch, officer) for the loans
+    open at the close of `day`.
+
+    Principal is the loan's principal share of its remaining balance.
+    Arrears are installments due by `day` less what has been paid; loans
+    without a schedule fall due in full on maturity.
+    """
+    scheduled = (
+        LoanInstallment.objects.filter(loan=OuterRef('pk'), due_date__lte=day)
+        .values('loan')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    # Closed since `day` means a last payment after it
+    qs = Loan.objects.filter(disbursed_date__lte=day).filter(
+        Q(status__in=OPEN_STATUSES) | Q(last_payment_date__gt=day)
+    )
+    if organization_id is not None:
+        qs = qs.filter(organization_id=organization_id)
+    paid_then = paid_by(day)
+    rows = list(
+        qs.annotate(due=loan_total_due(), paid_then=paid_then, scheduled=Subquery(scheduled))
+        .values_list(
+            'id', 'organization_id', 'branch_id', 'officer_id', 'maturity',
+            'principal', 'due', 'paid_then', 'scheduled',
+        )
+        .iterator(chunk_size=AGING_CHUNK_SIZE)
+    )
+    if not rows:
+        return {}
+
+    ids, org, branch, officer, maturity, principal, due, paid, scheduled = zip(*rows)
+    # Missing branch/officer ids become 0 so the group key is a plain integer array
+    keys = np.array([(o, b or 0, f or 0) for o, b, f in zip(org, branch, officer)], dtype=np.int64)
+    ids = np.array(ids, dtype=np.int64)
+    maturity = np.array(maturity, dtype='datetime64[D]')
+    principal = cents(principal)
+    due = cents(due)
+    paid = cents(paid)
+    has_schedule = np.array([s is not None for s in scheduled])
+    scheduled = cents(scheduled)
+
+    # Loans that were already paid off at the close of `day`
+    open_then = paid < due
+    keys, ids, maturity, principal, due, paid, has_schedule, scheduled = (
+        column[open_then] for column in (keys, ids, maturity, principal, due, paid, has_schedule, scheduled)
+    )
+    if not len(ids):
+        return {}
+
+    balance = np.clip(due - paid, 0, None)
+    matured = maturity <= np.datetime64(day, 'D')
+    fallback = np.where(matured, due, 0)
+    arrears = np.clip(np.where(has_schedule, scheduled, fallback) - paid, 0, None)
+    outstanding = np.divide(principal * balance, due, out=np.zeros(len(due)), where=due > 0)
+    dpd = days_past_due(ids, paid, due, maturity, oldest_unpaid_due_dates(qs, day, paid_then), day)
+
+    columns = {
+        'outstanding_principal': outstanding,
+        'outstanding_balance': balance,
+        'arrears': arrears,
+    }
+    for field, (low, high) in PAR_FIELDS.items():
+        in_bucket = (dpd >= low) if high is None else (dpd >= low) & (dpd <= high)
+        columns[field] = np.where(in_bucket, balance, 0)
+
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, minlength=len(groups))
+    sums = {field: np.bincount(inverse, weights=values, minlength=len(groups)) for field, values in columns.items()}
+
+    figures = {}
+    for i, (org_id, branch_id, officer_id) in enumerate(groups.tolist()):
+        row = {'open_loans': int(counts[i])}
+        row.update({field: _money(sums[field][i]) for field in LOAN_FIELDS})
+        figures[(org_id, branch_id or None, officer_id or None)] = row
+    return figures
+
+
+def take_snapshot(day=None, organization_id=None):
+    """Write the snapshot rows for `day` (default today). Returns the row count."""
+    today = date.today()
+    day = day or today
+    if day > today:
+        raise ValueError(f"Can't take a snapshot for {day}, which is in the future")
+    rows = {}
+
+    def row(key):
+        return rows.setdefault(key, {})
+
+    for key, figures in _loan_figures(day, organization_id).items():
+        row(key).update(figures)
+
+    loans = Loan.objects.filter(disbursed_date=day)
+    repayments = Repayment.objects.filter(date=day)
+    savings = Saving.objects.all()
+    if organization_id is not None:
+        loans = loans.filter(organization_id=organization_id)
+        repayments = repayments.filter(loan__organization_id=organization_id)
+        savings = savings.filter(organization_id=organization_id)
+
+    for r in loans.values('organization_id', 'branch_id', 'officer_id').annotate(
+        count=Count('id'), amount=Sum('principal')
+    ).order_by():
+        row((r['organization_id'], r['branch_id'], r['officer_id'])).update(
+            disbursed_count=r['count'], disbursed_amount=r['amount']
+        )
+
+    for r in repayments.values('loan__organization_id', 'loan__branch_id', 'loan__officer_id').annotate(
+        amount=Sum('amount')
+    ).order_by():
+        row((r['loan__organization_id'], r['loan__branch_id'], r['loan__officer_id']))['collections'] = r['amount']
+
+    # Only current balances are known, so only today's rows get them
+    if day == today:
+        for r in savings.values('organization_id', 'borrower__branch_id').annotate(
+            balance=Sum('ledger_balance')
+        ).order_by():
+            row((r['organization_id'], r['borrower__branch_id'], None))['savings'] = r['balance']
+
+    snapshots = [
+        PortfolioSnapshot(organization_id=org_id, branch_id=branch_id, officer_id=officer_id, date=day, **values)
+        for (org_id, branch_id, officer_id), values in rows.items()
+    ]
+    if day != today:
+        for snapshot in snapshots:
+            snapshot.savings = None
+
+    with transaction.atomic():
+        existing = PortfolioSnapshot.objects.filter(date=day)
+        if organization_id is not None:
+            existing = existing.filter(organization_id=organization_id)
+        existing.delete()
+        PortfolioSnapshot.objects.bulk_create(snapshots, batch_size=500)
+        for org_id in {org_id for org_id, _, _ in rows}:
+            transaction.on_commit(lambda org_id=org_id: invalidate_dashboard(org_id))
+
+    return len(snapshots)
+
@@ -0,0 +1,289 @@
+"""
+Synthetic portfolio generator for load and benchmark runs.
+
+`generate_portfolio` fills the database with organizations, branches,
+officers, borrowers, loans, repayments, posting batches, savings and
+expenses. Rows are drawn with NumPy from a seeded generator and inserted
+with bulk_create, borrowers CHUNK_SIZE at a time so memory stays flat at
+millions of rows. Running the same arguments against an empty database
+gives the same data.
+
+Loans start Active and the usual jobs then finish the derived data:
+`age_loans` sets their statuses, and the monthly collection rollup and
+today's portfolio snapshot are rebuilt.
+"""
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .aging import age_loans
+from .dashboard import invalidate_dashboard
+from .models import (
+    Borrower, Branch, Expense, Loan, LoanInstallment, LoanOfficer, Organization,
+    PostingBatch, PostingItem, Repayment, Saving,
+)
+from .rollups import rebuild_collections
+from .schedules import build_schedule
+from .snapshots import take_snapshot
+
+
+CHUNK_SIZE = 20000
+BULK_BATCH_SIZE = 2000
+
+FIRST_NAMES = (
+    "Ada", "Bola", "Chidi", "Dayo", "Emeka", "Funke", "Gbenga", "Halima", "Ifeoma", "Jide",
+    "Kemi", "Lola", "Musa", "Ngozi", "Obinna", "Pelumi", "Sade", "Tunde", "Uche", "Yemi", "Zainab",
+)
+LAST_NAMES = (
+    "Abubakar", "Adeyemi", "Bello", "Eze", "Ibrahim", "Nwosu", "Obi", "Okafor", "Okonkwo",
+    "Olawale", "Onyeka", "Suleiman", "Usman", "Yusuf",
+)
+BUSINESSES = ("Provisions", "Tailoring", "Food vendor", "Hair salon", "Phone repairs", "Farming", "Transport", None)
+PRINCIPALS = np.arange(5, 501, 5) * 1000       # 5,000 - 500,000 in whole naira
+INTEREST_RATES = np.array([5, 10, 15, 20])
+TENURES = np.array([30, 60, 90, 180, 365])
+SAVINGS_SHARE = 0.6
+# (category, monthly amount range in naira) booked per branch every 30 days
+MONTHLY_EXPENSES = (
+    ('Rent', (50000, 150000)),
+    ('Salary', (200000, 600000)),
+    ('Fuel', (10000, 40000)),
+    ('Utilities', (5000, 30000)),
+)
+
+
+def _naira(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _backdate(model, objs, days):
+    """
+    Set the auto_now_add `date` of freshly bulk-created rows to `days`.
+    `objs` must be in `days` order so each date is one contiguous pk range.
+    """
+    pks = np.array([obj.pk for obj in objs])
+    days = np.asarray(days)
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    for start, end in zip(starts, ends):
+        model.objects.filter(pk__range=(pks[start], pks[end])).update(date=days[start].item())
+
+
+class PortfolioGenerator:
+
+    def __init__(self, rng, today, days, repayments, schedules):
+        self.rng = rng
+        self.today = today
+        self.days = days
+        self.repayments = repayments
+        self.schedules = schedules
+        self.totals = Counter()
+        self.password = make_password(None)
+
+    def day(self, offsets):
+        """Dates `offsets` days before today"""
+        return np.datetime64(self.today, 'D') - np.asarray(offsets).astype('timedelta64[D]')
+
+    def organization(self, index, branches, officers, borrowers):
+        organization = Organization.objects.create(name=f"Synthetic MFB {index + 1}")
+        branch_objs = Branch.objects.bulk_create(
+            [Branch(organization=organization, name=f"Branch {b + 1:03d}") for b in range(branches)]
+        )
+        prefix = f"synthetic-{organization.pk}"
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-{n:04d}", password=self.password)
+            for n in range(branches * officers)
+        ])
+        officer_objs = LoanOfficer.objects.bulk_create([
+            LoanOfficer(user=user, organization=organization, branch=branch_objs[n // officers])
+            for n, user in enumerate(users)
+        ])
+        self.totals.update(organizations=1, branches=branches, officers=len(officer_objs))
+
+        loan_ids, loan_officers = [], []
+        for start in range(0, borrowers, CHUNK_SIZE):
+            with transaction.atomic():
+                ids, officer_idx = self.borrower_chunk(
+                    organization, branch_objs, officer_objs, officers, start, min(CHUNK_SIZE, borrowers - start)
+                )
+            loan_ids.append(ids)
+            loan_officers.append(officer_idx)
+
+        with transaction.atomic():
+            self.posting_batches(officer_objs, np.concatenate(loan_ids), np.concatenate(loan_officers))
+            self.expenses(organization, branch_objs, users)
+        return organization
+
+    def borrower_chunk(self, organization, branch_objs, officer_objs, officers, start, size):
+        rng = self.rng
+        branch_idx = rng.integers(len(branch_objs), size=size)
+        officer_idx = branch_idx * officers + rng.integers(officers, size=size)
+        first = rng.choice(FIRST_NAMES, size=size)
+        last = rng.choice(LAST_NAMES, size=size)
+        business = rng.integers(len(BUSINESSES), size=size)
+        mobile = rng.integers(10 ** 7, 10 ** 8, size=size)
+
+        borrowers = Borrower.objects.bulk_create([
+            Borrower(
+                organization=organization,
+                branch=branch_objs[branch_idx[i]],
+                full_name=f"{first[i]} {last[i]}",
+                business=BUSINESSES[business[i]],
+                unique_id=f"SYN{organization.pk}-{start + i:07d}",
+                mobile=f"080{mobile[i]}",
+            )
+            for i in range(size)
+        ], batch_size=BULK_BATCH_SIZE)
+
+        # One loan per borrower, disbursed some time in the last `days`
+        principal = rng.choice(PRINCIPALS, size=size)
+        rate = rng.choice(INTEREST_RATES, size=size)
+        tenure = rng.choice(TENURES, size=size)
+        weekly = rng.random(size) < 0.3
+        rule_of_78 = rng.random(size) < 0.2
+        age = rng.integers(0, self.days, size=size)
+        disbursed = self.day(age)
+        maturity = disbursed + tenure.astype('timedelta64[D]')
+        due_cents = principal * (100 + rate)
+
+        # Repayments: how far into the term the loan is, times how well the borrower pays
+        elapsed = np.minimum(age / tenure, 1.0)
+        repaid_share = np.clip(elapsed * rng.beta(5, 1.2, size=size) * 1.05, 0, 1)
+        count = np.where(age > 0, rng.poisson(self.repayments * elapsed) + (repaid_share > 0), 0)
+        each_cents = np.floor_divide((due_cents * repaid_share).astype(np.int64), np.maximum(count, 1))
+        count = np.where(each_cents >= 100, count, 0)
+        paid_cents = each_cents * count
+
+        # Payments fall between the day after disbursement and a month past maturity
+        loan_of = np.repeat(np.arange(size), count)
+        span = np.minimum(age, tenure + 30)[loan_of]
+        pay_age = age[loan_of] - rng.integers(1, span + 1)
+        last_age = np.full(size, self.days)
+        np.minimum.at(last_age, loan_of, pay_age)
+
+        loans = Loan.objects.bulk_create([
+            Loan(
+                organization=organization,
+                branch=borrower.branch,
+                borrower=borrower,
+                officer=officer_objs[officer_idx[i]],
+                principal=Decimal(int(principal[i])),
+                interest_rate=Decimal(int(rate[i])),
+                tenure=int(tenure[i]),
+                repayment_frequency='Weekly' if weekly[i] else 'Monthly',
+                interest_method='RuleOf78' if rule_of_78[i] else 'Flat',
+                disbursed_date=disbursed[i].item(),
+                maturity=maturity[i].item(),
+                paid=_naira(paid_cents[i]),
+                last_payment_date=self.day(last_age[i]).item() if count[i] else None,
+            )
+            for i, borrower in enumerate(borrowers)
+        ], batch_size=BULK_BATCH_SIZE)
+
+        order = np.argsort(-pay_age, kind='stable')
+        repayments = Repayment.objects.bulk_create([
+            Repayment(
+                loan=loans[loan_of[j]],
+                amount=_naira(each_cents[loan_of[j]]),
+                posted_by_id=officer_objs[officer_idx[loan_of[j]]].user_id,
+            )
+            for j in order
+        ], batch_size=BULK_BATCH_SIZE)
+        if repayments:
+            _backdate(Repayment, repayments, self.day(pay_age[order]))
+
+        if self.schedules:
+            LoanInstallment.objects.bulk_create(
+                [installment for loan in loans for installment in build_schedule(loan)], batch_size=BULK_BATCH_SIZE
+            )
+
+        saver = np.flatnonzero(rng.random(size) < SAVINGS_SHARE)
+        balance = rng.lognormal(10, 1.2, size=len(saver)).round(2)
+        Saving.objects.bulk_create([
+            Saving(
+                organization=organization,
+                borrower=borrowers[i],
+                name=borrowers[i].full_name,
+                account_number=f"SV{organization.pk}-{start + i:07d}",
+                product="Regular Savings",
+                ledger_balance=Decimal(f"{b:.2f}"),
+                last_transaction=self.day(rng.integers(0, self.days)).item(),
+                status='Active' if b > 1000 else 'Dormant',
+            )
+            for i, b in zip(saver.tolist(), balance.tolist())
+        ], batch_size=BULK_BATCH_SIZE)
+
+        self.totals.update(borrowers=size, loans=size, repayments=len(repayments), savings=len(saver))
+        return np.array([loan.pk for loan in loans]), officer_idx
+
+    def posting_batches(self, officer_objs, loan_ids, loan_officers, per_officer=4, items=25):
+        """A few recent batches per officer, each posting to some of their loans"""
+        rng = self.rng
+        batches, ages, item_loans = [], [], []
+        for n, officer in enumerate(officer_objs):
+            own = loan_ids[loan_officers == n]
+            if not len(own):
+                continue
+            for age in sorted(rng.integers(0, min(self.days, 60), size=per_officer).tolist(), reverse=True):
+                batches.append(PostingBatch(officer=officer))
+                ages.append(age)
+                item_loans.append(rng.choice(own, size=min(items, len(own)), replace=False))
+        order = np.argsort(-np.array(ages), kind='stable')
+        batches = [batches[i] for i in order]
+        item_loans = [item_loans[i] for i in order]
+        PostingBatch.objects.bulk_create(batches, batch_size=BULK_BATCH_SIZE)
+        if batches:
+            _backdate(PostingBatch, batches, self.day(np.array(ages)[order]))
+
+        pairs = [(batch, loan_id) for batch, ids in zip(batches, item_loans) for loan_id in ids.tolist()]
+        amounts = rng.integers(10, 500, size=len(pairs)) * 100
+        PostingItem.objects.bulk_create([
+            PostingItem(batch=batch, loan_id=loan_id, amount=Decimal(int(amount)))
+            for (batch, loan_id), amount in zip(pairs, amounts.tolist())
+        ], batch_size=BULK_BATCH_SIZE)
+        self.totals.update(posting_batches=len(batches), posting_items=len(pairs))
+
+    def expenses(self, organization, branch_objs, users):
+        rng = self.rng
+        rows = []
+        for branch in branch_objs:
+            for month in range(0, self.days, 30):
+                for category, (low, high) in MONTHLY_EXPENSES:
+                    rows.append(Expense(
+                        organization=organization,
+                        branch=branch,
+                        category=category,
+                        amount=Decimal(int(rng.integers(low, high))),
+                        date=self.day(month + rng.integers(0, 30)).item(),
+                        recorded_by=users[0],
+                    ))
+        Expense.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+        self.totals.update(expenses=len(rows))
+
+
+def generate_portfolio(
+    organizations=1, branches=10, officers=5, borrowers=10000, repayments=8, days=365,
+    seed=0, schedules=False, today=None,
+):
+    """
+    Add a synthetic portfolio and return a Counter of the rows created.
+
+    `branches` and `officers` are per organization and per branch,
+    `borrowers` per organization (one loan each) and `repayments` the
+    average per fully elapsed loan. `schedules` also writes installment
+    rows, which is several times slower.
+    """
+    today = today or date.today()
+    generator = PortfolioGenerator(np.random.default_rng(seed), today, days, repayments, schedules)
+    for index in range(organizations):
+        organization = generator.organization(index, branches, officers, borrowers)
+        age_loans(today=today, organization_id=organization.pk)
+        rebuild_collections(organization_id=organization.pk)
+        take_snapshot(today, organization_id=organization.pk)
+        invalidate_dashboard(organization.pk)
+    return generator.totals
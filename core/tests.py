@@ -1,3 +1,1548 @@
-from django.test import TestCase
+import io
+import json
+import re
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import Max, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from openpyxl import Workbook, load_workbook
+
+from .aging import PAR_DAYS, age_loans
+from .dashboard import dashboard_stats, portfolio_trend
+from .dedupe import find_duplicates, possible_duplicates
+from .db import immediate_atomic, refresh_sqlite_copy
+from .financials import branch_financials
+from .imports import import_borrowers, import_loans
+from .jobs import claim_next_job, run_job
+from .models import Organization, Branch, LoanOfficer, Borrower, Expense, Loan, LoanInstallment, MonthlyCollection, PortfolioSnapshot, DuplicateCandidate, PostingBatch, Repayment, ReportJob, Saving, StatementException, StatementImport, loan_total_due
+from .pdf import write_pdf
+from .reconciliation import reconcile_statement
+from .perf import PerformanceMiddleware, endpoint_stats, fingerprint, reset_stats
+from .reports import COLLECTION_COLUMNS
+from .search import search_borrower_ids
+from .routers import REPORTING_DB_ALIAS, STICKY_COOKIE, ReportingRouter
+from .rollups import rebuild_collections, year_month
+from .schedules import build_schedule, create_schedule, installments_due
+from .snapshots import take_snapshot
+from .synthetic import generate_portfolio
+from .services import post_repayment, post_batch_item, post_batch_items
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PortfolioTestCase(TestCase):
+    """Minimal organization with one officer, borrower and loan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = Organization.objects.create(name="Test MFB")
+        cls.branch = Branch.objects.create(organization=cls.organization, name="Head Office")
+        cls.user = User.objects.create_user(username="officer", password="pass")
+        cls.officer = LoanOfficer.objects.create(
+            user=cls.user, organization=cls.organization, branch=cls.branch
+        )
+        cls.borrower = Borrower.objects.create(
+            organization=cls.organization, branch=cls.branch,
+            full_name="Ada Obi", unique_id="B-0001", mobile="08030000000",
+        )
+        cls.loan = Loan.objects.create(
+            organization=cls.organization, branch=cls.branch, borrower=cls.borrower,
+            officer=cls.officer, principal=Decimal('1000.00'), interest_rate=Decimal('10.00'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def load_sheet(self, response):
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        return list(workbook.active.iter_rows(values_only=True))
+
+
+class RepaymentPostingTests(PortfolioTestCase):
+
+    def test_post_repayment_increments_paid(self):
+        post_repayment(self.loan, '400.00', posted_by=self.user)
+        post_repayment(self.loan, '100.00', posted_by=self.user)
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('500.00'))
+        self.assertEqual(self.loan.status, 'Active')
+        self.assertIsNotNone(self.loan.last_payment_date)
+
+    def test_post_repayment_closes_fully_paid_loan(self):
+        post_repayment(self.loan, '1100.00')
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.balance, Decimal('0.00'))
+        self.assertEqual(self.loan.status, 'Closed')
+
+    def test_post_repayment_rejects_bad_amounts(self):
+        for amount in ('abc', '', '-500', '0', 'NaN', 'Infinity'):
+            with self.assertRaises(ValidationError):
+                post_repayment(self.loan, amount)
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('0.00'))
+        self.assertFalse(self.loan.repayments.exists())
+
+    def test_collection_sheet_lists_only_matching_open_loans(self):
+        closed = Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            principal=Decimal('200.00'), paid=Decimal('200.00'),
+        )
+        other = Borrower.objects.create(
+            organization=self.organization, branch=self.branch, full_name="Chinedu Eze", unique_id="B-0002"
+        )
+        Loan.objects.create(organization=self.organization, branch=self.branch, borrower=other, principal=Decimal('50.00'))
+
+        self.assertEqual(list(self.client.get('/collection-sheet/').context['loans']), [])
+        loans = self.client.get('/collection-sheet/', {'q': 'ada'}).context['loans']
+        self.assertEqual(list(loans), [self.loan])
+        self.assertEqual(closed.status, 'Closed')
+
+    def test_collection_sheet_shows_amount_error(self):
+        response = self.client.post('/collection-sheet/', {'loan': self.loan.id, 'amount': '-500'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Amount must be greater than zero")
+        response = self.client.post('/repayments/add/', {'loan': self.loan.id, 'amount': 'abc'})
+        self.assertContains(response, "Amount must be a number")
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('0.00'))
+
+    def test_total_due_rounds_half_cents_like_python(self):
+        # 125.625 and 126.875 of interest: Decimal rounds both halves to even
+        for principal in ('1005.00', '1015.00'):
+            loan = Loan.objects.create(
+                organization=self.organization, branch=self.branch, borrower=self.borrower,
+                principal=Decimal(principal), interest_rate=Decimal('12.50'),
+            )
+            self.assertEqual(Loan.objects.annotate(due=loan_total_due()).get(pk=loan.pk).due, loan.total_due)
+
+            post_repayment(loan, loan.total_due)
+            loan.refresh_from_db()
+            self.assertEqual(loan.balance, Decimal('0.00'))
+            self.assertEqual(loan.status, 'Closed')
+
+    def test_post_batch_item_creates_repayment(self):
+        batch = PostingBatch.objects.create(officer=self.officer)
+        post_batch_item(batch, self.loan, '250.00', remarks="market day")
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('250.00'))
+        self.assertEqual(batch.total_amount, Decimal('250.00'))
+        self.assertEqual(self.loan.repayments.count(), 1)
+
+    def test_collection_sheet_posts_through_service(self):
+        response = self.client.post('/collection-sheet/', {'loan': self.loan.id, 'amount': '300.00'})
+
+        self.assertEqual(response.status_code, 302)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('300.00'))
+
+
+class DashboardTests(PortfolioTestCase):
+
+    def test_dashboard_figures(self):
+        post_repayment(self.loan, '200.00')
+        stats = dashboard_stats(self.organization)
+
+        self.assertEqual(stats['borrowers'], 1)
+        self.assertEqual(stats['loans'], 1)
+        self.assertEqual(stats['active_loans'], 1)
+        self.assertEqual(stats['total_repayments'], Decimal('200.00'))
+        self.assertEqual(stats['chart_values'][-1], 200.0)
+
+    def test_dashboard_is_cached_until_a_write(self):
+        dashboard_stats(self.organization)
+        with self.assertNumQueries(0):
+            dashboard_stats(self.organization)
+
+        # the cache is only dropped once the write commits
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            post_repayment(self.loan, '50.00')
+        self.assertEqual(dashboard_stats(self.organization)['total_repayments'], Decimal('0.00'))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(dashboard_stats(self.organization)['total_repayments'], Decimal('50.00'))
+
+
+class QueryPlanTests(PortfolioTestCase):
+    """
+    Every query a report view runs against the core tables must be able to
+    use an index. SQLite reports a full table scan as "SCAN <table>" with no
+    "USING ... INDEX" suffix.
+    """
+
+    REPORT_URLS = [
+        '/',
+        '/loans/par30/',
+        '/loans/overdue/',
+        '/reports/daily/',
+        '/reports/monthly/',
+        '/reports/performance/',
+        '/reports/profit-loss/',
+        '/reports/balance-sheet/',
+        '/reports/trial-balance/',
+        '/reports/branch-equity/',
+        '/reports/officer-performance/',
+    ]
+
+    FULL_SCAN = re.compile(r'^SCAN (core_\w+)(?! USING (COVERING )?INDEX)')
+
+    def assertNoFullTableScans(self, captured_queries):
+        for query in captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'core_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            self.assertEqual([step for step in plan if self.FULL_SCAN.match(step)], [], sql)
+
+    def test_report_queries_use_indexes(self):
+        for url in self.REPORT_URLS:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNoFullTableScans(ctx.captured_queries)
+
+    def test_custom_collections_uses_indexes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/reports/custom/', {'start_date': '2024-01-01', 'end_date': '2024-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNoFullTableScans(ctx.captured_queries)
+
+
+class ExcelExportTests(PortfolioTestCase):
+
+    def test_par30_excel_balance(self):
+        post_repayment(self.loan, '100.00')
+        Loan.objects.filter(pk=self.loan.pk).update(status='PAR30')
+
+        rows = self.load_sheet(self.client.get('/reports/par30-loans/excel/'))
+        self.assertEqual(rows[1][3], 1000)
+
+
+class ReportJobTests(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(REPORT_FILES_DIR=tmp.name))
+
+    def run_queued_job(self, response):
+        """Follow a report request through the queue as the worker would"""
+        job = ReportJob.objects.get()
+        self.assertRedirects(response, f'/reports/jobs/{job.id}/', fetch_redirect_response=False)
+        self.assertEqual(job.status, 'Queued')
+
+        self.assertEqual(claim_next_job(), job.id)
+        self.assertIsNone(claim_next_job())
+        run_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Done', job.error)
+        return self.load_sheet(self.client.get(f'/reports/jobs/{job.id}/download/'))
+
+    def test_loan_portfolio_excel(self):
+        rows = self.run_queued_job(self.client.get('/loans/excel/'))
+
+        self.assertEqual(rows[0][:3], ("Borrower", "Loan ID", "Principal"))
+        self.assertEqual(rows[1][:3], ("Ada Obi", self.loan.id, 1000))
+
+    def test_custom_collections_excel(self):
+        post_repayment(self.loan, '75.50')
+        today = self.loan.repayments.get().date.isoformat()
+
+        rows = self.run_queued_job(self.client.get(
+            '/reports/custom-collections/excel/', {'start_date': today, 'end_date': today}
+        ))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], 75.5)
+
+    def test_custom_collections_exports_reject_malformed_dates(self):
+        for url in ('excel', 'pdf', 'csv', 'ndjson'):
+            with self.subTest(url=url):
+                response = self.client.get(
+                    f'/reports/custom-collections/{url}/', {'start_date': 'foo', 'end_date': '2024-12-31'}
+                )
+                self.assertRedirects(response, '/reports/custom/', fetch_redirect_response=False)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_branch_equity_excel(self):
+        post_repayment(self.loan, '60.00')
+
+        rows = self.run_queued_job(self.client.get('/reports/branch-equity/excel/'))
+        self.assertEqual(rows[1], ("Head Office", 60, 0, 60))
+
+    def test_branch_equity_excel_follows_page_filters(self):
+        post_repayment(self.loan, '60.00')
+        today = date.today()
+        response = self.client.get('/reports/branch-equity/', {'start_date': today.isoformat(), 'by': 'month'})
+        self.assertContains(response, f"branch-equity/excel/?start_date={today.isoformat()}&amp;by=month")
+
+        rows = self.run_queued_job(self.client.get(
+            '/reports/branch-equity/excel/', {'start_date': today.isoformat(), 'by': 'month'}
+        ))
+        self.assertEqual(rows[1], ("Head Office", f"{today:%Y-%m}", 60, 0, 60))
+        ReportJob.objects.all().delete()
+        rows = self.run_queued_job(self.client.get(
+            '/reports/branch-equity/excel/', {'end_date': (today - timedelta(days=1)).isoformat()}
+        ))
+        self.assertEqual(rows[1], ("Head Office", 0, 0, 0))
+
+    def test_malformed_report_dates_are_reported(self):
+        response = self.client.get('/reports/branch-equity/', {'start_date': '2026-13-40'})
+        self.assertEqual(response.context['failure'], "2026-13-40 is not a valid date; use YYYY-MM-DD")
+        response = self.client.get('/accounting/profit-loss/', {'end_date': 'yesterday'})
+        self.assertContains(response, "yesterday is not a valid date")
+        response = self.client.get('/reports/branch-equity/excel/', {'start_date': 'x'})
+        self.assertRedirects(response, '/reports/branch-equity/?start_date=x', fetch_redirect_response=False)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_pending_job_page(self):
+        self.client.get('/loans/excel/')
+        job = ReportJob.objects.get()
+
+        response = self.client.get(f'/reports/jobs/{job.id}/')
+        self.assertContains(response, "refreshes automatically")
+        self.assertEqual(self.client.get(f'/reports/jobs/{job.id}/download/').status_code, 404)
+
+
+class PdfReportTests(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(REPORT_FILES_DIR=tmp.name))
+
+    def test_daily_collections_pdf_is_rendered_once(self):
+        post_repayment(self.loan, '120.00')
+
+        response = self.client.get('/reports/daily-collections/pdf/')
+        job = ReportJob.objects.get()
+        self.assertEqual((job.report, job.format), ('daily_collections', 'pdf'))
+        self.assertRedirects(response, f'/reports/jobs/{job.id}/', fetch_redirect_response=False)
+
+        run_job(claim_next_job())
+        download = self.client.get(f'/reports/jobs/{job.id}/download/')
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="daily_collections.pdf"')
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+        # A repeat request for the same day is served from the finished file
+        response = self.client.get('/reports/daily-collections/pdf/')
+        self.assertRedirects(response, f'/reports/jobs/{job.id}/download/', fetch_redirect_response=False)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_par30_and_balance_sheet_pdfs(self):
+        Loan.objects.filter(pk=self.loan.pk).update(status='PAR30')
+        self.client.get('/reports/par30-loans/pdf/')
+        self.client.get('/reports/balance-sheet/pdf/')
+
+        while (job_id := claim_next_job()) is not None:
+            run_job(job_id)
+        self.assertEqual(
+            sorted(ReportJob.objects.values_list('report', 'status')),
+            [('balance_sheet', 'Done'), ('par30_loans', 'Done')],
+        )
+
+    def test_write_pdf_splits_large_tables(self):
+        rows = ((f"Borrower {i}", i, Decimal('10.00'), date(2024, 1, 1)) for i in range(1200))
+        out = write_pdf("Collections", COLLECTION_COLUMNS, rows, io.BytesIO(), sum_columns=(2,))
+        self.assertTrue(out.getvalue().startswith(b'%PDF'))
+
+
+class StreamingExportTests(PortfolioTestCase):
+
+    def test_loan_portfolio_csv(self):
+        response = self.client.get('/loans/csv/')
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "Borrower,Loan ID,Principal,Interest Rate,Status,Branch,Officer")
+        self.assertEqual(lines[1], f"Ada Obi,{self.loan.id},1000.00,10.00,Active,Head Office,officer")
+
+    def test_daily_collections_ndjson(self):
+        post_repayment(self.loan, '40.00')
+
+        response = self.client.get('/reports/daily-collections/ndjson/')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(records, [{
+            "Borrower": "Ada Obi", "Loan ID": self.loan.id, "Amount": "40.00",
+            "Date": self.loan.repayments.get().date.isoformat(),
+        }])
+
+
+class BulkBatchPostingTests(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.batch = PostingBatch.objects.create(officer=self.officer)
+        self.second_loan = Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            officer=self.officer, principal=Decimal('500.00'),
+        )
+
+    def test_post_batch_items_updates_loans(self):
+        post_batch_items(self.batch, [
+            {'loan': self.loan.id, 'amount': '100.00'},
+            {'loan': self.loan.id, 'amount': '50.00', 'remarks': 'top up'},
+            {'loan': self.second_loan.id, 'amount': '500.00'},
+        ])
+
+        self.loan.refresh_from_db()
+        self.second_loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('150.00'))
+        self.assertEqual(self.second_loan.status, 'Closed')
+        self.assertEqual(self.batch.items.count(), 3)
+        self.assertEqual(self.batch.total_amount, Decimal('650.00'))
+
+    def test_query_count_does_not_grow_with_items(self):
+        entries = [{'loan': self.loan.id, 'amount': '1.00'}] * 200
+        post_batch_items(self.batch, entries[:1])
+        # savepoint, loan lookup, two bulk inserts, one bulk update, rollup update, release
+        with self.assertNumQueries(7):
+            post_batch_items(self.batch, entries)
+
+    def test_invalid_rows_post_nothing(self):
+        other_org = Organization.objects.create(name="Other")
+        foreign = Loan.objects.create(organization=other_org, principal=Decimal('100.00'))
+
+        with self.assertRaises(ValidationError) as ctx:
+            post_batch_items(self.batch, [
+                {'loan': self.loan.id, 'amount': '10.00'},
+                {'loan': foreign.id, 'amount': '10.00'},
+                {'loan': self.loan.id, 'amount': '-5'},
+            ])
+
+        self.assertEqual(ctx.exception.messages, [
+            f"Row 2: Loan {foreign.id} not found",
+            "Row 3: Amount must be greater than zero",
+        ])
+        self.assertEqual(self.batch.items.count(), 0)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('0.00'))
+
+    def test_malformed_rows_are_row_errors(self):
+        with self.assertRaises(ValidationError) as ctx:
+            post_batch_items(self.batch, [
+                [self.loan.id, '10.00'],
+                {'loan': self.loan.id, 'amount': 'NaN'},
+                {'loan': self.loan.id, 'amount': 'Infinity'},
+            ])
+        self.assertEqual(ctx.exception.messages, [
+            "Row 1: Each item must have a loan and an amount",
+            "Row 2: Amount must be greater than zero",
+            "Row 3: Amount must be greater than zero",
+        ])
+
+        upload = SimpleUploadedFile('batch.csv', b"loan,amount\n\xff\xfe,1\n", content_type='text/csv')
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {'file': upload})
+        self.assertEqual(response.context['errors'], ["Could not read the submitted items"])
+        # csv.Error: a field over the csv module's size limit
+        upload = SimpleUploadedFile('batch.csv', b"loan,amount\n1," + b"9" * 200000 + b"\n", content_type='text/csv')
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {'file': upload})
+        self.assertEqual(response.context['errors'], ["Could not read the submitted items"])
+
+    def test_json_submission(self):
+        response = self.client.post(
+            f'/posting-batches/{self.batch.id}/bulk/',
+            json.dumps({'items': [{'loan': self.loan.id, 'amount': '20.00'}]}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.json(), {'batch': self.batch.id, 'posted': 1, 'total': '20.00'})
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile(
+            'batch.csv', f"loan,amount,remarks\n{self.loan.id},30.00,cash\n".encode(), content_type='text/csv'
+        )
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {'file': upload})
+
+        self.assertRedirects(response, f'/posting-batches/{self.batch.id}/', fetch_redirect_response=False)
+        self.assertEqual(self.batch.items.get().remarks, 'cash')
+
+    def test_csv_without_required_columns_is_an_error(self):
+        upload = SimpleUploadedFile(
+            'batch.csv', f"loan_id,amt\n{self.loan.id},30.00\n".encode(), content_type='text/csv'
+        )
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['errors'], ["The CSV is missing the loan, amount column(s)"])
+        self.assertFalse(self.batch.items.exists())
+
+    def test_submission_without_items_is_an_error(self):
+        upload = SimpleUploadedFile('batch.csv', b"loan,amount,remarks\n,,\n", content_type='text/csv')
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {'file': upload})
+
+        self.assertEqual(response.context['errors'], ["There are no items to post"])
+        with self.assertRaisesMessage(ValidationError, "There are no items to post"):
+            post_batch_items(self.batch, [])
+
+    def test_form_grid_skips_blank_rows(self):
+        self.assertContains(self.client.get(f'/posting-batches/{self.batch.id}/bulk/'), 'name="amount"', count=20)
+
+        response = self.client.post(f'/posting-batches/{self.batch.id}/bulk/', {
+            'loan': [self.loan.id, ''],
+            'amount': ['45.00', ''],
+            'remarks': ['', ''],
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('45.00'))
+
+
+class KeysetPaginationTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Borrower.objects.bulk_create([
+            Borrower(organization=cls.organization, branch=cls.branch, full_name=f"Client {i}", unique_id=f"C-{i}")
+            for i in range(120)
+        ])
+
+    def walk(self, url):
+        ids, query = [], ''
+        while True:
+            response = self.client.get(url + query)
+            page = response.context['page']
+            ids += [b.id for b in page]
+            if not page.has_next:
+                return ids, page
+            query = f"?after={page.next_cursor}"
+
+    def test_pages_cover_every_row_once(self):
+        ids, _ = self.walk('/borrowers/')
+        expected = list(Borrower.objects.filter(organization=self.organization).order_by('-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_page(self):
+        first = self.client.get('/borrowers/').context['page']
+        second = self.client.get(f'/borrowers/?after={first.next_cursor}').context['page']
+        back = self.client.get(f'/borrowers/?before={second.previous_cursor}').context['page']
+
+        self.assertEqual([b.id for b in back], [b.id for b in first])
+        self.assertFalse(back.has_previous)
+
+    def test_composite_cursor_on_loans(self):
+        Loan.objects.bulk_create([
+            Loan(organization=self.organization, branch=self.branch, borrower=self.borrower,
+                 principal=Decimal('100.00'), disbursed_date=date(2024, 1, 1 + i % 3))
+            for i in range(60)
+        ])
+        ids, _ = self.walk('/loans/')
+        self.assertEqual(len(ids), 61)
+        self.assertEqual(len(set(ids)), 61)
+
+    def test_bad_cursor_restarts(self):
+        response = self.client.get('/repayments/?after=not-a-date~x')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous)
+
+    def test_page_query_count_is_flat(self):
+        for url in ['/borrowers/', '/loans/', '/repayments/', '/collection-sheet/', '/savings/', '/expenses/']:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(url)
+                self.assertLessEqual(len(ctx.captured_queries), 7)
+
+
+class BorrowerTotalsTests(PortfolioTestCase):
+
+    def test_with_totals_matches_properties(self):
+        Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            principal=Decimal('333.33'), interest_rate=Decimal('7.50'), fees=Decimal('5.00'),
+        )
+        post_repayment(self.loan, '250.00')
+
+        plain = Borrower.objects.get(pk=self.borrower.pk)
+        annotated = Borrower.objects.with_totals().get(pk=self.borrower.pk)
+        self.assertEqual(annotated.total_paid, plain.total_paid)
+        self.assertEqual(annotated.loan_balance, plain.loan_balance)
+
+    def test_borrower_without_loans(self):
+        other = Borrower.objects.create(
+            organization=self.organization, branch=self.branch, full_name="New Client", unique_id="B-0002"
+        )
+        annotated = Borrower.objects.with_totals().get(pk=other.pk)
+        self.assertEqual((annotated.total_paid, annotated.loan_balance), (Decimal('0.00'), Decimal('0.00')))
+
+    def test_admin_changelist_query_count_is_constant(self):
+        admin_user = User.objects.create_superuser(username="root", password="pass")
+        self.client.force_login(admin_user)
+
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get('/admin/core/borrower/').status_code, 200)
+            return len(ctx.captured_queries)
+
+        baseline = changelist_queries()
+        for i in range(20):
+            borrower = Borrower.objects.create(
+                organization=self.organization, branch=self.branch, full_name=f"Client {i}", unique_id=f"X-{i}"
+            )
+            Loan.objects.create(organization=self.organization, borrower=borrower, principal=Decimal('100.00'))
+        self.assertEqual(changelist_queries(), baseline)
+
+        response = self.client.get('/admin/core/borrower/?o=7')
+        self.assertEqual(response.status_code, 200)
+
+
+class LoanAdminTests(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser(username="root", password="pass"))
+
+    def changelist_queries(self, url='/admin/core/loan/'):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_changelist_query_count_is_constant(self):
+        post_repayment(self.loan, '100.00')
+        response, baseline = self.changelist_queries()
+        self.assertContains(response, "Ada Obi")
+        self.assertContains(response, date.today().strftime('%b'))
+
+        for i in range(20):
+            borrower = Borrower.objects.create(
+                organization=self.organization, branch=self.branch, full_name=f"Client {i}", unique_id=f"X-{i}"
+            )
+            loan = Loan.objects.create(
+                organization=self.organization, branch=self.branch, borrower=borrower, principal=Decimal('100.00')
+            )
+            post_repayment(loan, '10.00')
+        self.assertEqual(self.changelist_queries()[1], baseline)
+
+    def test_computed_columns_are_sortable(self):
+        for column in range(1, 9):
+            self.changelist_queries(f'/admin/core/loan/?o=-{column}')
+
+    def test_balance_matches_model(self):
+        post_repayment(self.loan, '250.00')
+        response, _ = self.changelist_queries()
+        loan = Loan.objects.get(pk=self.loan.pk)
+        self.assertEqual(response.context['cl'].result_list[0].balance_due, loan.balance)
+        self.assertEqual(response.context['cl'].result_list[0].due_total, loan.total_due)
+
+
+class LoanAgingTests(PortfolioTestCase):
+
+    def make_loan(self, days_late, paid='0.00', last_payment_date=None):
+        today = date.today()
+        return Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            principal=Decimal('100.00'), paid=Decimal(paid), tenure=30,
+            disbursed_date=today - timedelta(days=30 + days_late), last_payment_date=last_payment_date,
+        )
+
+    def test_statuses_follow_days_past_due(self):
+        current = self.make_loan(0)
+        late = self.make_loan(30)
+        par = self.make_loan(31)
+        # a small payment after maturity doesn't bring a loan out of arrears
+        paid_a_little = self.make_loan(45, paid='5.00', last_payment_date=date.today() - timedelta(days=5))
+
+        changed, buckets = age_loans()
+
+        statuses = dict(Loan.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[current.id], 'Active')
+        self.assertEqual(statuses[late.id], 'Overdue')
+        self.assertEqual(statuses[par.id], 'PAR30')
+        self.assertEqual(statuses[paid_a_little.id], 'PAR30')
+        self.assertEqual(changed, {'Overdue': 1, 'PAR30': 2})
+        self.assertEqual(buckets['1-30'], 1)
+        self.assertEqual(buckets['31-60'], 2)
+
+    def test_days_past_due_follow_oldest_unpaid_installment(self):
+        today = date.today()
+        loan = Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            principal=Decimal('300.00'), tenure=90, repayment_frequency='Weekly',
+            disbursed_date=today - timedelta(days=40),
+        )
+        create_schedule(loan)
+        due = list(LoanInstallment.objects.filter(loan=loan, due_date__lte=today).order_by('number'))
+
+        # nothing paid: late since the first installment
+        age_loans()
+        self.assertEqual(Loan.objects.get(pk=loan.pk).status, 'PAR30')
+        self.assertGreater((today - due[0].due_date).days, PAR_DAYS)
+
+        # exactly the first installment paid: late since the second
+        Loan.objects.filter(pk=loan.pk).update(paid=due[0].amount)
+        age_loans()
+        self.assertEqual(Loan.objects.get(pk=loan.pk).status, 'Overdue')
+
+        # everything due so far paid, to the cent
+        Loan.objects.filter(pk=loan.pk).update(paid=sum(i.amount for i in due))
+        age_loans()
+        self.assertEqual(Loan.objects.get(pk=loan.pk).status, 'Active')
+
+    def test_paid_up_loans_close_and_closed_loans_stay_closed(self):
+        paid_up = self.make_loan(60)
+        Loan.objects.filter(pk=paid_up.pk).update(paid=Decimal('100.00'), status='Overdue')
+        closed = self.make_loan(60, paid='100.00')
+
+        age_loans()
+
+        self.assertEqual(Loan.objects.get(pk=paid_up.pk).status, 'Closed')
+        self.assertEqual(Loan.objects.get(pk=closed.pk).status, 'Closed')
+
+    def test_second_run_and_dry_run_write_nothing(self):
+        loan = self.make_loan(10)
+        changed, _ = age_loans(dry_run=True)
+        self.assertEqual(changed, {'Overdue': 1})
+        self.assertEqual(Loan.objects.get(pk=loan.pk).status, 'Active')
+
+        age_loans()
+        # the open loans and their oldest unpaid installments
+        with self.assertNumQueries(2):
+            self.assertEqual(age_loans()[0], {})
+
+
+class LoanScheduleTests(PortfolioTestCase):
+
+    def make_loan(self, interest_rate=Decimal('10.00'), **kwargs):
+        return Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower, officer=self.officer,
+            principal=Decimal('1000.00'), interest_rate=interest_rate,
+            disbursed_date=date(2026, 1, 31), **kwargs
+        )
+
+    def test_monthly_flat_schedule(self):
+        loan = self.make_loan(tenure=90)
+        schedule = build_schedule(loan)
+
+        self.assertEqual(
+            [i.due_date for i in schedule], [date(2026, 2, 28), date(2026, 3, 31), loan.maturity]
+        )
+        self.assertEqual([i.interest for i in schedule], [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')])
+        self.assertEqual(sum(i.amount for i in schedule), loan.principal + loan.interest)
+
+    def test_monthly_installments_follow_calendar_months(self):
+        # three years is 36 calendar months, not 1095 / 30 = 37 periods
+        schedule = build_schedule(self.make_loan(tenure=1095))
+        self.assertEqual(len(schedule), 36)
+        self.assertEqual(schedule[12].due_date, date(2027, 2, 28))
+        self.assertEqual(schedule[24].due_date, date(2028, 2, 29))
+
+    def test_weekly_rule_of_78_schedule(self):
+        loan = self.make_loan(tenure=28, repayment_frequency='Weekly', interest_method='RuleOf78')
+        schedule = build_schedule(loan)
+
+        self.assertEqual(len(schedule), 4)
+        self.assertEqual(schedule[0].due_date, date(2026, 2, 7))
+        self.assertEqual([i.interest for i in schedule], [Decimal('40.00'), Decimal('30.00'), Decimal('20.00'), Decimal('10.00')])
+        self.assertEqual(sum(i.principal for i in schedule), loan.principal)
+
+    def test_monthly_declining_balance_schedule(self):
+        # 12% over twelve months is 1% a month on the outstanding principal
+        loan = self.make_loan(tenure=365, interest_rate=Decimal('12.00'), interest_method='Declining')
+        schedule = build_schedule(loan)
+
+        self.assertEqual(len(schedule), 12)
+        self.assertEqual({i.amount for i in schedule[:-1]}, {Decimal('88.85')})
+        self.assertEqual((schedule[0].interest, schedule[0].principal), (Decimal('10.00'), Decimal('78.85')))
+        self.assertEqual(schedule[-1].interest, Decimal('0.88'))
+        self.assertEqual(sum(i.principal for i in schedule), loan.principal)
+        # the loan is charged the schedule's interest, in Python and in the database
+        self.assertEqual(loan.interest, sum(i.interest for i in schedule))
+        self.assertLess(loan.interest, Decimal('120.00'))
+        self.assertEqual(Loan.objects.annotate(due=loan_total_due()).get(pk=loan.pk).due, loan.total_due)
+
+        post_repayment(loan, sum(i.amount for i in schedule))
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'Closed')
+
+    def test_add_loan_creates_schedule_and_sheet_shows_due_today(self):
+        response = self.client.post('/loans/add/', {
+            'borrower': self.borrower.id, 'branch': self.branch.id, 'principal': '700.00',
+            'interest_rate': '10', 'tenure': '7', 'repayment_frequency': 'Weekly',
+        })
+        self.assertEqual(response.status_code, 302)
+        loan = Loan.objects.latest('id')
+        installment = LoanInstallment.objects.get(loan=loan)
+        self.assertEqual(installment.amount, Decimal('770.00'))
+        self.assertEqual(installment.officer, self.officer)
+
+        LoanInstallment.objects.filter(pk=installment.pk).update(due_date=date.today())
+        self.assertEqual(list(installments_due(self.organization, date.today(), officer=self.officer)), [installment])
+        self.assertContains(self.client.get('/collection-sheet/'), "770.00")
+
+    def test_add_loan_rejects_unknown_choices(self):
+        data = {
+            'borrower': self.borrower.id, 'branch': self.branch.id, 'principal': '700.00',
+            'interest_rate': '10', 'tenure': '7', 'repayment_frequency': 'Daily', 'interest_method': 'Flat',
+        }
+        response = self.client.post('/loans/add/', data)
+        self.assertEqual(response.context['errors'], ["Unknown repayment frequency: Daily"])
+        response = self.client.post('/loans/add/', {**data, 'repayment_frequency': 'Weekly', 'interest_method': 'Balloon'})
+        self.assertEqual(response.context['errors'], ["Unknown interest method: Balloon"])
+        self.assertContains(response, 'value="700.00"')
+        response = self.client.post('/loans/add/', {**data, 'repayment_frequency': 'Weekly', 'tenure': 'x'})
+        self.assertEqual(response.context['errors'], ["Principal, interest rate and tenure must be numbers"])
+        self.assertEqual(Loan.objects.count(), 1)
+
+
+class PortfolioSnapshotTests(PortfolioTestCase):
+
+    def test_snapshot_rows_per_branch_and_officer(self):
+        today = date.today()
+        late = Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower,
+            principal=Decimal('200.00'), interest_rate=Decimal('10.00'), tenure=30,
+            disbursed_date=today - timedelta(days=75),
+        )
+        create_schedule(late)
+        post_repayment(late, '20.00')
+        Loan.objects.filter(pk=late.pk).update(last_payment_date=None)
+
+        self.assertEqual(take_snapshot(today), 2)
+        # Re-running a day replaces its rows
+        self.assertEqual(take_snapshot(today), 2)
+        self.assertEqual(PortfolioSnapshot.objects.count(), 2)
+
+        late_row = PortfolioSnapshot.objects.get(officer=None)
+        self.assertEqual(late_row.open_loans, 1)
+        self.assertEqual(late_row.outstanding_balance, Decimal('200.00'))
+        self.assertEqual(late_row.outstanding_principal, Decimal('181.82'))
+        self.assertEqual(late_row.arrears, Decimal('200.00'))
+        self.assertEqual(late_row.par_31_60, Decimal('200.00'))
+        self.assertEqual(late_row.collections, Decimal('20.00'))
+
+        # The setUp loan was disbursed today and is not yet due
+        officer_row = PortfolioSnapshot.objects.get(officer=self.officer)
+        self.assertEqual((officer_row.disbursed_count, officer_row.disbursed_amount), (1, Decimal('1000.00')))
+        self.assertEqual(officer_row.outstanding_balance, Decimal('1100.00'))
+        self.assertEqual(officer_row.arrears, Decimal('0.00'))
+        self.assertEqual(officer_row.par30, Decimal('0.00'))
+
+    def test_rerun_keeps_one_row_without_branch_or_officer(self):
+        Loan.objects.create(organization=self.organization, borrower=self.borrower, principal=Decimal('50.00'))
+        take_snapshot()
+        take_snapshot()
+        self.assertEqual(PortfolioSnapshot.objects.filter(branch=None, officer=None).count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PortfolioSnapshot.objects.create(organization=self.organization, date=date.today())
+
+    def test_backfill_uses_figures_as_of_the_day(self):
+        today = date.today()
+        day = today - timedelta(days=10)
+        Loan.objects.filter(pk=self.loan.pk).update(disbursed_date=today - timedelta(days=20))
+        Saving.objects.create(
+            organization=self.organization, borrower=self.borrower, name="Ada", account_number="S-1",
+            product="Regular", ledger_balance=Decimal('75.00'),
+        )
+        post_repayment(self.loan, '100.00')
+        Repayment.objects.update(date=day - timedelta(days=1))
+        # paid off today, after the day being backfilled
+        post_repayment(Loan.objects.get(pk=self.loan.pk), '1000.00')
+        late = Loan.objects.create(
+            organization=self.organization, branch=self.branch, borrower=self.borrower, officer=self.officer,
+            principal=Decimal('300.00'), disbursed_date=today - timedelta(days=5),
+        )
+
+        self.assertEqual(take_snapshot(day), 1)
+        row = PortfolioSnapshot.objects.get(date=day)
+        self.assertEqual((row.open_loans, row.outstanding_balance), (1, Decimal('1000.00')))
+        self.assertEqual(row.disbursed_count, 0)
+        self.assertIsNone(row.savings)
+
+        take_snapshot()
+        self.assertEqual(PortfolioSnapshot.objects.get(date=today, officer=self.officer).outstanding_balance,
+                         late.total_due)
+        self.assertEqual(PortfolioSnapshot.objects.get(date=today, officer=None).savings, Decimal('75.00'))
+        with self.assertRaises(ValueError):
+            take_snapshot(today + timedelta(days=1))
+
+    def test_dashboard_trend_reads_snapshots(self):
+        today = date.today()
+        for days_ago, balance in [(2, '500.00'), (1, '400.00')]:
+            PortfolioSnapshot.objects.create(
+                organization=self.organization, branch=self.branch, date=today - timedelta(days=days_ago),
+                outstanding_balance=Decimal(balance), par_over_90=Decimal('50.00'),
+            )
+
+        trend = portfolio_trend(self.organization, today=today)
+        self.assertEqual([day['outstanding'] for day in trend], [Decimal('500.00'), Decimal('400.00')])
+        self.assertEqual(dashboard_stats(self.organization)['trend_par30'], [50.0, 50.0])
+        self.assertContains(self.client.get('/'), 'trendChart')
+
+
+class MonthlyCollectionTests(PortfolioTestCase):
+
+    def test_postings_update_rollup(self):
+        post_repayment(self.loan, '100.00')
+        post_batch_items(PostingBatch.objects.create(officer=self.officer), [
+            {'loan': self.loan.id, 'amount': '25.00'},
+            {'loan': self.loan.id, 'amount': '5.00'},
+        ])
+
+        rollup = MonthlyCollection.objects.get()
+        self.assertEqual(rollup.year_month, year_month(date.today()))
+        self.assertEqual((rollup.amount, rollup.repayments), (Decimal('130.00'), 3))
+        self.assertEqual(dashboard_stats(self.organization)['chart_values'][-1], 130.0)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        no_branch = Loan.objects.create(organization=self.organization, borrower=self.borrower, principal=Decimal('50.00'))
+        post_repayment(self.loan, '100.00')
+        post_repayment(no_branch, '10.00')
+        post_repayment(no_branch, '10.00')
+        incremental = set(MonthlyCollection.objects.values_list('branch_id', 'year_month', 'amount', 'repayments'))
+
+        self.assertEqual(rebuild_collections(), 2)
+        rebuilt = set(MonthlyCollection.objects.values_list('branch_id', 'year_month', 'amount', 'repayments'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_migration_backfills_rollup(self):
+        post_repayment(self.loan, '100.00')
+        MonthlyCollection.objects.all().delete()
+
+        state = MigrationLoader(connection).project_state(('core', '0009_monthlycollection'))
+        import_module('core.migrations.0009_monthlycollection').backfill_rollup(state.apps, None)
+        self.assertEqual(MonthlyCollection.objects.get().amount, Decimal('100.00'))
+        self.assertEqual(dashboard_stats(self.organization)['chart_values'][-1], 100.0)
+
+    def test_edits_and_deletes_outside_posting_update_rollup(self):
+        repayment = post_repayment(self.loan, '100.00')
+        other = post_repayment(self.loan, '20.00')
+
+        repayment.amount = Decimal('60.00')
+        repayment.save()
+        other.date = date(2025, 1, 15)
+        other.save()
+        self.assertEqual(
+            set(MonthlyCollection.objects.values_list('year_month', 'amount', 'repayments')),
+            {(year_month(date.today()), Decimal('60.00'), 1), ('2025-01', Decimal('20.00'), 1)},
+        )
+
+        repayment.delete()
+        self.assertEqual(MonthlyCollection.objects.get(year_month=year_month(date.today())).repayments, 0)
+        # deleting the loan takes its repayments out without leaving rows behind
+        self.loan.delete()
+        self.assertEqual(MonthlyCollection.objects.get(year_month='2025-01').amount, Decimal('0.00'))
+        self.organization.delete()
+        self.assertFalse(MonthlyCollection.objects.exists())
+
+    def test_one_no_branch_row_per_month(self):
+        MonthlyCollection.objects.create(organization=self.organization, year_month='2026-01')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MonthlyCollection.objects.create(organization=self.organization, year_month='2026-01')
+
+    def test_monthly_report_total_reads_rollup(self):
+        post_repayment(self.loan, '40.00')
+        response = self.client.get('/reports/monthly/')
+        self.assertEqual(response.context['total_collected'], Decimal('40.00'))
+
+        MonthlyCollection.objects.update(amount=Decimal('45.00'))
+        response = self.client.get('/reports/monthly/')
+        self.assertEqual(response.context['total_collected'], Decimal('45.00'))
+
+
+class BranchFinancialsTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.east = Branch.objects.create(organization=cls.organization, name="East")
+        Branch.objects.create(organization=cls.organization, name="Idle")
+        for branch, amount, day in [(cls.branch, '30.00', date(2026, 1, 5)), (cls.east, '5.00', date(2026, 2, 5))]:
+            Expense.objects.create(
+                organization=cls.organization, branch=branch, category='Rent', amount=Decimal(amount), date=day
+            )
+
+    def test_rows_for_every_branch(self):
+        post_repayment(self.loan, '100.00')
+        east_loan = Loan.objects.create(
+            organization=self.organization, branch=self.east, borrower=self.borrower, principal=Decimal('50.00')
+        )
+        post_repayment(east_loan, '20.00')
+
+        with self.assertNumQueries(3):
+            rows = branch_financials(self.organization.id)
+        summary = {row['name']: (row['collections'], row['expenses'], row['equity']) for row in rows}
+        self.assertEqual(summary, {
+            "East": (Decimal('20.00'), Decimal('5.00'), Decimal('15.00')),
+            "Head Office": (Decimal('100.00'), Decimal('30.00'), Decimal('70.00')),
+            "Idle": (Decimal('0.00'), Decimal('0.00'), Decimal('0.00')),
+        })
+
+    def test_date_range_and_month_breakdown(self):
+        rows = branch_financials(self.organization.id, start=date(2026, 2, 1))
+        self.assertEqual(sum(row['expenses'] for row in rows), Decimal('5.00'))
+
+        rows = branch_financials(self.organization.id, by_month=True)
+        self.assertEqual(
+            [(row['name'], row['month'], row['expenses']) for row in rows],
+            [("East", date(2026, 2, 1), Decimal('5.00')), ("Head Office", date(2026, 1, 1), Decimal('30.00'))],
+        )
+
+    def test_profit_loss_includes_loans_without_branch(self):
+        loose = Loan.objects.create(organization=self.organization, borrower=self.borrower, principal=Decimal('50.00'))
+        post_repayment(loose, '12.00')
+
+        response = self.client.get('/accounting/profit-loss/')
+        self.assertEqual(response.context['income'], Decimal('12.00'))
+        self.assertEqual(response.context['profit'], Decimal('-23.00'))
+        self.assertContains(response, "Unassigned")
+        self.assertEqual(self.client.get('/accounting/branch-equity/?by=month').status_code, 200)
+
+
+class ReportingRouterTests(PortfolioTestCase):
+
+    def routed_reads(self, path, **kwargs):
+        """Where the router sent core reads while serving `path` (they still run on default)"""
+        seen = []
+        decide = ReportingRouter.db_for_read
+
+        def spy(router, model, **hints):
+            if model._meta.app_label == 'core':
+                seen.append(decide(router, model, **hints))
+            return 'default'
+
+        with mock.patch('core.routers.replica_available', return_value=True), \
+                mock.patch.object(ReportingRouter, 'db_for_read', spy):
+            response = self.client.get(path, **kwargs)
+            self.assertEqual(response.status_code, 200)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return set(seen)
+
+    def test_report_views_read_from_replica(self):
+        self.assertEqual(self.routed_reads('/reports/branch-equity/'), {REPORTING_DB_ALIAS})
+        self.assertEqual(self.routed_reads('/reports/par30-loans/csv/'), {REPORTING_DB_ALIAS})
+        self.assertEqual(self.routed_reads('/loans/'), {'default'})
+
+    def test_report_jobs_read_from_replica(self):
+        self.client.get('/reports/par30-loans/pdf/')
+        seen = []
+        decide = ReportingRouter.db_for_read
+
+        def spy(router, model, **hints):
+            seen.append((model._meta.model_name, decide(router, model, **hints)))
+            return 'default'
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(REPORT_FILES_DIR=tmp), \
+                mock.patch('core.routers.replica_available', return_value=True), \
+                mock.patch.object(ReportingRouter, 'db_for_read', spy):
+            run_job(claim_next_job())
+        self.assertIn(('loan', REPORTING_DB_ALIAS), seen)
+        self.assertEqual({alias for name, alias in seen if name == 'reportjob'}, {'default'})
+        self.assertEqual(ReportJob.objects.get().status, 'Done')
+
+    def test_writes_pin_user_to_primary(self):
+        response = self.client.post('/collection-sheet/', {'loan': self.loan.id, 'amount': '300.00'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        self.assertEqual(self.routed_reads('/reports/branch-equity/'), {'default'})
+        self.assertNotIn(STICKY_COOKIE, self.client.get('/loans/').cookies)
+
+    def test_replica_off_without_separate_database(self):
+        # The test alias mirrors default, so reports must read from the primary
+        response = self.client.get('/reports/branch-equity/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ReportingRouter().db_for_read(Loan), 'default')
+        self.assertFalse(ReportingRouter().allow_migrate(REPORTING_DB_ALIAS, 'core'))
+
+    def test_refresh_sqlite_copy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source, target = Path(tmp) / 'primary.sqlite3', Path(tmp) / 'replica.sqlite3'
+            primary = sqlite3.connect(source)
+            primary.execute("PRAGMA journal_mode = WAL")
+            primary.execute("CREATE TABLE t (x)")
+            primary.execute("INSERT INTO t VALUES (1)")
+            primary.commit()
+
+            refresh_sqlite_copy(source, target)
+            primary.close()
+            replica = sqlite3.connect(target)
+            self.assertEqual(replica.execute("SELECT x FROM t").fetchall(), [(1,)])
+            self.assertEqual(replica.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+            replica.close()
+
+
+class PerformanceMiddlewareTests(PortfolioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def test_fingerprint_ignores_literals_and_in_lists(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = %s AND name = 'x' AND k IN (%s, %s) LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id = %s AND name = 'y' AND k IN (%s) LIMIT 1"),
+        )
+
+    def test_server_timing_and_endpoint_stats(self):
+        response = self.client.get('/loans/')
+        self.assertRegex(response['Server-Timing'], r'total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"')
+
+        self.client.get('/loans/')
+        [row] = [row for row in endpoint_stats() if row['endpoint'] == 'GET /loans/']
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['queries_max'], 0)
+        self.assertEqual(row['flagged'], 0)
+
+    def test_repeated_queries_flagged_as_n_plus_one(self):
+        def loop_view(request):
+            for pk in range(6):
+                Loan.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        request = RequestFactory().get('/loans/')
+        request.resolver_match = resolve('/loans/')
+        with self.assertLogs('core.perf', 'WARNING') as logs:
+            PerformanceMiddleware(loop_view)(request)
+        self.assertIn("Possible N+1 in GET /loans/: 6 x SELECT", logs.output[0])
+        [row] = endpoint_stats()
+        self.assertEqual((row['flagged'], row['worst_duplicate'][1]), (1, 6))
+
+    def test_streamed_export_recorded_when_read(self):
+        response = self.client.get('/loans/csv/')
+        self.assertFalse([row for row in endpoint_stats() if row['endpoint'] == 'GET /loans/csv/'])
+
+        self.assertIn(b"Ada Obi", b''.join(response.streaming_content))
+        response.close()
+        [row] = [row for row in endpoint_stats() if row['endpoint'] == 'GET /loans/csv/']
+        # the loan query runs while the body is streamed
+        self.assertGreater(row['queries_max'], 0)
+
+    def test_stats_page_is_staff_only(self):
+        self.assertEqual(self.client.get('/performance/').status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get('/loans/')
+        response = self.client.get('/performance/')
+        self.assertContains(response, "GET /loans/")
+
+
+class SyntheticPortfolioTests(PortfolioTestCase):
+
+    def test_generated_portfolio_is_consistent(self):
+        today = date(2026, 6, 30)
+        totals = generate_portfolio(branches=2, officers=2, borrowers=40, repayments=4, days=120, seed=3, today=today)
+        self.assertEqual((totals['borrowers'], totals['loans'], totals['officers']), (40, 40, 4))
+
+        organization = Organization.objects.get(name="Synthetic MFB 1")
+        loans = Loan.objects.filter(organization=organization)
+        repayments = Repayment.objects.filter(loan__organization=organization)
+        self.assertEqual(repayments.count(), totals['repayments'])
+        for loan in loans.annotate(repaid=Sum('repayments__amount'), latest=Max('repayments__date')):
+            self.assertEqual(loan.paid, loan.repaid or Decimal('0.00'))
+            self.assertEqual(loan.last_payment_date, loan.latest)
+            self.assertLessEqual(loan.disbursed_date, today)
+        self.assertFalse(loans.filter(status='Active', maturity__lt=today - timedelta(days=30)).exists())
+        rollup = MonthlyCollection.objects.filter(organization=organization).aggregate(total=Sum('amount'))['total']
+        self.assertAlmostEqual(rollup, repayments.aggregate(total=Sum('amount'))['total'], places=2)
+
+    def test_bench_urls_writes_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'bench.json'
+            call_command('bench_urls', repeat=1, only='/loans/', output=str(output), stdout=io.StringIO())
+            baseline = json.loads(output.read_text())
+        row = baseline['urls']['/loans/']
+        self.assertEqual(row['status'], 200)
+        self.assertGreater(row['queries'], 0)
+        self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+        self.assertEqual(baseline['rows']['Loan'], 1)
+
+
+@override_settings(REPORT_FILES_DIR=tempfile.mkdtemp())
+class BorrowerImportTests(PortfolioTestCase):
+
+    CSV = (
+        "Full Name,Unique ID,Branch,Mobile,Email,Status\n"
+        "Bola Ade,IMP-1,head office,0803,bola@example.com,inactive\n"
+        "Repeat,IMP-1,Head Office,,,\n"
+        "Taken,B-0001,Head Office,,,\n"
+        "Lost,IMP-2,Nowhere,,,\n"
+        ",IMP-3,Head Office,,,\n"
+        "Bad Mail,IMP-4,Head Office,,not-an-email,\n"
+        "Chidi Eze,IMP-5,Head Office,,,\n"
+    )
+
+    def test_upload_creates_valid_rows_and_reports_the_rest(self):
+        upload = SimpleUploadedFile("clients.csv", self.CSV.encode())
+        response = self.client.post('/borrowers/import/', {'file': upload})
+
+        result = response.context['result']
+        self.assertEqual(result.created, 2)
+        self.assertEqual(
+            [(line, message) for line, _, message in result.errors],
+            [
+                (3, "unique_id appears earlier in the file"),
+                (4, "unique_id already exists"),
+                (5, "unknown branch"),
+                (6, "full_name is required"),
+                (7, "invalid email"),
+            ],
+        )
+        bola = Borrower.objects.get(unique_id="IMP-1")
+        self.assertEqual((bola.branch, bola.status, bola.business), (self.branch, "Inactive", None))
+
+        report = self.client.get('/borrowers/import/errors/')
+        self.assertIn(b"4,B-0001,unique_id already exists", b''.join(report.streaming_content))
+
+    def test_xlsx_in_chunks_and_dry_run(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["full_name", "unique_id", "branch"])
+        for n in range(25):
+            sheet.append([f"Client {n}", f"X-{n}", "Head Office"])
+        sheet.append(["Again", "X-3", "Head Office"])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        buffer.seek(0)
+        buffer.name = "clients.xlsx"
+        result = import_borrowers(self.organization, buffer, dry_run=True, chunk_size=10)
+        self.assertEqual((result.valid, result.created, result.errors), (25, 0, [(27, "X-3", "unique_id appears earlier in the file")]))
+
+        buffer.seek(0)
+        with self.assertNumQueries(1 + 3 * 4):  # branches, then per chunk: lookup, savepoint, insert, release
+            result = import_borrowers(self.organization, buffer, chunk_size=10)
+        self.assertEqual(result.created, 25)
+        self.assertEqual(Borrower.objects.filter(unique_id__startswith="X-").count(), 25)
+
+    def test_missing_columns_rejected(self):
+        upload = SimpleUploadedFile("clients.csv", b"name,id\nA,1\n")
+        response = self.client.post('/borrowers/import/', {'file': upload})
+        self.assertContains(response, "Missing column(s): full_name, unique_id, branch")
+
+
+@override_settings(REPORT_FILES_DIR=tempfile.mkdtemp())
+class LoanDisbursementImportTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.east = Branch.objects.create(organization=cls.organization, name="East")
+        cls.client_b = Borrower.objects.create(
+            organization=cls.organization, branch=cls.east, full_name="Bola Ade", unique_id="B-0002"
+        )
+
+    def upload(self, text, **data):
+        return self.client.post('/loans/import/', {'file': SimpleUploadedFile("loans.csv", text.encode()), **data})
+
+    def test_disburses_file_with_computed_columns(self):
+        response = self.upload(
+            "unique_id,principal,interest_rate,tenure,fees,disbursed_date,repayment_frequency,interest_method\n"
+            "B-0001,1000,10,60,,2026-03-01,,\n"
+            "B-0002,2500.50,12.5,28,5,2026-03-02,weekly,rule of 78\n"
+        )
+        result = response.context['result']
+        self.assertEqual((result.created, result.errors), (2, []))
+        self.assertEqual(result.totals, {
+            'principal': Decimal('3500.50'), 'interest': Decimal('412.56'), 'total_due': Decimal('3918.06'),
+        })
+
+        loan = Loan.objects.get(borrower=self.client_b)
+        self.assertEqual((loan.branch, loan.officer), (self.east, self.officer))
+        self.assertEqual(loan.maturity, date(2026, 3, 30))
+        self.assertEqual((loan.interest, loan.total_due), (Decimal('312.56'), Decimal('2818.06')))
+        self.assertEqual((loan.repayment_frequency, loan.interest_method), ('Weekly', 'RuleOf78'))
+        installments = loan.installments.order_by('number')
+        self.assertEqual(len(installments), 4)
+        self.assertEqual(sum(i.amount for i in installments), loan.principal + loan.interest)
+
+    def test_declining_balance_loans_carry_schedule_interest(self):
+        response = self.upload(
+            "unique_id,principal,interest_rate,tenure,disbursed_date,interest_method\n"
+            "B-0002,1000,12,365,2026-01-31,declining balance\n"
+        )
+        result = response.context['result']
+        loan = Loan.objects.get(borrower=self.client_b)
+        self.assertEqual(loan.interest_method, 'Declining')
+        self.assertEqual(loan.scheduled_interest, sum(i.interest for i in loan.installments.all()))
+        self.assertEqual((result.totals['interest'], result.totals['total_due']), (loan.interest, loan.total_due))
+
+    def test_any_bad_row_rejects_whole_file(self):
+        before = Loan.objects.count()
+        response = self.upload(
+            "unique_id,principal,interest_rate,tenure,disbursed_date\n"
+            "B-0001,1000,10,30,\n"
+            "NOPE,1000,10,30,\n"
+            "B-0002,-5,10,30,\n"
+            "B-0002,1000,10,2.5,\n"
+            "B-0002,1000,10,30,01/03/2026\n"
+        )
+        result = response.context['result']
+        self.assertEqual(result.created, 0)
+        self.assertEqual([(line, message) for line, _, message in result.errors], [
+            (3, "unknown borrower"),
+            (4, "principal must be a number greater than zero"),
+            (5, "tenure must be a whole number of days up to 3650"),
+            (6, "disbursed_date must be YYYY-MM-DD"),
+        ])
+        self.assertEqual(Loan.objects.count(), before)
+        self.assertContains(response, "Nothing was disbursed")
+
+    def test_dry_run_and_query_count(self):
+        csv_text = "unique_id,principal,interest_rate,tenure\n" + "B-0001,100,10,30\n" * 50
+        result = import_loans(self.organization, io.StringIO(csv_text), self.officer, dry_run=True)
+        self.assertEqual((result.valid, result.created), (50, 0))
+
+        # officers, borrowers, then loans and installments inside one transaction (open + close)
+        with self.assertNumQueries(6):
+            import_loans(self.organization, io.StringIO(csv_text), self.officer)
+        self.assertEqual(Loan.objects.filter(borrower=self.borrower).count(), 51)
+
+
+class StatementReconciliationTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.chinedu = Borrower.objects.create(
+            organization=cls.organization, branch=cls.branch,
+            full_name="Chinedu Okafor", unique_id="B-0002", mobile="+234 803 111 2222",
+        )
+        cls.loan_b = Loan.objects.create(
+            organization=cls.organization, branch=cls.branch, borrower=cls.chinedu,
+            officer=cls.officer, principal=Decimal('5000.00'), interest_rate=Decimal('10.00'),
+        )
+        cls.loan_c = Loan.objects.create(
+            organization=cls.organization, branch=cls.branch, borrower=cls.chinedu,
+            officer=cls.officer, principal=Decimal('800.00'), interest_rate=Decimal('10.00'),
+        )
+
+    def statement(self):
+        return SimpleUploadedFile("statement.csv", (
+            "Transaction Date,Description,Reference,Credit\n"
+            "2026-03-01,Transfer from ADA OBI B-0001,TRF001,100.00\n"
+            "2026-03-01,NIP/2348031112222/payment,TRF002,\"1,250.00\"\n"
+            f"2026-03-02,Repayment loan #{self.loan_c.id},TRF003,70\n"
+            "2026-03-02,CHINEDU OKAFUR,TRF004,20\n"
+            "2026-03-03,Unknown sender,TRF005,30\n"
+            "2026-03-03,SMS charges B-0001,TRF006,-10\n"
+            "2026-03-03,B-0001,TRF007,n/a\n"
+        ).encode())
+
+    def test_matches_posts_and_queues_exceptions(self):
+        response = self.client.post('/reconciliation/', {'file': self.statement()})
+        statement = response.context['statement']
+        self.assertEqual((statement.lines, statement.matched, statement.exception_count), (7, 4, 3))
+        self.assertEqual(statement.posted_amount, Decimal('1440.00'))
+
+        paid = dict(Repayment.objects.values_list('loan').annotate(total=Sum('amount')))
+        # the mobile and name matches go to Chinedu's older loan
+        self.assertEqual(paid, {
+            self.loan.id: Decimal('100.00'), self.loan_b.id: Decimal('1270.00'), self.loan_c.id: Decimal('70.00'),
+        })
+        self.assertEqual(statement.batch.items.count(), 4)
+        self.assertEqual(
+            list(statement.exceptions.order_by('line').values_list('line', 'reason', 'amount')),
+            [(6, "No matching loan", Decimal('30.00')), (7, "Not a credit", Decimal('-10.00')),
+             (8, "Unreadable amount", None)],
+        )
+
+        response = self.client.post('/reconciliation/', {'file': self.statement()})
+        self.assertContains(response, "already been imported")
+        self.assertEqual(StatementImport.objects.count(), 1)
+
+    def test_exception_queue_posts_to_chosen_loan_or_dismisses(self):
+        statement = reconcile_statement(self.organization, self.statement(), self.officer)
+        unknown = statement.exceptions.get(line=6)
+        debit = statement.exceptions.get(line=7)
+
+        response = self.client.post('/reconciliation/exceptions/', {'exception': debit.id, 'loan': self.loan.id})
+        self.assertContains(response, "only credits can be posted")
+        self.client.post('/reconciliation/exceptions/', {'exception': unknown.id, 'loan': self.loan.id})
+        self.client.post('/reconciliation/exceptions/', {'exception': debit.id, 'action': 'dismiss'})
+
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.status, unknown.loan, unknown.resolved_by), ('Posted', self.loan, self.user))
+        self.assertEqual(StatementException.objects.get(pk=debit.id).status, 'Dismissed')
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.paid, Decimal('130.00'))
+        statement.refresh_from_db()
+        self.assertEqual((statement.matched, statement.exception_count), (5, 2))
+        self.assertEqual(statement.posted_amount, Decimal('1470.00'))
+
+        response = self.client.get('/reconciliation/exceptions/')
+        self.assertEqual([e.line for e in response.context['exceptions']], [8])
+
+
+class BorrowerSearchTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_org = Organization.objects.create(name="Other MFB")
+        Borrower.objects.create(
+            organization=cls.other_org, branch=Branch.objects.create(organization=cls.other_org, name="HQ"),
+            full_name="Ada Obiora", unique_id="X-0001",
+        )
+        cls.chinedu, cls.adaeze = Borrower.objects.bulk_create([
+            Borrower(organization=cls.organization, branch=cls.branch, full_name="Chinedu Okafor",
+                     unique_id="B-0002", mobile="+234 803 111 2222", business="Okafor Provisions"),
+            Borrower(organization=cls.organization, branch=cls.branch, full_name="Adaeze Nwosu",
+                     unique_id="B-0003", business="Okafor Fabrics"),
+        ])
+
+    def search(self, text):
+        return search_borrower_ids(self.organization, text)
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        # the other organization's Ada is not listed
+        self.assertCountEqual(self.search("ada"), [self.borrower.id, self.adaeze.id])
+        # a name match ranks above a business match
+        self.assertEqual(self.search("okafor"), [self.chinedu.id, self.adaeze.id])
+        self.assertEqual(self.search("b-0002"), [self.chinedu.id])
+        self.assertEqual(self.search("08031112222"), [self.chinedu.id])
+        self.assertEqual(self.search("0803 111"), [self.chinedu.id])
+        # a loan ID puts its borrower first, ahead of numbers that merely start with it
+        self.assertEqual(self.search(str(self.loan.id))[0], self.borrower.id)
+        self.assertEqual(self.search('"*'), [])
+
+        Borrower.objects.filter(pk=self.chinedu.pk).update(full_name="Chidi Okafor")
+        self.assertEqual(self.search("chinedu"), [])
+        self.assertEqual(self.search("chidi oka"), [self.chinedu.id])
+        self.adaeze.delete()
+        self.assertEqual(self.search("ada"), [self.borrower.id])
+
+    def test_search_endpoint_and_borrowers_page(self):
+        response = self.client.get('/borrowers/search/', {'q': 'chinedu'})
+        self.assertEqual(
+            [(row['id'], row['mobile']) for row in response.json()['results']],
+            [(self.chinedu.id, "+234 803 111 2222")],
+        )
+        response = self.client.get('/borrowers/', {'q': 'Okafor'})
+        self.assertEqual([b.full_name for b in response.context['borrowers']], ["Chinedu Okafor", "Adaeze Nwosu"])
+
+    def test_admin_search_uses_index(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/core/borrower/', {'q': 'ada'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('core_borrower_fts', sql)
+        self.assertNotIn('LIKE', sql)
+
+        response = self.client.get('/admin/core/loan/', {'q': str(self.loan.id)})
+        self.assertEqual(list(response.context['cl'].result_list), [self.loan])
+
+
+class DuplicateBorrowerTests(PortfolioTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.twin, cls.stranger = Borrower.objects.bulk_create([
+            Borrower(organization=cls.organization, branch=cls.branch, full_name="Adah Obi",
+                     unique_id="B0001", mobile="+234 803 000 0000"),
+            Borrower(organization=cls.organization, branch=cls.branch, full_name="Emeka Eze",
+                     unique_id="B-0009", mobile="08125550000", business="Eze Motors"),
+        ])
+
+    def test_job_queues_likely_duplicates_once(self):
+        stats = find_duplicates(self.organization)
+        self.assertEqual(stats['borrowers'], 3)
+        self.assertEqual(stats['queued'], 1)
+        candidate = DuplicateCandidate.objects.get()
+        self.assertEqual((candidate.borrower, candidate.duplicate), (self.borrower, self.twin))
+        self.assertIn("same phone", candidate.reasons)
+
+        # a dismissed pair is not queued again, and unchanged keys are left alone
+        candidate.status = 'Dismissed'
+        candidate.save()
+        stats = find_duplicates(self.organization)
+        self.assertEqual((stats['queued'], stats['keys_added'], stats['keys_removed']), (0, 0, 0))
+        self.assertEqual(DuplicateCandidate.objects.get().status, 'Dismissed')
+
+        Borrower.objects.filter(pk=self.stranger.pk).update(mobile="08125550001")
+        stats = find_duplicates(self.organization)
+        self.assertEqual((stats['keys_added'], stats['keys_removed']), (1, 1))
+
+    def test_add_borrower_warns_before_saving_a_duplicate(self):
+        find_duplicates(self.organization)
+        data = {
+            'full_name': "Ada  Obi", 'mobile': "0803 000 0000", 'unique_id': "B-0100",
+            'business': "", 'email': "", 'branch': self.branch.id, 'status': "Active",
+        }
+        response = self.client.post('/borrowers/add/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([b for b, score, reasons in response.context['duplicates']], [self.borrower, self.twin])
+        self.assertContains(response, 'value="0803 000 0000"')
+        self.assertEqual(Borrower.objects.filter(organization=self.organization).count(), 3)
+
+        response = self.client.post('/borrowers/add/', {**data, 'confirm_duplicate': '1'})
+        self.assertRedirects(response, '/borrowers/', fetch_redirect_response=False)
+        added = Borrower.objects.latest('id')
+        self.assertEqual(
+            set(DuplicateCandidate.objects.filter(duplicate=added).values_list('borrower_id', flat=True)),
+            {self.borrower.id, self.twin.id},
+        )
+
+        # an unrelated borrower is saved straight away
+        response = self.client.post('/borrowers/add/', {**data, 'full_name': "Ngozi Ude", 'mobile': "07061234567", 'unique_id': "B-0101"})
+        self.assertRedirects(response, '/borrowers/', fetch_redirect_response=False)
+        self.assertEqual(possible_duplicates(self.organization, "Ngozi Udeh", mobile="07061234567")[0][0].full_name,
+                         "Ngozi Ude")
+
+    def test_review_queue(self):
+        find_duplicates(self.organization)
+        candidate = DuplicateCandidate.objects.get()
+        response = self.client.get('/borrowers/duplicates/')
+        self.assertEqual(list(response.context['candidates']), [candidate])
+
+        self.client.post('/borrowers/duplicates/', {'candidate': candidate.id, 'action': 'dismiss'})
+        candidate.refresh_from_db()
+        self.assertEqual((candidate.status, candidate.reviewed_by), ('Dismissed', self.user))
+        self.assertEqual(list(self.client.get('/borrowers/duplicates/').context['candidates']), [])
+
+
+class SqliteTuningTests(TransactionTestCase):
+
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 10000)
+
+    def test_immediate_atomic_takes_write_lock_at_begin(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with immediate_atomic():
+                Organization.objects.create(name="Locked")
+            with transaction.atomic():
+                Organization.objects.create(name="Deferred")
+        begins = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN IMMEDIATE', 'BEGIN'])
+
+    def test_nested_immediate_atomic_is_a_savepoint(self):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as ctx:
+                with immediate_atomic():
+                    Organization.objects.create(name="Nested")
+        self.assertFalse(any(q['sql'].startswith('BEGIN') for q in ctx.captured_queries))
@@ -7,10 +7,16 @@ urlpatterns = [
     # Borrowers
     path('borrowers/', views.borrowers_view, name='borrowers'),
     path('borrowers/add/', views.add_borrower, name='add_borrower'),
+    path('borrowers/search/', views.borrower_search, name='borrower_search'),
+    path('borrowers/duplicates/', views.duplicate_borrowers, name='duplicate_borrowers'),
+    path('borrowers/import/', views.import_borrowers, name='import_borrowers'),
+    path('borrowers/import/errors/', views.borrower_import_errors, name='borrower_import_errors'),
 
     # Loans
     path('loans/', views.loans_view, name='loans'),
     path('loans/add/', views.add_loan, name='add_loan'),
+    path('loans/import/', views.import_loans, name='import_loans'),
+    path('loans/import/errors/', views.loan_import_errors, name='loan_import_errors'),
     path('loans/par30/', views.par30_loans, name='par30_loans'),
     path('loans/overdue/', views.overdue_loans, name='overdue_loans'),
 
@@ -41,7 +47,12 @@ urlpatterns = [
     path('posting-batches/', views.posting_batches, name='posting_batches'),
     path('posting-batches/create/', views.create_posting_batch, name='create_posting_batch'),
     path('posting-batches/<int:batch_id>/add-item/', views.add_posting_item, name='add_posting_item'),
+    path('posting-batches/<int:batch_id>/bulk/', views.bulk_post_items, name='bulk_post_items'),
     path('posting-batches/<int:pk>/', views.posting_batch_detail, name='posting_batch_detail'),
+
+    # Statement reconciliation
+    path('reconciliation/', views.reconciliation, name='reconciliation'),
+    path('reconciliation/exceptions/', views.statement_exceptions, name='statement_exceptions'),
     # Custom date-range collections report
     # path('reports/custom/', views.custom_collections_report, name='custom_collections_report'),
     
@@ -84,4 +95,31 @@ urlpatterns = [
     path('reports/branch-equity/excel/', views.branch_equity_excel, name='branch_equity_excel'),
     path('loans/excel/', views.loan_portfolio_excel, name='loan_portfolio_excel'),
 
+    # Background report jobs
+    path('reports/jobs/', views.report_jobs, name='report_jobs'),
+    path('reports/jobs/<int:pk>/', views.report_job_detail, name='report_job_detail'),
+    path('reports/jobs/<int:pk>/download/', views.report_job_download, name='report_job_download'),
+
+    # PDF reports (rendered by the report worker)
+    path('reports/daily-collections/pdf/', views.daily_collections_pdf, name='daily_collections_pdf'),
+    path('reports/monthly-collections/pdf/', views.monthly_collections_pdf, name='monthly_collections_pdf'),
+    path('reports/custom-collections/pdf/', views.custom_collections_pdf, name='custom_collections_pdf'),
+    path('reports/par30-loans/pdf/', views.par30_loans_pdf, name='par30_loans_pdf'),
+    path('reports/balance-sheet/pdf/', views.balance_sheet_pdf, name='balance_sheet_pdf'),
+
+    # CSV / NDJSON streaming exports
+    path('reports/daily-collections/csv/', views.daily_collections_excel, {'fmt': 'csv'}, name='daily_collections_csv'),
+    path('reports/daily-collections/ndjson/', views.daily_collections_excel, {'fmt': 'ndjson'}, name='daily_collections_ndjson'),
+    path('reports/monthly-collections/csv/', views.monthly_collections_excel, {'fmt': 'csv'}, name='monthly_collections_csv'),
+    path('reports/monthly-collections/ndjson/', views.monthly_collections_excel, {'fmt': 'ndjson'}, name='monthly_collections_ndjson'),
+    path('reports/custom-collections/csv/', views.custom_collections_excel, {'fmt': 'csv'}, name='custom_collections_csv'),
+    path('reports/custom-collections/ndjson/', views.custom_collections_excel, {'fmt': 'ndjson'}, name='custom_collections_ndjson'),
+    path('reports/par30-loans/csv/', views.par30_loans_excel, {'fmt': 'csv'}, name='par30_loans_csv'),
+    path('reports/par30-loans/ndjson/', views.par30_loans_excel, {'fmt': 'ndjson'}, name='par30_loans_ndjson'),
+    path('loans/csv/', views.loan_portfolio_excel, {'fmt': 'csv'}, name='loan_portfolio_csv'),
+    path('loans/ndjson/', views.loan_portfolio_excel, {'fmt': 'ndjson'}, name='loan_portfolio_ndjson'),
+
+    # Request timing collected by core.perf.PerformanceMiddleware (staff only)
+    path('performance/', views.performance_stats, name='performance_stats'),
+
 ]
\ No newline at end of file
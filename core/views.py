@@ -1,7 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.db import transaction
 from django.db.models import Sum, F
 from django.utils.timezone import now
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from datetime import date
 from datetime import timedelta
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField
@@ -15,15 +18,34 @@ from .models import (
     Vendor,
     Expense,
     Expense, Branch, 
-   
-    
+    ReportJob,
+    StatementImport, StatementException,
+    DuplicateCandidate,
   
 )
+from .services import post_repayment, post_batch_item, post_batch_items
+from .schedules import create_schedule, installments_due
+from .rollups import monthly_totals, year_month
+from .financials import branch_financials, financial_totals
+from .dashboard import dashboard_stats
+from .pagination import keyset_paginate
+from .exports import export_to_excel, export_report, EXPORT_CHUNK_SIZE
+from .reports import COLLECTION_COLUMNS, collection_rows, loan_portfolio_rows, par30_rows
+from .reconciliation import reconcile_statement, resolve_exception
+from .search import search_borrower_ids, search_borrowers
+from .dedupe import possible_duplicates, register_borrower
+from .imports import error_report_path, import_borrowers as run_borrower_import, import_loans as run_loan_import, save_error_report
+from .perf import DUPLICATE_QUERY_THRESHOLD, endpoint_stats, reset_stats
+from .jobs import REPORTS, enqueue_report, job_file_path, job_download_name
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.core.exceptions import ValidationError
+import csv
+import io
+import json
 import pandas as pd
 import openpyxl
 
@@ -40,69 +62,8 @@ import openpyxl
 def dashboard(request):
     organization = request.user.loanofficer.organization
 
-    # Counts
-    borrowers_count = Borrower.objects.filter(organization=organization).count()
-    loans_count = Loan.objects.filter(organization=organization).count()
-    active_loans = Loan.objects.filter(organization=organization, status='Active').count()
-    overdue_loans = Loan.objects.filter(organization=organization, status='Overdue').count()
-    par30_loans = Loan.objects.filter(organization=organization, status='PAR30').count()
-    closed_loans = Loan.objects.filter(organization=organization, status='Closed').count()
-
-    # Total portfolio
-    total_portfolio = Loan.objects.filter(organization=organization).aggregate(
-        total=Sum(
-            ExpressionWrapper(
-                F('principal') + (F('principal') * F('interest_rate') / 100),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
-        )
-    )['total'] or 0
-
-    # Total repayments
-    total_repayments = Repayment.objects.filter(
-        loan__organization=organization
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    # Total savings
-    total_savings = Saving.objects.filter(
-        organization=organization
-    ).aggregate(total=Sum('ledger_balance'))['total'] or 0
-
-    # Total collections (sum amounts in CollectionItem linked to organization loans)
-    total_collections = CollectionItem.objects.filter(
-        loan__organization=organization
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    # Chart.js data for last 6 months
-    today = now().date()
-    six_months_ago = today - timedelta(days=180)
-
-    monthly_data = (
-        Repayment.objects
-        .filter(loan__organization=organization, date__gte=six_months_ago)
-        .annotate(month=F('date__month'))
-        .values('month')
-        .annotate(total=Sum('amount'))
-        .order_by('month')
-    )
-
-    chart_labels = [f"Month {d['month']}" for d in monthly_data]
-    chart_values = [float(d['total']) for d in monthly_data]
-
-    context = {
-        'borrowers': borrowers_count,
-        'loans': loans_count,
-        'active_loans': active_loans,
-        'overdue_loans': overdue_loans,
-        'par30': par30_loans,
-        'closed_loans': closed_loans,
-        'total_portfolio': total_portfolio,
-        'total_repayments': total_repayments,
-        'total_collections': total_collections,
-        'total_savings': total_savings,
-        'chart_labels': chart_labels,
-        'chart_values': chart_values,
-    }
+    # Counts, totals and the 6-month chart, cached per organization
+    context = dashboard_stats(organization)
 
     return render(request, 'dashboard.html', context)
 
@@ -113,11 +74,43 @@ def dashboard(request):
 # core/views.py
 
 
+# Rows shown for a search on the borrowers page
+BORROWER_SEARCH_RESULTS = 50
+COLLECTION_SHEET_LOANS = 50
+
+
 @login_required
 def borrowers_view(request):
     organization = request.user.loanofficer.organization
-    borrowers = Borrower.objects.filter(organization=organization)
-    return render(request, 'borrowers.html', {'borrowers': borrowers})
+    query = request.GET.get('q', '').strip()
+    borrowers = Borrower.objects.filter(organization=organization).only(
+        'id', 'full_name', 'business', 'unique_id', 'mobile', 'email', 'status'
+    ).with_totals()
+    if query:
+        # Best matches in rank order instead of pages of the whole book
+        results = search_borrowers(borrowers, organization, query, BORROWER_SEARCH_RESULTS)
+        return render(request, 'borrowers.html', {'borrowers': results, 'query': query})
+    page = keyset_paginate(borrowers, request, ordering=('-id',))
+    return render(request, 'borrowers.html', {'borrowers': page, 'page': page})
+
+
+@login_required
+def borrower_search(request):
+    organization = request.user.loanofficer.organization
+    borrowers = search_borrowers(
+        Borrower.objects.filter(organization=organization), organization, request.GET.get('q', '').strip()
+    )
+    return JsonResponse({'results': [
+        {
+            'id': borrower.id,
+            'full_name': borrower.full_name,
+            'unique_id': borrower.unique_id,
+            'mobile': borrower.mobile,
+            'business': borrower.business,
+            'status': borrower.status,
+        }
+        for borrower in borrowers
+    ]})
 
 
 
@@ -128,7 +121,22 @@ def add_borrower(request):
     branches = Branch.objects.filter(organization=organization)
 
     if request.method == "POST":
-        Borrower.objects.create(
+        duplicates = possible_duplicates(
+            organization,
+            full_name=request.POST.get("full_name", ""),
+            mobile=request.POST.get("mobile", ""),
+            business=request.POST.get("business", ""),
+            email=request.POST.get("email", ""),
+            unique_id=request.POST.get("unique_id", ""),
+        )
+        if duplicates and not request.POST.get("confirm_duplicate"):
+            return render(request, "add_borrowers.html", {
+                "branches": branches,
+                "duplicates": duplicates,
+                "values": request.POST,
+            })
+
+        borrower = Borrower.objects.create(
             organization=organization,
             branch_id=request.POST.get("branch"),
             full_name=request.POST.get("full_name"),
@@ -138,10 +146,69 @@ def add_borrower(request):
             email=request.POST.get("email"),
             status=request.POST.get("status"),
         )
+        # Saved despite the warning: the pairs go to the review queue
+        register_borrower(borrower, duplicates)
         return redirect("/borrowers/")
 
     return render(request, "add_borrowers.html", {"branches": branches})
 
+
+@login_required
+def duplicate_borrowers(request):
+    organization = request.user.loanofficer.organization
+    candidates = DuplicateCandidate.objects.filter(organization=organization, status='Open')
+
+    if request.method == "POST":
+        candidate = get_object_or_404(candidates, pk=request.POST.get("candidate"))
+        candidate.status = 'Confirmed' if request.POST.get("action") == "confirm" else 'Dismissed'
+        candidate.reviewed_by = request.user
+        candidate.reviewed_at = now()
+        candidate.save(update_fields=['status', 'reviewed_by', 'reviewed_at'])
+        return redirect(request.get_full_path())
+
+    page = keyset_paginate(
+        candidates.select_related('borrower', 'duplicate'), request, ordering=('-score', '-id')
+    )
+    return render(request, "duplicate_borrowers.html", {"candidates": page, "page": page})
+
+
+# Rejected rows listed on the page; the full list is in the downloadable report
+IMPORT_ERRORS_SHOWN = 100
+
+
+@login_required
+def import_borrowers(request):
+    organization = request.user.loanofficer.organization
+    context = {}
+
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            context["failure"] = "Choose a CSV or XLSX file to import"
+        else:
+            try:
+                result = run_borrower_import(organization, upload, dry_run=bool(request.POST.get("dry_run")))
+            except (ValueError, UnicodeDecodeError) as e:
+                context["failure"] = f"Could not read the file: {e}"
+            else:
+                if result.errors:
+                    request.session["borrower_import_errors"] = save_error_report(result)
+                context.update(result=result, errors=result.errors[:IMPORT_ERRORS_SHOWN])
+
+    return render(request, "import_borrowers.html", context)
+
+
+def _import_error_report(request, session_key, filename):
+    name = request.session.get(session_key)
+    if not name or not error_report_path(name).exists():
+        raise Http404("No import error report")
+    return FileResponse(open(error_report_path(name), 'rb'), as_attachment=True, filename=filename)
+
+
+@login_required
+def borrower_import_errors(request):
+    return _import_error_report(request, "borrower_import_errors", "borrower_import_errors.csv")
+
 # -------------------------
 # LOANS
 # -------------------------
@@ -150,16 +217,18 @@ def add_borrower(request):
 @login_required
 def loans_view(request):
     organization = request.user.loanofficer.organization
-    loans = Loan.objects.filter(organization=organization)
-    borrowers = Borrower.objects.filter(organization=organization)
-    branches = organization.branch_set.all()
-    return render(request, 'loans.html', {'loans': loans, 'borrowers': borrowers, 'branches': branches})
+    loans = Loan.objects.filter(organization=organization).select_related('borrower').only(
+        'id', 'disbursed_date', 'principal', 'interest_rate', 'fees', 'penalty',
+        'paid', 'last_payment_date', 'status', 'borrower__full_name'
+    )
+    page = keyset_paginate(loans, request, ordering=('-disbursed_date', '-id'))
+    return render(request, 'loans.html', {'loans': page, 'page': page})
 
 
 
 
 
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 @login_required
 def add_loan(request):
@@ -167,30 +236,80 @@ def add_loan(request):
     borrowers = Borrower.objects.filter(organization=organization)
     branches = Branch.objects.filter(organization=organization)
 
-    if request.method == "POST":
-        # Convert strings to Decimal for safe calculation
-        principal = Decimal(request.POST.get("principal"))
-        interest_rate = Decimal(request.POST.get("interest_rate"))
-        tenure = int(request.POST.get("tenure"))
+    errors = []
 
-        # Create a new loan
-        Loan.objects.create(
-            organization=organization,
-            branch_id=request.POST.get("branch"),
-            borrower_id=request.POST.get("borrower"),
-            principal=principal,
-            interest_rate=interest_rate,
-            tenure=tenure,
-            status="Active",
-        )
-        return redirect("/loans/")
+    if request.method == "POST":
+        frequency = request.POST.get("repayment_frequency") or "Monthly"
+        method = request.POST.get("interest_method") or "Flat"
+        if frequency not in dict(Loan.FREQUENCY_CHOICES):
+            errors.append(f"Unknown repayment frequency: {frequency}")
+        if method not in dict(Loan.INTEREST_METHOD_CHOICES):
+            errors.append(f"Unknown interest method: {method}")
+        try:
+            # Convert strings to Decimal for safe calculation
+            principal = Decimal(request.POST.get("principal"))
+            interest_rate = Decimal(request.POST.get("interest_rate"))
+            tenure = int(request.POST.get("tenure"))
+        except (TypeError, ValueError, InvalidOperation):
+            errors.append("Principal, interest rate and tenure must be numbers")
+
+        if not errors:
+            # Create a new loan and its repayment schedule together
+            with transaction.atomic():
+                loan = Loan.objects.create(
+                    organization=organization,
+                    branch_id=request.POST.get("branch"),
+                    borrower_id=request.POST.get("borrower"),
+                    officer=request.user.loanofficer,
+                    principal=principal,
+                    interest_rate=interest_rate,
+                    tenure=tenure,
+                    repayment_frequency=frequency,
+                    interest_method=method,
+                    status="Active",
+                )
+                create_schedule(loan)
+            return redirect("/loans/")
 
     return render(request, "add_loan.html", {
         "borrowers": borrowers,
-        "branches": branches
+        "branches": branches,
+        "errors": errors,
+        "values": request.POST,
+        "frequencies": Loan.FREQUENCY_CHOICES,
+        "interest_methods": Loan.INTEREST_METHOD_CHOICES,
     })
 
 
+@login_required
+def import_loans(request):
+    officer = request.user.loanofficer
+    context = {}
+
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            context["failure"] = "Choose a CSV or XLSX file to upload"
+        else:
+            try:
+                result = run_loan_import(
+                    officer.organization, upload, officer, dry_run=bool(request.POST.get("dry_run"))
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                context["failure"] = f"Could not read the file: {e}"
+            else:
+                if result.errors:
+                    request.session["loan_import_errors"] = save_error_report(result)
+                context.update(result=result, errors=result.errors[:IMPORT_ERRORS_SHOWN])
+
+    return render(request, "import_loans.html", context)
+
+
+@login_required
+def loan_import_errors(request):
+    return _import_error_report(request, "loan_import_errors", "loan_import_errors.csv")
+
+
 
 @login_required
 def overdue_loans(request):
@@ -212,8 +331,11 @@ def overdue_loans(request):
 @login_required
 def repayments_view(request):
     organization = request.user.loanofficer.organization
-    repayments = Repayment.objects.filter(loan__organization=organization)
-    return render(request, 'repayments.html', {'repayments': repayments})
+    repayments = Repayment.objects.filter(loan__organization=organization).select_related(
+        'loan__borrower', 'posted_by'
+    ).only('id', 'amount', 'date', 'loan__borrower__full_name', 'posted_by__username')
+    page = keyset_paginate(repayments, request, ordering=('-date', '-id'))
+    return render(request, 'repayments.html', {'repayments': page, 'page': page})
 
 
 
@@ -222,20 +344,21 @@ def repayments_view(request):
 def add_repayment(request):
     organization = request.user.loanofficer.organization
     loans = Loan.objects.filter(organization=organization)
+    errors = []
 
     if request.method == "POST":
         loan_id = request.POST.get("loan")
         amount = request.POST.get("amount")
-        loan = Loan.objects.get(id=loan_id)
-        
-        Repayment.objects.create(
-            loan=loan,
-            amount=amount,
-            posted_by=request.user
-        )
-        return redirect('repayments')
+        loan = get_object_or_404(Loan, id=loan_id, organization=organization)
 
-    return render(request, 'add_repayment.html', {'loans': loans})
+        try:
+            post_repayment(loan, amount, posted_by=request.user)
+        except ValidationError as e:
+            errors = e.messages
+        else:
+            return redirect('repayments')
+
+    return render(request, 'add_repayment.html', {'loans': loans, 'errors': errors})
 
 # -------------------------
 # POSTING BATCHES
@@ -280,21 +403,143 @@ def create_posting_batch(request):
 def add_posting_item(request, batch_id):
     batch = PostingBatch.objects.get(pk=batch_id)
     loans = Loan.objects.filter(organization=request.user.loanofficer.organization)
+    errors = []
     
     if request.method == "POST":
         loan_id = request.POST.get("loan")
         amount = request.POST.get("amount")
         remarks = request.POST.get("remarks", "")
-        loan = Loan.objects.get(pk=loan_id)
-        PostingItem.objects.create(
-            batch=batch,
-            loan=loan,
-            amount=amount,
-            remarks=remarks
+        loan = get_object_or_404(loans, pk=loan_id)
+        try:
+            post_batch_item(batch, loan, amount, remarks=remarks, posted_by=request.user)
+        except ValidationError as e:
+            errors = e.messages
+        else:
+            return redirect("posting_batch_detail", pk=batch.id)
+
+    return render(request, "add_posting_item.html", {"batch": batch, "loans": loans, "errors": errors})
+
+
+
+BULK_GRID_ROWS = 20
+BULK_CSV_COLUMNS = ("loan", "amount")
+
+
+def _batch_entries_from_request(request):
+    """Rows for a bulk batch submission from a JSON body, a CSV upload or the form grid"""
+    if request.content_type == "application/json":
+        payload = json.loads(request.body or b"[]")
+        return payload.get("items", []) if isinstance(payload, dict) else payload
+
+    upload = request.FILES.get("file")
+    if upload:
+        reader = csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig"))
+        # Without these columns every row would be skipped as a blank grid row
+        missing = [column for column in BULK_CSV_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"The CSV is missing the {', '.join(missing)} column(s)")
+        return list(reader)
+
+    return [
+        {"loan": loan, "amount": amount, "remarks": remarks}
+        for loan, amount, remarks in zip(
+            request.POST.getlist("loan"),
+            request.POST.getlist("amount"),
+            request.POST.getlist("remarks"),
         )
-        return redirect("posting_batch_detail", pk=batch.id)
+    ]
+
+
+@login_required
+def bulk_post_items(request, batch_id):
+    organization = request.user.loanofficer.organization
+    batch = get_object_or_404(PostingBatch, pk=batch_id, officer__organization=organization)
+    wants_json = request.content_type == "application/json"
+    errors = []
+
+    if request.method == "POST":
+        try:
+            entries = _batch_entries_from_request(request)
+            items = post_batch_items(batch, entries, posted_by=request.user)
+        except (json.JSONDecodeError, UnicodeDecodeError, csv.Error):
+            errors = ["Could not read the submitted items"]
+        except ValueError as e:
+            errors = [str(e)]
+        except ValidationError as e:
+            errors = e.messages
+        else:
+            if wants_json:
+                return JsonResponse({
+                    "batch": batch.id,
+                    "posted": len(items),
+                    "total": str(sum((item.amount for item in items), Decimal("0.00"))),
+                })
+            return redirect("posting_batch_detail", pk=batch.id)
+
+        if wants_json:
+            return JsonResponse({"errors": errors}, status=400)
+
+    loans = Loan.objects.filter(organization=organization).exclude(status='Closed').select_related('borrower')
+    return render(request, "bulk_post_items.html", {
+        "batch": batch,
+        "loans": loans,
+        "rows": range(BULK_GRID_ROWS),
+        "errors": errors,
+    })
+
 
-    return render(request, "add_posting_item.html", {"batch": batch, "loans": loans})
+# -------------------------
+# STATEMENT RECONCILIATION
+# -------------------------
+
+@login_required
+def reconciliation(request):
+    officer = request.user.loanofficer
+    context = {}
+
+    if request.method == "POST":
+        upload = request.FILES.get("file")
+        if upload is None:
+            context["failure"] = "Choose a statement CSV to reconcile"
+        else:
+            try:
+                context["statement"] = reconcile_statement(officer.organization, upload, officer)
+            except (ValueError, UnicodeDecodeError) as e:
+                context["failure"] = f"Could not reconcile the statement: {e}"
+            except ValidationError as e:
+                context["failure"] = " ".join(e.messages)
+
+    context["statements"] = StatementImport.objects.filter(
+        organization=officer.organization
+    ).select_related('uploaded_by').order_by('-id')[:20]
+    return render(request, "reconciliation.html", context)
+
+
+@login_required
+def statement_exceptions(request):
+    organization = request.user.loanofficer.organization
+    exceptions = StatementException.objects.filter(statement__organization=organization, status='Open')
+    failure = None
+
+    if request.method == "POST":
+        exception = get_object_or_404(exceptions, pk=request.POST.get("exception"))
+        if request.POST.get("action") == "dismiss":
+            resolve_exception(exception, request.user)
+            return redirect(request.get_full_path())
+        loan_id = request.POST.get("loan", "").strip()
+        loan = Loan.objects.filter(
+            organization=organization, pk=loan_id
+        ).exclude(status='Closed').first() if loan_id.isdigit() else None
+        if loan is None:
+            failure = f"Line {exception.line}: enter the ID of an open loan"
+        elif exception.amount is None or exception.amount <= 0:
+            failure = f"Line {exception.line}: only credits can be posted"
+        else:
+            resolve_exception(exception, request.user, loan=loan)
+            return redirect(request.get_full_path())
+
+    page = keyset_paginate(exceptions.select_related('statement'), request, ordering=('-id',))
+    return render(request, "statement_exceptions.html", {"exceptions": page, "page": page, "failure": failure})
 
 
 
@@ -401,9 +646,11 @@ from .models import Saving
 @login_required
 def savings_view(request):
     organization = request.user.loanofficer.organization
-    savings = Saving.objects.filter(organization=organization)
-    borrowers = Borrower.objects.filter(organization=organization)
-    return render(request, 'savings.html', {'savings': savings, 'borrowers': borrowers})
+    savings = Saving.objects.filter(organization=organization).only(
+        'id', 'name', 'account_number', 'product', 'ledger_balance', 'last_transaction', 'status'
+    )
+    page = keyset_paginate(savings, request, ordering=('-id',))
+    return render(request, 'savings.html', {'savings': page, 'page': page})
 
 
 
@@ -464,33 +711,51 @@ def collection_sheet(request):
 
     # Fetch loans for dropdown
     loans = Loan.objects.filter(organization=organization)
+    errors = []
 
     # Handle POST (add collection)
     if request.method == "POST":
         loan_id = request.POST.get("loan")
         amount = request.POST.get("amount")
-        date = request.POST.get("date")
-
-        loan = Loan.objects.get(id=loan_id)
-        Repayment.objects.create(
-            loan=loan,
-            amount=amount,
-            date=date,
-            posted_by=request.user
-        )
 
-        # Update loan's paid field automatically
-        loan.paid = sum(r.amount for r in loan.repayments.all())
-        loan.save()
-
-        return redirect("collection_sheet")
-
-    # Fetch all repayments for the organization
-    collections = Repayment.objects.filter(loan__organization=organization).order_by("-date")
+        loan = get_object_or_404(loans, id=loan_id)
+
+        # Records the repayment and updates the loan's paid/status in one transaction
+        try:
+            post_repayment(loan, amount, posted_by=request.user)
+        except ValidationError as e:
+            errors = e.messages
+        else:
+            return redirect("collection_sheet")
+
+    # Latest repayments for the organization, a page at a time
+    collections = Repayment.objects.filter(loan__organization=organization).select_related(
+        'loan__borrower', 'posted_by'
+    ).only('id', 'amount', 'date', 'loan__principal', 'loan__borrower__full_name', 'posted_by__username')
+    page = keyset_paginate(collections, request, ordering=('-date', '-id'))
+
+    # Installments due today for this officer, straight off the (due_date, officer) index
+    due_today = installments_due(
+        organization, date.today(), officer=request.user.loanofficer
+    ).select_related('loan__borrower').order_by('loan_id')
+
+    # Only the open loans of the borrowers matching the lookup, not the whole book
+    query = request.GET.get('q', '').strip()
+    matches = []
+    if query:
+        matches = loans.exclude(status='Closed').filter(
+            borrower_id__in=search_borrower_ids(organization, query)
+        ).select_related('borrower').only('id', 'principal', 'borrower__full_name').order_by(
+            'borrower__full_name', 'id'
+        )[:COLLECTION_SHEET_LOANS]
 
     return render(request, "collection_sheet.html", {
-        "collections": collections,
-        "loans": loans
+        "collections": page,
+        "page": page,
+        "due_today": due_today,
+        "loans": matches,
+        "query": query,
+        "errors": errors,
     })
     
     
@@ -522,7 +787,10 @@ def daily_collections_report(request):
     return render(request, 'daily_collections.html', {
         'collections': collections,
         'total_collected': total_collected,
-        'report_date': today
+        'report_date': today,
+        'title': 'Daily Collections',
+        'excel_url': reverse('daily_collections_excel'),
+        'pdf_url': reverse('daily_collections_pdf'),
     })
 
 
@@ -544,7 +812,10 @@ def reports_daily_collections(request):
     return render(request, 'daily_collections.html', {
         'collections': collections,
         'total_collected': total_collected,
-        'report_date': today
+        'report_date': today,
+        'title': 'Daily Collections',
+        'excel_url': reverse('daily_collections_excel'),
+        'pdf_url': reverse('daily_collections_pdf'),
     })
 
 # ---------------------------
@@ -559,7 +830,8 @@ def reports_monthly_collections(request):
         date__gte=first_day_of_month,
         date__lte=today
     ).select_related('loan', 'loan__borrower')
-    total_collected = collections.aggregate(total=Sum('amount'))['total'] or 0
+    # Month-to-date total from the rollup rather than re-summing the rows
+    total_collected = monthly_totals(request.user.loanofficer.organization, [today])[year_month(today)]
     return render(request, 'monthly_collections.html', {
         'collections': collections,
         'total_collected': total_collected,
@@ -723,8 +995,11 @@ def add_vendor(request):
 @login_required
 def expenses_view(request):
     organization = request.user.loanofficer.organization
-    expenses = Expense.objects.filter(organization=organization).select_related('branch', 'vendor')
-    return render(request, "expenses.html", {'expenses': expenses})
+    expenses = Expense.objects.filter(organization=organization).select_related(
+        'branch', 'vendor', 'recorded_by'
+    ).only('id', 'date', 'category', 'amount', 'branch__name', 'vendor__name', 'recorded_by__username')
+    page = keyset_paginate(expenses, request, ordering=('-date', '-id'))
+    return render(request, "expenses.html", {'expenses': page, 'page': page})
 
 
 
@@ -759,24 +1034,41 @@ def add_expense(request):
 
 
 
+def _report_period(request):
+    """
+    (start_date, end_date, error) from the query string. Dates stay ISO
+    strings; a malformed one is dropped and reported in `error`.
+    """
+    dates, error = [], None
+    for field in ('start_date', 'end_date'):
+        value = request.GET.get(field) or None
+        if value:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                error = f"{value} is not a valid date; use YYYY-MM-DD"
+                value = None
+        dates.append(value)
+    return dates[0], dates[1], error
+
+
 @login_required
 def profit_loss(request):
     organization = request.user.loanofficer.organization
+    start_date, end_date, failure = _report_period(request)
 
-    income = Repayment.objects.filter(
-        loan__organization=organization
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    expenses = Expense.objects.filter(
-        organization=organization
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    profit = income - expenses
+    # Collections are the income line; the per-branch rows are the drill-down
+    branches = branch_financials(organization.id, start_date, end_date)
+    totals = financial_totals(branches)
 
     return render(request, "profit_loss.html", {
-        'income': income,
-        'expenses': expenses,
-        'profit': profit
+        'income': totals['collections'],
+        'expenses': totals['expenses'],
+        'profit': totals['equity'],
+        'branches': branches,
+        'start_date': start_date,
+        'end_date': end_date,
+        'failure': failure,
     })
 
 
@@ -818,29 +1110,19 @@ def trial_balance(request):
 @login_required
 def branch_equity(request):
     organization = request.user.loanofficer.organization
-    branches = Branch.objects.filter(organization=organization)
-
-    data = []
-
-    for branch in branches:
-        collections = Repayment.objects.filter(
-            loan__branch=branch
-        ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-
-        expenses = Expense.objects.filter(
-            branch=branch
-        ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-
-        equity = collections - expenses
-
-        data.append({
-            "branch": branch,
-            "collections": collections,
-            "expenses": expenses,
-            "equity": equity
-        })
-
-    return render(request, "branch_equity.html", {"data": data})
+    start_date, end_date, failure = _report_period(request)
+    by_month = request.GET.get('by') == 'month'
+
+    data = branch_financials(organization.id, start_date, end_date, by_month=by_month)
+
+    return render(request, "branch_equity.html", {
+        "data": data,
+        "totals": financial_totals(data),
+        "start_date": start_date,
+        "end_date": end_date,
+        "by_month": by_month,
+        "failure": failure,
+    })
 
 
 
@@ -973,98 +1255,60 @@ def balance_sheet(request):
 # Collections Reports
 # --------------------
 @login_required
-def daily_collections_excel(request):
+def daily_collections_excel(request, fmt='xlsx'):
     org = request.user.loanofficer.organization
     today_date = date.today()
-    qs = Repayment.objects.filter(loan__organization=org, date=today_date).select_related('loan', 'loan__borrower')
-    data = [{
-        "Borrower": r.loan.borrower.full_name,
-        "Loan ID": r.loan.id,
-        "Amount": float(r.amount),
-        "Date": r.date,
-    } for r in qs]
-    columns = ["Borrower", "Loan ID", "Amount", "Date"]
-    return export_to_excel(data, columns, "daily_collections.xlsx")
+    columns, rows = collection_rows(org.id, today_date, today_date)
+    return export_report(rows, columns, "daily_collections", fmt)
 
 
 @login_required
-def monthly_collections_excel(request):
+def monthly_collections_excel(request, fmt='xlsx'):
     org = request.user.loanofficer.organization
     today_date = date.today()
     first_day = today_date.replace(day=1)
-    qs = Repayment.objects.filter(
-        loan__organization=org,
-        date__gte=first_day,
-        date__lte=today_date
-    ).select_related('loan', 'loan__borrower')
-    data = [{
-        "Borrower": r.loan.borrower.full_name,
-        "Loan ID": r.loan.id,
-        "Amount": float(r.amount),
-        "Date": r.date,
-    } for r in qs]
-    columns = ["Borrower", "Loan ID", "Amount", "Date"]
-    return export_to_excel(data, columns, "monthly_collections.xlsx")
+    columns, rows = collection_rows(org.id, first_day, today_date)
+    return export_report(rows, columns, "monthly_collections", fmt)
 
 
 @login_required
-def custom_collections_excel(request):
+def custom_collections_excel(request, fmt='xlsx'):
     org = request.user.loanofficer.organization
-    data = []
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-
-    if start_date and end_date:
-        qs = Repayment.objects.filter(
-            loan__organization=org,
-            date__gte=start_date,
-            date__lte=end_date
-        ).select_related('loan', 'loan__borrower')
-        data = [{
-            "Borrower": r.loan.borrower.full_name,
-            "Loan ID": r.loan.id,
-            "Amount": float(r.amount),
-            "Date": r.date,
-        } for r in qs]
-
-    columns = ["Borrower", "Loan ID", "Amount", "Date"]
-    return export_to_excel(data, columns, "custom_collections.xlsx")
+    start_date, end_date, failure = _report_period(request)
+    # Checked before streaming starts; once the 200 and headers are out an error can't be reported
+    if failure:
+        return redirect('reports_custom_collections')
+
+    if not (start_date and end_date):
+        return export_report([], COLLECTION_COLUMNS, "custom_collections", fmt)
+
+    # A date range can span years of repayments, so the workbook is built by the report worker
+    if fmt == 'xlsx':
+        return _queue_report(request, 'custom_collections', {'start_date': start_date, 'end_date': end_date})
+
+    columns, rows = collection_rows(org.id, start_date, end_date)
+    return export_report(rows, columns, "custom_collections", fmt)
 
 
 # --------------------
 # Loans Reports
 # --------------------
 @login_required
-def loan_portfolio_excel(request):
+def loan_portfolio_excel(request, fmt='xlsx'):
     org = request.user.loanofficer.organization
-    qs = Loan.objects.filter(organization=org).select_related('borrower', 'branch', 'officer')
-    data = [{
-        "Borrower": l.borrower.full_name if l.borrower else "",
-        "Loan ID": l.id,
-        "Principal": float(l.principal),
-        "Interest Rate": float(l.interest_rate),
-        "Status": l.status,
-        "Branch": l.branch.name if l.branch else "",
-        "Officer": l.officer.user.username if l.officer else "",
-    } for l in qs]
-    columns = ["Borrower", "Loan ID", "Principal", "Interest Rate", "Status", "Branch", "Officer"]
-    return export_to_excel(data, columns, "loan_portfolio.xlsx")
+
+    if fmt == 'xlsx':
+        return _queue_report(request, 'loan_portfolio')
+
+    columns, rows = loan_portfolio_rows(org.id)
+    return export_report(rows, columns, "loan_portfolio", fmt)
 
 
 @login_required
-def par30_loans_excel(request):
+def par30_loans_excel(request, fmt='xlsx'):
     org = request.user.loanofficer.organization
-    qs = Loan.objects.filter(organization=org, status='PAR30').select_related('borrower', 'branch', 'officer')
-    data = [{
-        "Borrower": l.borrower.full_name if l.borrower else "",
-        "Loan ID": l.id,
-        "Principal": float(l.principal),
-        "Balance": float(l.balance),
-        "Branch": l.branch.name if l.branch else "",
-        "Officer": l.officer.user.username if l.officer else "",
-    } for l in qs]
-    columns = ["Borrower", "Loan ID", "Principal", "Balance", "Branch", "Officer"]
-    return export_to_excel(data, columns, "par30_loans.xlsx")
+    columns, rows = par30_rows(org.id)
+    return export_report(rows, columns, "par30_loans", fmt)
 
 
 # --------------------
@@ -1073,11 +1317,15 @@ def par30_loans_excel(request):
 @login_required
 def profit_loss_excel(request):
     org = request.user.loanofficer.organization
-    income = Repayment.objects.filter(loan__organization=org).aggregate(total=Sum('amount'))['total'] or 0
-    expenses = Expense.objects.filter(organization=org).aggregate(total=Sum('amount'))['total'] or 0
-    data = [{"Income": float(income), "Expenses": float(expenses), "Profit": float(income-expenses)}]
-    columns = ["Income", "Expenses", "Profit"]
-    return export_to_excel(data, columns, "profit_loss.xlsx")
+    start_date, end_date, failure = _report_period(request)
+    if failure:
+        return redirect(f"{reverse('profit_loss')}?{request.GET.urlencode()}")
+    branches = branch_financials(org.id, start_date, end_date)
+    totals = financial_totals(branches)
+    rows = [(row['name'], row['collections'], row['expenses'], row['equity']) for row in branches]
+    rows.append(("Total", totals['collections'], totals['expenses'], totals['equity']))
+    columns = ["Branch", "Income", "Expenses", "Profit"]
+    return export_to_excel(rows, columns, "profit_loss.xlsx")
 
 
 @login_required
@@ -1086,9 +1334,9 @@ def balance_sheet_excel(request):
     total_loans = Loan.objects.filter(organization=org).aggregate(total=Sum('principal'))['total'] or 0
     total_savings = Saving.objects.filter(organization=org).aggregate(total=Sum('ledger_balance'))['total'] or 0
     total_expenses = Expense.objects.filter(organization=org).aggregate(total=Sum('amount'))['total'] or 0
-    data = [{"Loans": float(total_loans), "Savings": float(total_savings), "Expenses": float(total_expenses)}]
+    rows = [(total_loans, total_savings, total_expenses)]
     columns = ["Loans", "Savings", "Expenses"]
-    return export_to_excel(data, columns, "balance_sheet.xlsx")
+    return export_to_excel(rows, columns, "balance_sheet.xlsx")
 
 
 @login_required
@@ -1097,27 +1345,21 @@ def trial_balance_excel(request):
     total_loans = Loan.objects.filter(organization=org).aggregate(total=Sum('principal'))['total'] or 0
     total_savings = Saving.objects.filter(organization=org).aggregate(total=Sum('ledger_balance'))['total'] or 0
     total_expenses = Expense.objects.filter(organization=org).aggregate(total=Sum('amount'))['total'] or 0
-    data = [{"Loans": float(total_loans), "Savings": float(total_savings), "Expenses": float(total_expenses)}]
+    rows = [(total_loans, total_savings, total_expenses)]
     columns = ["Loans", "Savings", "Expenses"]
-    return export_to_excel(data, columns, "trial_balance.xlsx")
+    return export_to_excel(rows, columns, "trial_balance.xlsx")
 
 
 @login_required
 def branch_equity_excel(request):
-    org = request.user.loanofficer.organization
-    branches = Branch.objects.filter(organization=org)
-    data = []
-    for branch in branches:
-        collections = Repayment.objects.filter(loan__branch=branch).aggregate(total=Sum("amount"))["total"] or 0
-        expenses = Expense.objects.filter(branch=branch).aggregate(total=Sum("amount"))["total"] or 0
-        data.append({
-            "Branch": branch.name,
-            "Collections": float(collections),
-            "Expenses": float(expenses),
-            "Equity": float(collections - expenses),
-        })
-    columns = ["Branch", "Collections", "Expenses", "Equity"]
-    return export_to_excel(data, columns, "branch_equity.xlsx")
+    start_date, end_date, failure = _report_period(request)
+    if failure:
+        return redirect(f"{reverse('branch_equity')}?{request.GET.urlencode()}")
+    # Only the filters in use go into the job, so equal requests share its cached file
+    params = {'start_date': start_date, 'end_date': end_date}
+    if request.GET.get('by') == 'month':
+        params['by'] = 'month'
+    return _queue_report(request, 'branch_equity', {key: value for key, value in params.items() if value})
 
 
 # --------------------
@@ -1129,7 +1371,92 @@ def officer_performance_excel(request):
     qs = Loan.objects.filter(organization=org).values('officer__user__username').annotate(
         portfolio=Sum(F('principal') + F('principal') * F('interest_rate') / 100)
     )
-    data = [{"Officer": r['officer__user__username'], "Portfolio": float(r['portfolio'] or 0)} for r in qs]
+    rows = ((r['officer__user__username'], r['portfolio'] or 0) for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE))
     columns = ["Officer", "Portfolio"]
-    return export_to_excel(data, columns, "officer_performance.xlsx")
+    return export_to_excel(rows, columns, "officer_performance.xlsx")
+
+
+
+# --------------------
+# Report Jobs
+# --------------------
+@login_required
+def report_jobs(request):
+    organization = request.user.loanofficer.organization
+    jobs = ReportJob.objects.filter(organization=organization).select_related('requested_by').order_by('-created_at')[:50]
+    return render(request, 'report_jobs.html', {'jobs': jobs, 'reports': REPORTS})
+
+
+@login_required
+def report_job_detail(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, organization=request.user.loanofficer.organization)
+    return render(request, 'report_job_detail.html', {
+        'job': job,
+        'title': REPORTS[job.report][0],
+        'pending': job.status in ('Queued', 'Running'),
+    })
+
+
+@login_required
+def report_job_download(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, organization=request.user.loanofficer.organization, status='Done')
+    path = job_file_path(job)
+    if not path.exists():
+        raise Http404("Report file has been removed")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=job_download_name(job))
+
+
+def _queue_report(request, report, params=None, fmt='xlsx'):
+    """Queue a report job; reuse of a cached file goes straight to the download"""
+    job = enqueue_report(request.user.loanofficer.organization, report, params, request.user, fmt=fmt)
+    if job.status == 'Done':
+        return redirect('report_job_download', pk=job.id)
+    return redirect('report_job_detail', pk=job.id)
+
+
+# --------------------
+# PDF Reports
+# --------------------
+@login_required
+def daily_collections_pdf(request):
+    today_date = date.today().isoformat()
+    return _queue_report(request, 'daily_collections', {'start_date': today_date, 'end_date': today_date}, 'pdf')
+
+
+@login_required
+def monthly_collections_pdf(request):
+    today_date = date.today()
+    params = {'start_date': today_date.replace(day=1).isoformat(), 'end_date': today_date.isoformat()}
+    return _queue_report(request, 'monthly_collections', params, 'pdf')
+
+
+@login_required
+def custom_collections_pdf(request):
+    start_date, end_date, failure = _report_period(request)
+    if failure or not (start_date and end_date):
+        return redirect('reports_custom_collections')
+    return _queue_report(request, 'custom_collections', {'start_date': start_date, 'end_date': end_date}, 'pdf')
 
+
+@login_required
+def par30_loans_pdf(request):
+    return _queue_report(request, 'par30_loans', fmt='pdf')
+
+
+@login_required
+def balance_sheet_pdf(request):
+    return _queue_report(request, 'balance_sheet', fmt='pdf')
+
+
+# --------------------
+# Performance stats
+# --------------------
+@staff_member_required
+def performance_stats(request):
+    if request.method == 'POST':
+        reset_stats()
+        return redirect('performance_stats')
+    return render(request, 'performance_stats.html', {
+        'endpoints': endpoint_stats(),
+        'threshold': DUPLICATE_QUERY_THRESHOLD,
+    })
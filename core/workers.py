@@ -0,0 +1,61 @@
+"""
+Entry points for the process pools used by the report worker and the
+write-contention benchmark.
+
+These run in spawned interpreters, so this module must not import models
+at load time: Django is only set up once `init_worker` has run.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def run_report_job(job_id):
+    from .jobs import run_job
+    return run_job(job_id)
+
+
+def init_bench_worker(db_path, pragmas):
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connections
+    settings.SQLITE_PRAGMAS = pragmas
+    connections['default'].settings_dict['NAME'] = db_path
+
+
+def run_posting_worker(loan_ids, rounds, immediate):
+    """
+    Post `rounds` batches over `loan_ids`. Returns (items posted, batches
+    lost to "database is locked", seconds). With `immediate` false the
+    batch runs inside a plain (deferred) outer transaction, which is how it
+    was posted before immediate_atomic: it reads the loans, then has to
+    upgrade to a write lock.
+    """
+    import time
+    from django.db import OperationalError, transaction
+
+    from .models import LoanOfficer, PostingBatch
+    from .services import post_batch_items
+
+    officer = LoanOfficer.objects.select_related('organization').first()
+    entries = [{'loan': loan_id, 'amount': '1.00'} for loan_id in loan_ids]
+    posted = locked = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        try:
+            batch = PostingBatch.objects.create(officer=officer)
+            if immediate:
+                post_batch_items(batch, entries)
+            else:
+                with transaction.atomic():
+                    post_batch_items(batch, entries)
+            posted += len(entries)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    return posted, locked, time.perf_counter() - start
@@ -42,12 +42,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReportingReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,10 +81,59 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Read replica for reports/, accounting/ and *_excel views (see
+    # core.routers). Refreshed from the primary by `refresh_reporting_db`;
+    # point it at a second server instead by changing ENGINE/NAME. Until the
+    # file exists, reports read from the primary.
+    'reporting': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'reporting.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['core.routers.ReportingRouter']
+
+# Seconds between replica refreshes for `refresh_reporting_db --every`
+REPORTING_REFRESH_SECONDS = 300
+# After a write, that user's reports read from the primary for this long,
+# so they see their own postings before the next refresh
+REPORTING_STICKY_SECONDS = REPORTING_REFRESH_SECONDS
+
+# Applied to every new SQLite connection by core.db.configure_sqlite.
+# WAL lets readers run alongside the single writer; the posting paths use
+# core.db.immediate_atomic so writers queue on busy_timeout instead of
+# failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',           # safe with WAL; fsync at checkpoints only
+    'busy_timeout': 10000,             # ms a writer waits for the lock
+    'cache_size': -64000,              # KiB (64 MB) of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# Shared between gunicorn workers so write-driven invalidation reaches all of them
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
 
+# Background report jobs (see `manage.py run_report_worker`)
+
+REPORT_FILES_DIR = BASE_DIR / 'report_files'
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+# Seconds a finished report is served from disk for identical requests
+REPORT_CACHE_TIMEOUT = 15 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 